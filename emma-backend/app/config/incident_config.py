@@ -3,10 +3,29 @@ incident_config.py
 
 Loads incident patterns/locations and exposes helpers to read notifications,
 assessment rules, and global policy triggers from incident_patterns.yml.
+
+Configs are compiled once (YAML parsed, regexes compiled) and cached per tenant in
+a bounded LRU; an entry is reloaded when its file (or a file it extends) changes.
+Tenant overlays (TENANT_CONFIG_DIR/<tenant>.yml, see app/config/tenants.py) are
+deep-merged over the base config or over the file named by `extends:`; dicts merge
+key by key, lists replace. Regexes are compiled through one shared cache, so
+patterns inherited from the base are compiled once for all tenants.
 """
 
-import os, os.path as p, yaml
-from typing import Dict, List, Tuple, Any
+import os, os.path as p, re, threading, time, yaml
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Tuple, Any, Optional, Pattern
+
+from app.config.tenants import current_tenant, tenant_config_dir, tenant_config_path
+from app.infra.metrics import Counter, Gauge
+from app.util.env import env_num
+
+CONFIG_LOADS = Counter(
+    "emma_config_loads_total",
+    "Config compilations by reason (miss, changed).",
+    ["reason"],
+)
 
 def _config_path() -> str:
     envp = os.getenv("INCIDENT_CONFIG")
@@ -15,42 +34,155 @@ def _config_path() -> str:
     here = p.dirname(p.abspath(__file__))
     return p.abspath(p.join(here, "..", "..", "config", "incident_patterns.yml"))
 
-def load_incident_config_strict() -> Tuple[Dict[str, List[str]], List[str]]:
-    """Back-compat loader used by rules.extract: returns (patterns, locations)."""
-    path = _config_path()
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern: str, flags: int = re.IGNORECASE) -> Optional[Pattern]:
+    """Shared compiled-regex cache; returns None for an invalid pattern (it is skipped)."""
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        return None
+
+def _deep_merge(base: Dict[str, Any], over: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(base)
+    for k, v in over.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _deep_merge(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+def _read_layers(path: str, default_base: Optional[str] = None,
+                 seen: Tuple[str, ...] = ()) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Load `path` and everything it extends; returns (merged data, files involved).
+    `default_base` is extended when `path` has no `extends:` key (tenant overlays → base config).
+    """
+    path = p.abspath(path)
+    if path in seen:
+        raise RuntimeError(f"Config extends cycle at {path}")
     if not p.exists(path):
         raise RuntimeError(f"Incident config not found at {path}")
     with open(path, "r") as f:
         data = yaml.safe_load(f) or {}
-    patterns = data.get("patterns") or {}
-    locations = data.get("locations") or []
-    if not isinstance(patterns, dict) or not isinstance(locations, list):
-        raise RuntimeError("Invalid incident config structure")
-    return patterns, [loc.lower() for loc in locations]
+    if not isinstance(data, dict):
+        raise RuntimeError(f"Invalid incident config structure in {path}")
+    base_path = data.pop("extends", default_base)
+    if not base_path:
+        return data, [path]
+    if not p.isabs(base_path):
+        base_path = p.join(p.dirname(path), base_path)
+    base, files = _read_layers(base_path, None, seen + (path,))
+    return _deep_merge(base, data), files + [path]
+
+class CompiledConfig:
+    """One tenant's merged config with regexes compiled, plus the files it was built from."""
+
+    def __init__(self, path: str, default_base: Optional[str] = None):
+        data, self.files = _read_layers(path, default_base)
+        self.mtimes = _mtimes(self.files)
+        self.checked_at = time.monotonic()
+
+        patterns = data.get("patterns") or {}
+        locations = data.get("locations") or []
+        if not isinstance(patterns, dict) or not isinstance(locations, list):
+            raise RuntimeError("Invalid incident config structure")
+        self.patterns: Dict[str, List[str]] = patterns
+        self.locations: List[str] = [loc.lower() for loc in locations]
+        self.notifications: Dict[str, Any] = data.get("notifications") or {}
+        assessments = data.get("assessments") or []
+        self.assessments: List[Dict[str, Any]] = assessments if isinstance(assessments, list) else []
+
+        # Compiled views used on the request path
+        self.incident_regexes: List[Tuple[str, List[Pattern]]] = [
+            (t, [rx for rx in (compile_pattern(pat) for pat in pats or []) if rx])
+            for t, pats in patterns.items()
+        ]
+        trig = self.notifications.get("global_policy_triggers") or {}
+        self.policy_triggers: Dict[str, List[str]] = {
+            "contact_gp_if": list(trig.get("contact_gp_if") or []),
+            "call_999_if": list(trig.get("call_999_if") or []),
+        }
+        self.policy_trigger_regexes: Dict[str, List[Pattern]] = {
+            k: [rx for rx in (compile_pattern(pat) for pat in pats) if rx]
+            for k, pats in self.policy_triggers.items()
+        }
+        self.assessment_rules: List[Dict[str, Any]] = []
+        for rule in self.assessments:
+            if not isinstance(rule, dict):
+                continue
+            name = rule.get("name")
+            pats = rule.get("patterns") or []
+            if not name or not isinstance(pats, list) or not pats:
+                continue
+            self.assessment_rules.append({
+                "name": str(name),
+                "incident_types": rule.get("incident_types") or None,  # list[str] or None
+                "patterns": [str(x) for x in pats],
+                "regexes": [rx for rx in (compile_pattern(str(x)) for x in pats) if rx],
+            })
+
+def _mtimes(files: List[str]) -> Tuple[Optional[int], ...]:
+    out = []
+    for f in files:
+        try:
+            out.append(os.stat(f).st_mtime_ns)
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+_CACHE: "OrderedDict[Tuple[str, str], CompiledConfig]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+CONFIG_CACHE_SIZE = Gauge("emma_config_cache_entries", "Compiled tenant configs held in the LRU.", fn=lambda: len(_CACHE))
+
+def get_config(tenant: Optional[str] = None) -> CompiledConfig:
+    """
+    Compiled config for `tenant` (default: the request's current tenant; None = base config).
+    Cached in an LRU of TENANT_CACHE_SIZE entries (default 256); file mtimes are re-checked
+    at most every CONFIG_CHECK_SECONDS (default 2) and a changed file triggers a recompile.
+    """
+    tenant = tenant if tenant is not None else current_tenant()
+    key = (tenant or "", (tenant_config_dir() or "") if tenant else _config_path())
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        cfg = _CACHE.get(key)
+        if cfg is not None:
+            _CACHE.move_to_end(key)
+    reason = "miss"
+    if cfg is not None:
+        if now - cfg.checked_at < env_num("CONFIG_CHECK_SECONDS", 2.0):
+            return cfg
+        if _mtimes(cfg.files) == cfg.mtimes:
+            cfg.checked_at = now
+            return cfg
+        reason = "changed"
+    # Compile outside the lock; concurrent misses for one tenant may both compile (same result).
+    if tenant:
+        cfg = CompiledConfig(tenant_config_path(tenant), _config_path())
+    else:
+        cfg = CompiledConfig(_config_path())
+    CONFIG_LOADS.inc(reason=reason)
+    with _CACHE_LOCK:
+        _CACHE[key] = cfg
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > max(1, int(env_num("TENANT_CACHE_SIZE", 256))):
+            _CACHE.popitem(last=False)
+    return cfg
+
+def load_incident_config_strict() -> Tuple[Dict[str, List[str]], List[str]]:
+    """Back-compat loader used by rules.extract: returns (patterns, locations). Treat as read-only."""
+    cfg = get_config()
+    return cfg.patterns, cfg.locations
 
 # ---- New helpers (safe to add; do not break existing imports) ----
 
 def load_notifications() -> Dict[str, Any]:
     """Return notifications policy block (always_notify, cc_by_assessment, global_policy_triggers)."""
-    path = _config_path()
-    with open(path, "r") as f:
-        data = yaml.safe_load(f) or {}
-    return data.get("notifications") or {}
+    return get_config().notifications
 
 def load_assessment_rules() -> List[Dict[str, Any]]:
     """Return the 'assessments' rules list (each with name, optional incident_types, patterns[], policy_actions?)."""
-    path = _config_path()
-    with open(path, "r") as f:
-        data = yaml.safe_load(f) or {}
-    assessments = data.get("assessments") or []
-    return assessments if isinstance(assessments, list) else []
+    return get_config().assessments
 
 def load_global_policy_triggers() -> Dict[str, List[str]]:
     """Shortcut to notifications.global_policy_triggers (contact_gp_if[], call_999_if[])."""
-    notif = load_notifications()
-    trig = notif.get("global_policy_triggers") or {}
-    # Ensure list types
-    return {
-        "contact_gp_if": list(trig.get("contact_gp_if") or []),
-        "call_999_if": list(trig.get("call_999_if") or []),
-    }
+    return get_config().policy_triggers
@@ -0,0 +1,99 @@
+"""
+tenants.py
+
+Tenant selection for multi-tenant deployments (one backend, many care providers).
+
+The tenant for a request comes from an API key (X-API-Key, mapped via the
+TENANT_API_KEYS YAML file `{api_key: tenant_id}`) or, only when no API keys are
+configured, the X-Tenant-Id header. It is bound to a context variable for the duration of the request. Config loaders
+(app/config/incident_config.py) read it to pick the tenant's overlay file,
+TENANT_CONFIG_DIR/<tenant>.yml. No tenant means the base INCIDENT_CONFIG.
+"""
+
+from __future__ import annotations
+import os
+import os.path as p
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+import yaml
+
+_TENANT: ContextVar[Optional[str]] = ContextVar("tenant", default=None)
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+_KEYS_LOCK = threading.Lock()
+_KEYS_CACHE: Tuple[Optional[float], Dict[str, str]] = (None, {})
+
+
+@contextmanager
+def bind_tenant(tenant: Optional[str]) -> Iterator[Optional[str]]:
+    """Make `tenant` the current tenant for config lookups inside the block."""
+    token = _TENANT.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _TENANT.reset(token)
+
+
+def current_tenant() -> Optional[str]:
+    return _TENANT.get()
+
+
+def tenant_config_dir() -> Optional[str]:
+    return os.getenv("TENANT_CONFIG_DIR") or None
+
+
+def tenant_config_path(tenant: str) -> str:
+    """Path of a tenant's overlay file; raises ValueError for unknown or malformed ids."""
+    d = tenant_config_dir()
+    if not d or not _TENANT_ID_RE.match(tenant):
+        raise ValueError(f"Unknown tenant: {tenant}")
+    path = p.join(d, f"{tenant}.yml")
+    if not p.isfile(path):
+        raise ValueError(f"Unknown tenant: {tenant}")
+    return path
+
+
+def _api_keys() -> Dict[str, str]:
+    """{api_key: tenant_id} from TENANT_API_KEYS (reloaded when the file changes)."""
+    global _KEYS_CACHE
+    path = os.getenv("TENANT_API_KEYS")
+    if not path:
+        return {}
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    with _KEYS_LOCK:
+        if _KEYS_CACHE[0] != mtime:
+            with open(path, "r") as f:
+                data = yaml.safe_load(f) or {}
+            _KEYS_CACHE = (mtime, {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {})
+        return _KEYS_CACHE[1]
+
+
+def resolve_tenant(tenant_header: Optional[str], api_key: Optional[str]) -> Optional[str]:
+    """
+    Pick the request's tenant. An API key wins and must be known (PermissionError);
+    an X-Tenant-Id that disagrees with the key is rejected (PermissionError). Once
+    TENANT_API_KEYS is configured, X-Tenant-Id without a key is rejected too
+    (PermissionError), so a tenant cannot be claimed without its key. An unknown
+    tenant id raises ValueError. Returns None for the base config.
+    """
+    tenant = None
+    if api_key:
+        tenant = _api_keys().get(api_key)
+        if tenant is None:
+            raise PermissionError("Invalid API key")
+        if tenant_header and tenant_header != tenant:
+            raise PermissionError("X-Tenant-Id does not match API key")
+    elif tenant_header:
+        if os.getenv("TENANT_API_KEYS"):
+            raise PermissionError("X-API-Key required to select a tenant")
+        tenant = tenant_header
+    if tenant:
+        tenant_config_path(tenant)  # validate early
+    return tenant
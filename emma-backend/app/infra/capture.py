@@ -0,0 +1,95 @@
+"""
+capture.py
+
+Opt-in capture of production traffic for deterministic replay (see bench/replay.py).
+
+With CAPTURE_PATH set, each /analyze request appends one record to a gzip file:
+the transcript, the anchor ("now") time, the raw LLM response text, the final output
+and the stage timings. Each record is its own gzip member, so the file is append-only
+(several workers can share it), a torn write only loses the last record, and the
+whole file still reads back as one stream. CAPTURE_SAMPLE (0..1, default 1) keeps a
+fraction of requests.
+
+Pipeline code adds to the current record with note(key, value); outside a capture
+session this does nothing.
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from app.infra.logging import get_logger
+from app.util.env import env_num
+
+log = get_logger("app.infra.capture")
+
+_CURRENT: ContextVar[Optional[Dict[str, Any]]] = ContextVar("capture_record", default=None)
+_WRITE_LOCK = threading.Lock()
+
+
+def capture_path() -> Optional[str]:
+    return os.getenv("CAPTURE_PATH") or None
+
+
+def _sampled() -> bool:
+    rate = env_num("CAPTURE_SAMPLE", 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+@contextmanager
+def capture_session(transcript: str, **meta: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Open a capture record for one request. Yields the record (or None when capture is off
+    or the request is not sampled). The caller sets record["output"]; records without an
+    output (failed requests) are not written.
+    """
+    path = capture_path()
+    if not path or not _sampled():
+        yield None
+        return
+    record: Dict[str, Any] = {"at": time.time(), "transcript": transcript, **meta}
+    token = _CURRENT.set(record)
+    try:
+        yield record
+    finally:
+        _CURRENT.reset(token)
+    if "output" in record:
+        append_record(path, record)
+
+
+def note(key: str, value: Any) -> None:
+    """Attach `key` to the current capture record, if any."""
+    record = _CURRENT.get()
+    if record is not None:
+        record[key] = value
+
+
+def append_record(path: str, record: Dict[str, Any]) -> None:
+    """Append one record as a standalone gzip member (compressed outside the lock)."""
+    try:
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        member = gzip.compress(line, compresslevel=6)
+        with _WRITE_LOCK:
+            with open(path, "ab") as f:
+                f.write(member)
+    except Exception as e:
+        log.warning("capture.write.failed: %s", e)
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield records from a capture file; a truncated trailing record is skipped."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError) as e:
+            log.warning("capture.read.truncated path=%s: %s", path, e)
@@ -0,0 +1,154 @@
+"""
+cpu_pool.py
+
+Process-pool offload for CPU-bound (GIL-holding) pipeline stages.
+
+With CPU_POOL_WORKERS > 0, work on transcripts of at least CPU_OFFLOAD_MIN_CHARS
+characters runs in a pre-warmed pool of worker processes, so a few long
+transcripts cannot starve the threads serving everyone else. Short transcripts
+stay inline, because IPC would cost more than the work. Workers run an initializer
+once at start (e.g. to load compiled config), so only the job arguments and the
+compact result are pickled per call.
+
+When CPU_POOL_MAX_QUEUE jobs are already waiting for a worker, run() sheds the new
+job (PoolBusy) so the caller does it inline at once instead of queueing behind the
+backlog. A job still queued after CPU_POOL_TIMEOUT is cancelled (the caller runs it
+inline); one that has started is waited for, so no work is ever done twice.
+
+Workers use the "spawn" start method by default (CPU_POOL_START_METHOD), so they
+never fork a process that already has logging/outbox threads running.
+"""
+
+from __future__ import annotations
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.infra.logging import get_logger
+from app.infra.metrics import Counter, Gauge, Histogram
+from app.util.env import env_int, env_num
+
+log = get_logger("app.infra.cpu_pool")
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_INFLIGHT = 0
+_INFLIGHT_LOCK = threading.Lock()
+
+CPU_OFFLOAD = Counter(
+    "emma_cpu_offload_total",
+    "Jobs for the CPU process pool by outcome (ok, error, timeout, shed).",
+    ["outcome"],
+)
+CPU_POOL_WAIT = Histogram(
+    "emma_cpu_pool_wait_seconds",
+    "Time an offloaded job waited for a free worker process.",
+)
+CPU_POOL_INFLIGHT = Gauge(
+    "emma_cpu_pool_inflight",
+    "Offloaded jobs submitted and not yet finished.",
+    fn=lambda: _INFLIGHT,
+)
+CPU_POOL_QUEUE_DEPTH = Gauge(
+    "emma_cpu_pool_queue_depth",
+    "Offloaded jobs waiting for a worker process.",
+    fn=lambda: max(0, _INFLIGHT - pool_workers()) if _POOL is not None else 0,
+)
+
+
+class PoolBusy(RuntimeError):
+    """Raised by run() instead of queueing when CPU_POOL_MAX_QUEUE jobs are already waiting."""
+
+
+def pool_workers() -> int:
+    return max(0, int(env_num("CPU_POOL_WORKERS", 0)))
+
+
+def should_offload(n_chars: int) -> bool:
+    """True when the pool is enabled and the input is long enough to be worth the IPC."""
+    return pool_workers() > 0 and n_chars >= env_num("CPU_OFFLOAD_MIN_CHARS", 20000)
+
+
+def _ping() -> int:
+    time.sleep(0.05)  # long enough that each warm-up task lands on a different process
+    return os.getpid()
+
+
+def _timed_call(fn: Callable[..., Any], submitted_at: float, args: tuple) -> tuple:
+    """Runs in the worker: report queue wait alongside the result."""
+    return time.time() - submitted_at, fn(*args)
+
+
+def start(initializer: Optional[Callable[[], None]] = None) -> Optional[ProcessPoolExecutor]:
+    """Create the pool (once) and spawn every worker now rather than on first use."""
+    global _POOL
+    workers = pool_workers()
+    if workers <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is not None:
+            return _POOL
+        started = time.perf_counter()
+        ctx = multiprocessing.get_context(os.getenv("CPU_POOL_START_METHOD", "spawn"))
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=initializer)
+        pids = {f.result() for f in [pool.submit(_ping) for _ in range(workers)]}
+        _POOL = pool
+    log.info("cpu_pool.started workers=%s warm=%s ms=%.1f", workers, len(pids), (time.perf_counter() - started) * 1000)
+    return _POOL
+
+
+def shutdown() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(fn: Callable[..., Any], *args: Any, initializer: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Run fn(*args) in the pool and return its result (blocks the calling thread, not the GIL).
+    `fn` and its arguments must be picklable. Raises PoolBusy when the queue is full,
+    FutureTimeout when the job never started in time (it is cancelled), and the job's
+    own error on failure; a broken pool is discarded so the next call starts a fresh one.
+    After PoolBusy or FutureTimeout the job has not run, so the caller can run it inline.
+    """
+    global _INFLIGHT
+    pool = _POOL or start(initializer)
+    if pool is None:
+        raise RuntimeError("CPU pool disabled")
+    workers = pool_workers()
+    with _INFLIGHT_LOCK:
+        if _INFLIGHT - workers >= env_int("CPU_POOL_MAX_QUEUE", 2 * workers):
+            CPU_OFFLOAD.inc(outcome="shed")
+            raise PoolBusy(f"{_INFLIGHT} jobs in flight")
+        _INFLIGHT += 1
+    try:
+        future = pool.submit(_timed_call, fn, time.time(), args)
+        try:
+            wait, result = future.result(timeout=env_num("CPU_POOL_TIMEOUT", 30))
+        except FutureTimeout:
+            if future.cancel():
+                CPU_OFFLOAD.inc(outcome="timeout")
+                raise
+            wait, result = future.result()  # already running: the caller must not redo it
+        CPU_POOL_WAIT.observe(max(0.0, wait))
+        CPU_OFFLOAD.inc(outcome="ok")
+        return result
+    except FutureTimeout:
+        raise  # counted above
+    except BrokenProcessPool:
+        CPU_OFFLOAD.inc(outcome="error")
+        log.error("cpu_pool.broken restarting")
+        shutdown()
+        raise
+    except Exception:
+        CPU_OFFLOAD.inc(outcome="error")
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT -= 1
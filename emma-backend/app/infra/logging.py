@@ -2,21 +2,219 @@
 logging.py
 
 This module configures application-wide logging and provides a helper to create namespaced loggers.
+
+- Records are handed to a bounded queue and written by a background thread (LOG_ASYNC, default on);
+  when the queue is full the record is dropped and counted, never blocking the request thread.
+- Messages are formatted lazily on the writer thread (use `log.info("event key=%s", value)`).
+- LOG_FORMAT=json emits one JSON object per line with request_id and any `extra=` fields
+  (e.g. stage durations).
+- LOG_SAMPLE / LOG_RATE_LIMIT thin out high-volume events, keyed by the first word of the message.
 """
 
+import atexit
+import json
 import logging, sys, os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.infra.metrics import Counter
+from app.util.env import env_int
+
+LOG_DROPPED = Counter("emma_log_dropped_total", "Log records dropped because the log queue was full.")
+LOG_SUPPRESSED = Counter("emma_log_suppressed_total", "Log records skipped by sampling or rate limits.", ["event"])
+
+_REQUEST_ID: ContextVar[Optional[str]] = ContextVar("emma_request_id", default=None)
+_LISTENER: Optional[QueueListener] = None
+_LEVEL = None
+
+# LogRecord attributes that are not user `extra=` fields.
+_STD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+@contextmanager
+def bind_request_id(request_id: Optional[str] = None) -> Iterator[str]:
+    """Attach a request id (given or generated) to every record logged inside the block."""
+    rid = request_id or uuid.uuid4().hex[:16]
+    token = _REQUEST_ID.set(rid)
+    try:
+        yield rid
+    finally:
+        _REQUEST_ID.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    return _REQUEST_ID.get()
+
+
+def _event(record: logging.LogRecord) -> str:
+    return str(record.msg).split(" ", 1)[0]
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp request_id on the record while still on the request thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _REQUEST_ID.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Per-event sampling and rate limits. Warnings and errors always pass.
+      LOG_SAMPLE="analyze_transcript.start=0.1,llm.result.keys=0.5"   (keep fraction)
+      LOG_RATE_LIMIT="/analyze=50"                                     (max records per second)
+    """
+
+    def __init__(self, sample: Dict[str, float], rate: Dict[str, int]):
+        super().__init__()
+        self.sample = sample
+        self.rate = rate
+        self._seen: Dict[str, int] = {}
+        self._windows: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        event = _event(record)
+        keep_frac = self.sample.get(event)
+        limit = self.rate.get(event)
+        if keep_frac is None and limit is None:
+            return True
+        with self._lock:
+            if keep_frac is not None:
+                # Deterministic 1-in-N keeps the cost to a counter bump.
+                n = self._seen.get(event, 0)
+                self._seen[event] = n + 1
+                every = max(1, round(1 / keep_frac)) if keep_frac > 0 else 0
+                if not every or n % every:
+                    LOG_SUPPRESSED.inc(event=event)
+                    return False
+            if limit is not None:
+                sec = int(time.monotonic())
+                window, count = self._windows.get(event, (sec, 0))
+                if window != sec:
+                    window, count = sec, 0
+                if count >= limit:
+                    LOG_SUPPRESSED.inc(event=event)
+                    return False
+                self._windows[event] = (window, count + 1)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that defers output formatting to the writer thread and drops (counted) when full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (as the stdlib handler does): mutable args may change before the
+        # writer thread gets to them. Tracebacks must not outlive the request frames either.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, message, request_id, extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": _event(record),
+            "message": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            out["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _STD_ATTRS:
+                out[key] = value
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str, separators=(",", ":"))
+
+
+def _parse_kv(raw: Optional[str], cast):
+    out = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        k, v = item.rsplit("=", 1)
+        try:
+            out[k.strip()] = cast(v.strip())
+        except ValueError:
+            continue
+    return out
+
 
 def setup_logging(level=None):
+    """Install the root handler (async queue by default) per LOG_LEVEL / LOG_FORMAT / LOG_ASYNC."""
+    global _LISTENER, _LEVEL
+    _LEVEL = level
     level_name = (os.getenv("LOG_LEVEL") or "").upper()
     if level is None:
         level = getattr(logging, level_name, logging.INFO) if level_name else logging.INFO
     handler = logging.StreamHandler(sys.stdout)
-    fmt = logging.Formatter('%(asctime)s %(levelname)s %(name)s - %(message)s')
+    if (os.getenv("LOG_FORMAT") or "text").lower() == "json":
+        fmt = JsonFormatter()
+    else:
+        fmt = logging.Formatter('%(asctime)s %(levelname)s %(name)s - %(message)s')
     handler.setFormatter(fmt)
+
+    flush_logging()
+
     root = logging.getLogger()
     root.handlers.clear()
-    root.addHandler(handler)
+    if os.getenv("LOG_ASYNC", "1").lower() in ("0", "false", "no"):
+        front: logging.Handler = handler
+    else:
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=env_int("LOG_QUEUE_SIZE", 10000))
+        front = NonBlockingQueueHandler(q)
+        _LISTENER = QueueListener(q, handler, respect_handler_level=False)
+        _LISTENER.start()
+    front.addFilter(SamplingFilter(_parse_kv(os.getenv("LOG_SAMPLE"), float),
+                                   _parse_kv(os.getenv("LOG_RATE_LIMIT"), int)))
+    front.addFilter(_ContextFilter())
+    root.addHandler(front)
     root.setLevel(level)
 
+def flush_logging():
+    """Drain the log queue and stop the writer thread (called at exit)."""
+    global _LISTENER
+    if _LISTENER is not None:
+        try:
+            _LISTENER.stop()
+        except Exception:
+            pass
+        _LISTENER = None
+
+atexit.register(flush_logging)
+
+def _restart_after_fork():
+    """A pre-forked worker inherits the log queue but not its writer thread; start fresh ones."""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER = None
+        setup_logging(_LEVEL)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
 def get_logger(name: str):
     return logging.getLogger(name)
@@ -0,0 +1,274 @@
+"""
+metrics.py
+
+In-process metrics (counters, gauges, latency histograms) exposed in Prometheus
+text format at /metrics. No external dependency; recording is one dict update
+under a per-metric lock, cheap enough to leave on in production.
+"""
+
+from __future__ import annotations
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond regex stages up to slow LLM round trips.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines in Prometheus text format."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Set/inc/dec gauge; or pass `fn` to read the value at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._fn = fn
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self._fn is not None:
+            try:
+                return [f"{self.name} {_fmt_num(self._fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._series.items()]
+        out: List[str] = []
+        for key, counts, total in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = f'le="{_fmt_num(bound)}"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total!r}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {acc}")
+        return out
+
+
+def render_prometheus() -> str:
+    """All registered metrics in Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for metric in list(_REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- Pipeline metrics ----
+
+STAGE_SECONDS = Histogram(
+    "emma_stage_duration_seconds",
+    "Latency of each analysis pipeline stage.",
+    ["stage"],
+)
+ANALYZE_TOTAL = Counter(
+    "emma_analyze_total",
+    "Completed analyses by extraction_source.",
+    ["extraction_source"],
+)
+LLM_CALLS = Counter(
+    "emma_llm_calls_total",
+    "LLM extraction calls by outcome (ok, empty, api_error, parse_error, truncated) and mode (structured, json).",
+    ["outcome", "mode"],
+)
+LLM_FALLBACKS = Counter(
+    "emma_llm_fallbacks_total",
+    "Analyses where the LLM was enabled but rules produced the result, by LLM output mode.",
+    ["mode"],
+)
+LLM_TOKENS = Counter(
+    "emma_llm_tokens_total",
+    "Tokens reported by the LLM provider (resp.usage).",
+    ["kind"],
+)
+LLM_TOKENS_PER_CALL = Histogram(
+    "emma_llm_tokens_per_call",
+    "Prompt/completion tokens per LLM call by output mode.",
+    ["kind", "mode"],
+    buckets=(50, 100, 200, 300, 400, 600, 800, 1200, 1600, 3200, 6400, 12800),
+)
+LLM_INVALID_FIELDS = Counter(
+    "emma_llm_invalid_fields_total",
+    "Structured-output fields dropped for having the wrong type (the rest of the answer is kept).",
+    ["field"],
+)
+
+
+# Per-request stage timings (set by collect_stage_timings, e.g. for profiles).
+_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("emma_stage_timings", default=None)
+
+# Set while warming up, so cold-start timings stay out of the stage histogram.
+_UNOBSERVED: ContextVar[bool] = ContextVar("emma_stages_unobserved", default=False)
+
+# Span factory for stages (installed by app.infra.tracing); None means stages are only timed.
+_STAGE_SPAN: Optional[Callable] = None
+
+
+def set_stage_tracer(factory: Optional[Callable]) -> None:
+    """Open `factory(name)` around every stage(), so stages show up as trace spans."""
+    global _STAGE_SPAN
+    _STAGE_SPAN = factory
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and in the current request's timings (if collected)."""
+    if _UNOBSERVED.get():
+        return
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def unobserved_stages() -> Iterator[None]:
+    """Run stages without recording them (warm-up: first runs compile regexes and load imports)."""
+    token = _UNOBSERVED.set(True)
+    try:
+        yield
+    finally:
+        _UNOBSERVED.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into emma_stage_duration_seconds{stage=name} (and trace it, if tracing)."""
+    start = time.perf_counter()
+    try:
+        if _STAGE_SPAN is None:
+            yield
+        else:
+            with _STAGE_SPAN(name):
+                yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect {stage: seconds} for everything timed inside the block (current context only).
+    Nested collectors share the outer dict.
+    """
+    current = _TIMINGS.get()
+    if current is not None:
+        yield current
+        return
+    timings: Dict[str, float] = {}
+    token = _TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _TIMINGS.reset(token)
+
+
+def record_llm_usage(usage, mode: str = "") -> None:
+    """Add prompt/completion token counts from an OpenAI `resp.usage` object (if present)."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        n = getattr(usage, kind, None)
+        if isinstance(n, int) and n > 0:
+            LLM_TOKENS.inc(n, kind=kind.split("_", 1)[0])
+            LLM_TOKENS_PER_CALL.observe(n, kind=kind.split("_", 1)[0], mode=mode)
@@ -0,0 +1,174 @@
+"""
+profiling.py
+
+On-demand and sampled request profiling.
+
+- On demand: `?profile=1` on /analyze (requires PROFILE_ENABLED=1, and the
+  X-Profile-Token header when PROFILE_TOKEN is set) returns a cProfile call tree
+  and a tracemalloc allocation summary with the response.
+- Sampled: PROFILE_SAMPLE_RATE=N profiles 1 in N requests and writes the report,
+  with the request's stage timings, to PROFILE_DIR (newest PROFILE_KEEP files kept).
+
+Only one request is profiled at a time per process (cProfile and tracemalloc are
+process-wide); a request that cannot get the profiler simply runs unprofiled.
+"""
+
+from __future__ import annotations
+import cProfile
+import io
+import itertools
+import json
+import os
+import os.path as p
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.infra.logging import get_logger
+from app.infra.metrics import collect_stage_timings
+from app.util.env import env_int
+
+log = get_logger("app.infra.profiling")
+
+_PROFILER_LOCK = threading.Lock()
+_COUNTER = itertools.count(1)
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR") or "profiles"
+
+
+def on_demand_allowed(token: Optional[str]) -> bool:
+    """?profile=1 is honoured only when enabled, and with the right token if one is configured."""
+    if os.getenv("PROFILE_ENABLED", "0").lower() not in ("1", "true", "yes"):
+        return False
+    expected = os.getenv("PROFILE_TOKEN")
+    return not expected or token == expected
+
+
+def should_sample() -> bool:
+    """True for 1 in PROFILE_SAMPLE_RATE requests (0/unset disables sampling)."""
+    rate = env_int("PROFILE_SAMPLE_RATE", 0)
+    return rate > 0 and next(_COUNTER) % rate == 0
+
+
+class RequestProfile:
+    """Result holder filled in when the profiled block exits."""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.meta = meta
+        self.active = False
+        self.report: Dict[str, Any] = {}
+
+
+def _call_tree(prof: cProfile.Profile, limit: int) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(prof, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    stats.print_callees(limit // 2)
+    return out.getvalue()
+
+
+def _alloc_summary(snapshot: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    top = snapshot.statistics("lineno")[:limit]
+    return [
+        {"where": str(s.traceback[0]), "size_kb": round(s.size / 1024, 1), "count": s.count}
+        for s in top
+    ]
+
+
+@contextmanager
+def profile_request(meta: Optional[Dict[str, Any]] = None, persist: bool = False) -> Iterator[RequestProfile]:
+    """
+    Profile the enclosed block (CPU call tree + allocations + stage timings).
+    With `persist`, the report is also written to PROFILE_DIR.
+    """
+    holder = RequestProfile(dict(meta or {}))
+    if not _PROFILER_LOCK.acquire(blocking=False):
+        with collect_stage_timings():
+            yield holder
+        return
+    prof = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        holder.active = True
+        start = time.perf_counter()
+        with collect_stage_timings() as timings:
+            prof.enable()
+            try:
+                yield holder
+            finally:
+                prof.disable()
+                duration = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+        holder.report = {
+            "id": uuid.uuid4().hex[:12],
+            "at": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            "stage_timings_ms": {k: round(v * 1000, 3) for k, v in timings.items()},
+            "peak_alloc_kb": round(peak / 1024, 1),
+            "top_allocations": _alloc_summary(snapshot, 15),
+            "call_tree": _call_tree(prof, 40),
+            **holder.meta,
+        }
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _PROFILER_LOCK.release()
+    if persist and holder.report:
+        _write_report(holder.report)
+
+
+def _write_report(report: Dict[str, Any]) -> None:
+    """Write one profile as JSON; duration leads the filename so listings need no parsing."""
+    d = profile_dir()
+    try:
+        os.makedirs(d, exist_ok=True)
+        name = f"{int(report['duration_ms'] * 1000):012d}_{int(report['at'])}_{report['id']}.json"
+        with open(p.join(d, name), "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        _prune(d, env_int("PROFILE_KEEP", 200))
+    except Exception as e:
+        log.warning("profile.write.failed: %s", e)
+
+
+def _prune(d: str, keep: int) -> None:
+    """Keep only the newest `keep` profiles."""
+    files = [f for f in os.listdir(d) if f.endswith(".json")]
+    if len(files) <= keep:
+        return
+    files.sort(key=lambda f: int(f.split("_")[1]))
+    for f in files[: len(files) - keep]:
+        try:
+            os.remove(p.join(d, f))
+        except OSError:
+            pass
+
+
+def list_slowest(limit: int = 20, include_tree: bool = False) -> List[Dict[str, Any]]:
+    """Slowest stored profiles (from PROFILE_DIR), slowest first."""
+    d = profile_dir()
+    if not p.isdir(d):
+        return []
+    files = sorted((f for f in os.listdir(d) if f.endswith(".json")), reverse=True)[:limit]
+    out: List[Dict[str, Any]] = []
+    for f in files:
+        try:
+            with open(p.join(d, f), "r", encoding="utf-8") as fh:
+                report = json.load(fh)
+        except Exception:
+            continue
+        if not include_tree:
+            report.pop("call_tree", None)
+            report.pop("top_allocations", None)
+        report["file"] = f
+        out.append(report)
+    return out
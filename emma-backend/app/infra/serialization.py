@@ -0,0 +1,34 @@
+"""
+serialization.py
+
+Fast JSON responses for API results.
+
+Results are plain dicts of JSON-native values, so they bypass FastAPI's
+`jsonable_encoder` walk and are encoded once: with orjson if installed,
+otherwise with the stdlib encoder in compact mode.
+"""
+
+from __future__ import annotations
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # optional speed-up; stdlib json is the fallback
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that encodes already-JSON-native content without jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,394 @@
+"""
+tracing.py
+
+Request-scoped tracing without external dependencies. It provides spans, W3C trace
+context propagation, head plus tail sampling, and a batched background exporter.
+
+- TRACE_EXPORT selects the exporter. Leave it empty to turn tracing off (default). Set a
+  file path for JSON lines (one span per line), or the http(s) URL of an OTLP/HTTP JSON
+  traces endpoint (e.g. http://127.0.0.1:4318/v1/traces).
+- Sampling:
+  - Head: TRACE_SAMPLE (fraction, default 0.01), or the sampled flag of an incoming
+    `traceparent` header.
+  - Tail: every request is recorded in memory regardless. When it ends, traces slower
+    than TRACE_SLOW_MS (default 2000) or with an errored span are kept too.
+- Span sources:
+  - start_trace() opens the root (server) span.
+  - span() and @traced open children.
+  - Every metrics.stage() is also a span, so the pipeline stages form the waterfall.
+  - annotate() adds attributes to the current span.
+  - Outside a trace all of these are no-ops.
+- Export runs on a background thread from a bounded queue. When the queue is full, traces
+  are dropped and counted, so requests never block on export.
+"""
+
+from __future__ import annotations
+import atexit
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.infra import metrics
+from app.infra.logging import get_logger
+from app.infra.metrics import Counter
+from app.util.env import env_num
+
+log = get_logger("app.infra.tracing")
+
+TRACES = Counter(
+    "emma_traces_total",
+    "Finished traces by sampling decision (head, error, slow, discarded, dropped).",
+    ["decision"],
+)
+SPANS_EXPORTED = Counter("emma_trace_spans_exported_total", "Spans written by the trace exporter.")
+TRACE_EXPORT_ERRORS = Counter("emma_trace_export_errors_total", "Failed trace export batches.")
+
+_CURRENT: ContextVar[Optional["Span"]] = ContextVar("emma_span", default=None)
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def tracing_enabled() -> bool:
+    return bool(os.getenv("TRACE_EXPORT"))
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "dropped_spans")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped_spans = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def update(self, **attrs: Any) -> None:
+        self.attributes.update(attrs)
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"[:500]
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_unix_nano": self.start_ns,
+            "end_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    trace = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def update(self, **attrs: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _is_server_error(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", 500) >= 500  # HTTP 4xx responses are not span errors
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs: Any) -> Iterator[Any]:
+    """Child span of the current one; a no-op outside a trace."""
+    parent = _CURRENT.get()
+    if parent is None:
+        yield _NOOP
+        return
+    trace = parent.trace
+    if len(trace.spans) >= env_num("TRACE_MAX_SPANS", 512):
+        trace.dropped_spans += 1
+        yield _NOOP
+        return
+    sp = Span(trace, name, parent.span_id, kind, attrs)
+    trace.spans.append(sp)
+    token = _CURRENT.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        if _is_server_error(e):
+            sp.record_error(e)
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _CURRENT.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator: run the function in a span (named after it by default) when inside a trace."""
+    def deco(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _CURRENT.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def annotate(**attrs: Any) -> None:
+    """Add attributes to the current span (no-op outside a trace)."""
+    sp = _CURRENT.get()
+    if sp is not None:
+        sp.attributes.update(attrs)
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C `traceparent` header, or None if absent/invalid."""
+    m = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if not m or m.group(1) == "ff" or set(m.group(2)) == {"0"} or set(m.group(3)) == {"0"}:
+        return None
+    return m.group(2), m.group(3), bool(int(m.group(4), 16) & 1)
+
+
+def current_traceparent() -> Optional[str]:
+    """`traceparent` for outbound calls made inside the current span."""
+    sp = _CURRENT.get()
+    if sp is None:
+        return None
+    return f"00-{sp.trace.trace_id}-{sp.span_id}-{'01' if sp.trace.sampled else '00'}"
+
+
+def current_trace_id() -> Optional[str]:
+    sp = _CURRENT.get()
+    return sp.trace.trace_id if sp is not None else None
+
+
+@contextmanager
+def start_trace(name: str, traceparent: Optional[str] = None, **attrs: Any) -> Iterator[Any]:
+    """
+    Root (server) span for one request. Continues the caller's trace if `traceparent` is valid.
+    On exit the trace is exported if head-sampled, errored, or slower than TRACE_SLOW_MS.
+    """
+    if not tracing_enabled():
+        yield _NOOP
+        return
+    parent = parse_traceparent(traceparent)
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, False
+    trace = _Trace(trace_id, sampled or random.random() < env_num("TRACE_SAMPLE", 0.01))
+    root = Span(trace, name, parent_id, "server", attrs)
+    trace.spans.append(root)
+    token = _CURRENT.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        if _is_server_error(e):
+            root.record_error(e)
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _CURRENT.reset(token)
+        _finish(trace, root)
+
+
+def _finish(trace: _Trace, root: Span) -> None:
+    if trace.sampled:
+        reason = "head"
+    elif any(s.error for s in trace.spans):
+        reason = "error"
+    elif root.duration_ms >= env_num("TRACE_SLOW_MS", 2000):
+        reason = "slow"
+    else:
+        TRACES.inc(decision="discarded")
+        return
+    root.update(**{"sampling.reason": reason})
+    if trace.dropped_spans:
+        root.set("trace.dropped_spans", trace.dropped_spans)
+    exporter = _get_exporter()
+    if exporter is not None and exporter.submit(trace.spans):
+        TRACES.inc(decision=reason)
+    else:
+        TRACES.inc(decision="dropped")
+
+
+# --- export ------------------------------------------------------------------------------
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": v if isinstance(v, str) else json.dumps(v, default=str)}
+
+
+def otlp_payload(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """OTLP/HTTP JSON ExportTraceServiceRequest for `spans`."""
+    out = []
+    for s in spans:
+        item = {
+            "traceId": s.trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": _KINDS.get(s.kind, 1),
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items() if v is not None],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        out.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "app.infra.tracing"}, "spans": out}],
+    }]}
+
+
+class TraceExporter:
+    """Background batch exporter: TRACE_BATCH spans or every TRACE_FLUSH_SECONDS, whichever first."""
+
+    _STOP = object()
+
+    def __init__(self, target: str):
+        self.target = target
+        self.batch_size = int(env_num("TRACE_BATCH", 512))
+        self.interval = env_num("TRACE_FLUSH_SECONDS", 2.0)
+        self.service_name = os.getenv("TRACE_SERVICE_NAME", "emma-backend")
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=int(env_num("TRACE_QUEUE_SIZE", 1000)))
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, spans: List[Span]) -> bool:
+        try:
+            self._queue.put_nowait(spans)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.01, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                self._flush(batch)
+                return
+            if item:
+                batch.extend(item)
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+
+    def _flush(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        try:
+            if self.target.startswith(("http://", "https://")):
+                body = json.dumps(otlp_payload(spans, self.service_name)).encode("utf-8")
+                req = urllib.request.Request(self.target, data=body, method="POST",
+                                             headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(req, timeout=env_num("TRACE_EXPORT_TIMEOUT", 5)) as resp:
+                    resp.read()
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(self.target)), exist_ok=True)
+                lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+                with open(self.target, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            SPANS_EXPORTED.inc(len(spans))
+        except Exception as e:
+            TRACE_EXPORT_ERRORS.inc()
+            log.warning("trace.export.failed spans=%s: %s", len(spans), e)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+_EXPORTER: Optional[TraceExporter] = None
+_EXPORTER_LOCK = threading.Lock()
+
+
+def _get_exporter() -> Optional[TraceExporter]:
+    global _EXPORTER
+    target = os.getenv("TRACE_EXPORT")
+    if not target:
+        return None
+    if _EXPORTER is None or _EXPORTER.target != target:
+        with _EXPORTER_LOCK:
+            if _EXPORTER is None or _EXPORTER.target != target:
+                _EXPORTER = TraceExporter(target)
+    return _EXPORTER
+
+
+def flush_traces() -> None:
+    """Export whatever is queued and stop the exporter thread (called at exit)."""
+    global _EXPORTER
+    exporter, _EXPORTER = _EXPORTER, None
+    if exporter is not None:
+        exporter.shutdown()
+
+
+atexit.register(flush_traces)
+
+
+def _drop_exporter_after_fork() -> None:
+    global _EXPORTER
+    _EXPORTER = None  # its thread did not survive the fork; the next trace starts a new one
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_drop_exporter_after_fork)
+
+# Pipeline stages (metrics.stage) become spans of the current trace.
+metrics.set_stage_tracer(span)
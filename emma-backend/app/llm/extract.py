@@ -5,12 +5,22 @@ into (facts, evidence) suitable for the incident pipeline.
 Enhancements:
 - Accepts an explicit report-time anchor (ISO8601, Europe/London) so the LLM can convert
   relative phrases like "20 minutes ago" reliably.
+- Structured output (LLM_STRUCTURED_OUTPUT, default on): the provider gets a strict JSON
+  schema with short keys and enum codes, bounded evidence and a max_tokens cap; codes are
+  expanded back to the usual facts shape here. Both answer shapes are accepted either way.
 """
 
-from typing import Dict, Any, List, Tuple, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Sequence, Tuple, Optional
 import json
 import os
 import re
+import threading
+
+from app.infra import capture
+from app.infra.metrics import LLM_CALLS, LLM_INVALID_FIELDS, record_llm_usage
+from app.infra.tracing import annotate, current_traceparent, span
+from app.util.env import env_int, env_num
 
 # Whitelists used to clamp/normalize model output
 ALLOWED_INCIDENT_TYPES = [
@@ -41,10 +51,42 @@ ALLOWED_RISK_ASSESSMENTS = [
 ]
 
 
-def _build_prompt(transcript: str, report_time_iso: Optional[str] = None) -> str:
+# One prompt line per output key (order matters: it is the order the model is asked for).
+_FIELD_SPECS = [
+    ("date_time_of_incident",
+     "- date_time_of_incident (ISO8601 if present; if only relative phrases are given like "
+     "'20 minutes ago' or 'yesterday', convert using Europe/London timezone and the report "
+     "time above as the anchor; if truly unknown, null)\n"),
+    ("service_user_name", "- service_user_name (full name if present or null)\n"),
+    ("location", "- location (free text, e.g., \"living room\", or null)\n"),
+    ("incident_type",
+     "- incident_type (one of: fall | medication_refusal | medication_missed | medication_error | "
+     "aggressive_behavior | verbal_abuse | self_harm | wandering | medical_emergency | near_miss | "
+     "equipment_failure | safeguarding_concern | null)\n"),
+    ("description", "- description (1-3 sentence neutral summary of what happened)\n"),
+    ("immediate_actions_taken", "- immediate_actions_taken (null if not stated)\n"),
+    ("was_first_aid_administered", "- was_first_aid_administered (boolean; default false if not stated)\n"),
+    ("were_emergency_services_contacted",
+     "- were_emergency_services_contacted (boolean; default false unless clearly stated)\n"),
+    ("who_was_notified", "- who_was_notified (null if not stated)\n"),
+    ("witnesses", "- witnesses (null if not stated)\n"),
+    ("agreed_next_steps", "- agreed_next_steps (null if not stated)\n"),
+    ("risk_assessment_needed", "- risk_assessment_needed (boolean)\n"),
+    ("if_yes_which_risk_assessment",
+     "- if_yes_which_risk_assessment (one of: \"moving and handling risk assessment review\" | "
+     "\"medication management review\" | \"mental health/wellbeing review\" | \"infection control review\" | "
+     "\"personal care & dignity plan review\" | \"moving & handling / equipment safety review\" | "
+     "\"nutrition & hydration plan review\" | null)\n"),
+]
+LLM_FIELDS = tuple(k for k, _ in _FIELD_SPECS)
+
+
+def _build_prompt(transcript: str, report_time_iso: Optional[str] = None,
+                  fields: Optional[Sequence[str]] = None) -> str:
     """
     Compose the instruction + schema-constrained prompt for the LLM.
     Optionally includes a report-time anchor (ISO8601, Europe/London) for relative time conversion.
+    `fields` restricts the requested keys (incremental re-analysis); None asks for all of them.
     Returns a single string that asks the model to output ONLY valid JSON.
     """
     anchor_line = (
@@ -52,30 +94,12 @@ def _build_prompt(transcript: str, report_time_iso: Optional[str] = None) -> str
         if report_time_iso else
         ""
     )
+    keys = "".join(line for k, line in _FIELD_SPECS if fields is None or k in fields)
     return (
         "You are an information extraction assistant for adult social care incident reporting.\n"
         + anchor_line +
         "From the call transcript below, return ONLY valid JSON with these keys:\n"
-        "- date_time_of_incident (ISO8601 if present; if only relative phrases are given like "
-        "'20 minutes ago' or 'yesterday', convert using Europe/London timezone and the report "
-        "time above as the anchor; if truly unknown, null)\n"
-        "- service_user_name (full name if present or null)\n"
-        "- location (free text, e.g., \"living room\", or null)\n"
-        "- incident_type (one of: fall | medication_refusal | medication_missed | medication_error | "
-        "aggressive_behavior | verbal_abuse | self_harm | wandering | medical_emergency | near_miss | "
-        "equipment_failure | safeguarding_concern | null)\n"
-        "- description (1-3 sentence neutral summary of what happened)\n"
-        "- immediate_actions_taken (null if not stated)\n"
-        "- was_first_aid_administered (boolean; default false if not stated)\n"
-        "- were_emergency_services_contacted (boolean; default false unless clearly stated)\n"
-        "- who_was_notified (null if not stated)\n"
-        "- witnesses (null if not stated)\n"
-        "- agreed_next_steps (null if not stated)\n"
-        "- risk_assessment_needed (boolean)\n"
-        "- if_yes_which_risk_assessment (one of: \"moving and handling risk assessment review\" | "
-        "\"medication management review\" | \"mental health/wellbeing review\" | \"infection control review\" | "
-        "\"personal care & dignity plan review\" | \"moving & handling / equipment safety review\" | "
-        "\"nutrition & hydration plan review\" | null)\n"
+        + keys +
         "- evidence: array of {\"field\":\"<key>\", \"quote\":\"<short supporting quote>\"}\n\n"
         "Guidance:\n"
         "- Prefer explicit dates/times from the transcript. If only relative timing is given "
@@ -90,6 +114,174 @@ def _build_prompt(transcript: str, report_time_iso: Optional[str] = None) -> str
     )
 
 
+# --- Structured (compact) output -----------------------------------------------------
+
+COMPACT_KEYS = {
+    "date_time_of_incident": "dt",
+    "service_user_name": "su",
+    "location": "loc",
+    "incident_type": "it",
+    "description": "desc",
+    "immediate_actions_taken": "act",
+    "was_first_aid_administered": "fa",
+    "were_emergency_services_contacted": "es",
+    "who_was_notified": "ntf",
+    "witnesses": "wit",
+    "agreed_next_steps": "nxt",
+    "risk_assessment_needed": "ra",
+    "if_yes_which_risk_assessment": "rat",
+}
+_LONG_KEYS = {v: k for k, v in COMPACT_KEYS.items()}
+
+INCIDENT_TYPE_CODES = {
+    "FA": "fall",
+    "MR": "medication_refusal",
+    "MM": "medication_missed",
+    "ME": "medication_error",
+    "AB": "aggressive_behavior",
+    "VA": "verbal_abuse",
+    "SH": "self_harm",
+    "WA": "wandering",
+    "EM": "medical_emergency",
+    "NM": "near_miss",
+    "EF": "equipment_failure",
+    "SG": "safeguarding_concern",
+}
+RISK_ASSESSMENT_CODES = {f"R{i + 1}": name for i, name in enumerate(a for a in ALLOWED_RISK_ASSESSMENTS if a)}
+
+_BOOL_FIELDS = ("was_first_aid_administered", "were_emergency_services_contacted", "risk_assessment_needed")
+
+_COMPACT_HINTS = {
+    "date_time_of_incident": "date/time of incident, ISO8601; convert relative phrases ('20 minutes ago', "
+                             "'yesterday') using Europe/London and the report time above; null if unknown (do not guess)",
+    "service_user_name": "service user's full name|null",
+    "location": "location, short free text|null",
+    "incident_type": "incident type code: " + ", ".join(f"{c} {t}" for c, t in INCIDENT_TYPE_CODES.items()) + "|null",
+    "description": "1-3 sentence neutral summary",
+    "immediate_actions_taken": "immediate actions taken|null",
+    "was_first_aid_administered": "first aid given (false if not stated)",
+    "were_emergency_services_contacted": "emergency services contacted (false unless clearly stated)",
+    "who_was_notified": "who was notified|null",
+    "witnesses": "witnesses|null",
+    "agreed_next_steps": "agreed next steps|null",
+    "risk_assessment_needed": "true for a recurring pattern or policy trigger",
+    "if_yes_which_risk_assessment": "risk assessment code: "
+                                    + ", ".join(f"{c} {n}" for c, n in RISK_ASSESSMENT_CODES.items())
+                                    + "|null (R1 for recurring falls, e.g. 2nd/3rd this week)",
+}
+
+
+def output_mode() -> str:
+    """"structured" (strict compact schema, default) or "json" (long-key prompt; LLM_STRUCTURED_OUTPUT=0)."""
+    return "json" if os.getenv("LLM_STRUCTURED_OUTPUT", "1").lower() in ("0", "false", "no") else "structured"
+
+
+def _build_compact_prompt(transcript: str, report_time_iso: Optional[str], fields: Sequence[str],
+                          max_evidence: int) -> str:
+    """Short-key prompt for the strict schema from _compact_schema (same anchor and transcript layout)."""
+    anchor_line = (
+        f"Current report time (anchor) in Europe/London is: {report_time_iso}\n"
+        if report_time_iso else
+        ""
+    )
+    keys = "".join(f"{COMPACT_KEYS[k]}: {_COMPACT_HINTS[k]}\n" for k in fields)
+    return (
+        "You are an information extraction assistant for adult social care incident reporting.\n"
+        + anchor_line +
+        "Fill the JSON schema from the call transcript below. Keys:\n"
+        + keys +
+        f"ev: at most {max_evidence} evidence items {{f: one of the keys above, q: short verbatim quote}}\n"
+        "Use null when unsure. Do NOT invent names or facts.\n\n"
+        "Transcript:\n"
+        f"{transcript}"
+    )
+
+
+@lru_cache(maxsize=64)
+def _compact_schema(fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """Strict JSON schema (OpenAI structured outputs) for `fields`; treat as read-only."""
+    props: Dict[str, Any] = {}
+    for k in fields:
+        if k == "incident_type":
+            props[COMPACT_KEYS[k]] = {"type": ["string", "null"], "enum": [*INCIDENT_TYPE_CODES, None]}
+        elif k == "if_yes_which_risk_assessment":
+            props[COMPACT_KEYS[k]] = {"type": ["string", "null"], "enum": [*RISK_ASSESSMENT_CODES, None]}
+        elif k in _BOOL_FIELDS:
+            props[COMPACT_KEYS[k]] = {"type": "boolean"}
+        else:
+            props[COMPACT_KEYS[k]] = {"type": ["string", "null"]}
+    props["ev"] = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"f": {"type": "string", "enum": [COMPACT_KEYS[k] for k in fields]}, "q": {"type": "string"}},
+            "required": ["f", "q"],
+            "additionalProperties": False,
+        },
+    }
+    return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+
+def _is_compact(data: Dict[str, Any]) -> bool:
+    return "ev" in data or any(k in _LONG_KEYS for k in data)
+
+
+def _expand_compact(data: Dict[str, Any], max_evidence: int) -> Dict[str, Any]:
+    """
+    Short keys/codes -> the long-key shape the rest of the parser expects. Invalid values are
+    dropped one field at a time (counted) instead of discarding the whole answer.
+    """
+    out: Dict[str, Any] = {}
+    for short, value in data.items():
+        key = _LONG_KEYS.get(short)
+        if key is None:
+            continue
+        if key in ("incident_type", "if_yes_which_risk_assessment") and value is not None:
+            if not isinstance(value, str):  # lists/dicts are unhashable in the code lookups below
+                LLM_INVALID_FIELDS.inc(field=key)
+                continue
+            if key == "incident_type":
+                value = INCIDENT_TYPE_CODES.get(value, value if value in ALLOWED_INCIDENT_TYPES else None)
+            else:
+                value = RISK_ASSESSMENT_CODES.get(value, value if value in ALLOWED_RISK_ASSESSMENTS else None)
+        elif key in _BOOL_FIELDS and not isinstance(value, bool):
+            LLM_INVALID_FIELDS.inc(field=key)
+            continue
+        elif key not in _BOOL_FIELDS and value is not None and not isinstance(value, str):
+            LLM_INVALID_FIELDS.inc(field=key)
+            continue
+        out[key] = value
+    evidence = []
+    items = data.get("ev") or []
+    if not isinstance(items, list):
+        LLM_INVALID_FIELDS.inc(field="evidence")
+        items = []
+    for item in items[:max_evidence]:
+        f = item.get("f") if isinstance(item, dict) else None
+        if isinstance(f, str) and f in _LONG_KEYS and isinstance(item.get("q"), str):
+            evidence.append({"field": _LONG_KEYS[f], "quote": item["q"]})
+        else:
+            LLM_INVALID_FIELDS.inc(field="evidence")
+    out["evidence"] = evidence
+    return out
+
+
+def _parse_json(content: str) -> Optional[Dict[str, Any]]:
+    """Parse the model's JSON object, tolerating fences and leading/trailing chatter; None if impossible."""
+    s = _strip_md_fences(content)
+    try:
+        data = json.loads(s)
+    except ValueError:
+        i = s.find("{")
+        if i < 0:
+            return None
+        try:
+            data, _ = json.JSONDecoder().raw_decode(s, i)
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
 def _strip_md_fences(s: str) -> str:
     """
     Remove ```json ... ``` fences if the model wrapped the JSON in Markdown code blocks.
@@ -101,40 +293,142 @@ def _strip_md_fences(s: str) -> str:
     return s.strip()
 
 
-def extract_with_llm(text: str, report_time_iso: Optional[str] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    """
-    Call the OpenAI Chat Completions API with the prompt, parse/validate JSON,
-    clamp to allowed values, and return (facts, evidence).
-    - report_time_iso: ISO8601 string used as the anchor "now" (Europe/London) for relative phrases.
+_CLIENT: Any = None
+_CLIENT_KEY: Optional[Tuple[Any, ...]] = None
+_CLIENT_LOCK = threading.Lock()
 
-    Returns {} / [] if the API key is missing or a parsing error occurs.
+
+def get_client():
+    """
+    Shared OpenAI client, so its HTTP connection pool is reused across requests.
+    Rebuilt if the key/base URL/timeout settings change; dropped in forked children.
     """
+    global _CLIENT, _CLIENT_KEY
+    key = (os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL"),
+           env_num("OPENAI_TIMEOUT", 60), env_int("OPENAI_MAX_RETRIES", 2))
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT_KEY != key:
+            from openai import OpenAI
+            # OPENAI_BASE_URL (read by the client) can point this at bench/mock_openai.py.
+            _CLIENT = OpenAI(timeout=key[2], max_retries=key[3])
+            _CLIENT_KEY = key
+        return _CLIENT
+
+
+def _drop_client_after_fork() -> None:
+    global _CLIENT, _CLIENT_KEY
+    _CLIENT, _CLIENT_KEY = None, None  # never share sockets with the parent
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_drop_client_after_fork)
+
+
+def warm_connection() -> bool:
+    """Open the client's connection (TLS handshake included) with a cheap models.list() call."""
     if not os.getenv("OPENAI_API_KEY"):
-        return {}, []
+        return False
+    get_client().models.list()
+    return True
 
-    try:
-        from openai import OpenAI
-        client = OpenAI()
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        prompt = _build_prompt(text, report_time_iso=report_time_iso)
-        resp = client.chat.completions.create(
+
+def _complete(prompt: str, model: str, response_format: Optional[Dict[str, Any]] = None,
+              max_tokens: Optional[int] = None) -> Tuple[str, Any]:
+    """
+    Raw Chat Completions call: returns (content, usage).
+    Kept separate (module-level) so replay and load tools can serve recorded responses.
+    """
+    extra: Dict[str, Any] = {}
+    if response_format is not None:
+        extra["response_format"] = response_format
+    if max_tokens:
+        extra["max_tokens"] = max_tokens
+    with span("openai.chat.completions", kind="client", model=model, prompt_chars=len(prompt)) as sp:
+        traceparent = current_traceparent()
+        if traceparent:
+            extra["extra_headers"] = {"traceparent": traceparent}
+        resp = get_client().chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": "Return ONLY valid JSON."},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.0,
+            **extra,
         )
-        content = (resp.choices[0].message.content or "")
-        content = _strip_md_fences(content)
-        data = json.loads(content)
+        usage = getattr(resp, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        sp.update(**{
+            "finish_reason": resp.choices[0].finish_reason,
+            "tokens.prompt": getattr(usage, "prompt_tokens", None),
+            "tokens.completion": getattr(usage, "completion_tokens", None),
+            "tokens.cached": getattr(details, "cached_tokens", None),
+        })
+    return (resp.choices[0].message.content or ""), usage
+
+
+def _record_outcome(outcome: str, mode: str) -> None:
+    LLM_CALLS.inc(outcome=outcome, mode=mode)
+    annotate(**{"llm.outcome": outcome})
+
+
+def extract_with_llm(text: str, report_time_iso: Optional[str] = None,
+                     fields: Optional[Sequence[str]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Call the OpenAI Chat Completions API with the prompt, parse/validate JSON,
+    clamp to allowed values, and return (facts, evidence).
+    - report_time_iso: ISO8601 string used as the anchor "now" (Europe/London) for relative phrases.
+    - fields: ask for (and return) only these keys; used by incremental re-analysis.
+
+    Returns {} / [] if the API key is missing or the answer cannot be parsed at all.
+    The raw response text is noted on the capture record (if capturing).
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        return {}, []
+
+    mode = output_mode()
+    max_evidence = env_int("LLM_MAX_EVIDENCE", 8)
+    try:
+        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        annotate(**{"llm.model": model, "llm.mode": mode, "transcript_chars": len(text),
+                    "llm.fields": ",".join(fields) if fields is not None else "all"})
+        if mode == "structured":
+            wanted = tuple(k for k in LLM_FIELDS if fields is None or k in fields)
+            prompt = _build_compact_prompt(text, report_time_iso, wanted, max_evidence)
+            response_format = {"type": "json_schema",
+                               "json_schema": {"name": "incident", "strict": True, "schema": _compact_schema(wanted)}}
+            content, usage = _complete(prompt, model, response_format=response_format,
+                                       max_tokens=env_int("LLM_MAX_TOKENS", 800))
+        else:
+            prompt = _build_prompt(text, report_time_iso=report_time_iso, fields=fields)
+            content, usage = _complete(prompt, model)
+        record_llm_usage(usage, mode=mode)
+        capture.note("llm_raw", content)
+    except Exception as e:
+        _record_outcome("api_error", mode)
+        capture.note("llm_error", type(e).__name__)
+        return {}, []
+
+    try:
+        data = _parse_json(content)
+        if data is None:
+            # Cut off by max_tokens (no closing brace) vs. otherwise malformed.
+            truncated = content.strip().startswith(("{", "```")) and not _strip_md_fences(content).endswith("}")
+            _record_outcome("truncated" if truncated else "parse_error", mode)
+            return {}, []
+        if _is_compact(data):
+            data = _expand_compact(data, max_evidence)
+
+        if fields is not None:
+            data = {k: v for k, v in data.items() if k in fields or k == "evidence"}
 
         # Defensive normalization against hallucinations
-        if data.get("incident_type") not in ALLOWED_INCIDENT_TYPES:
+        if data.get("incident_type") not in ALLOWED_INCIDENT_TYPES and (fields is None or "incident_type" in data):
             data["incident_type"] = None
-        if data.get("if_yes_which_risk_assessment") not in ALLOWED_RISK_ASSESSMENTS:
+        if data.get("if_yes_which_risk_assessment") not in ALLOWED_RISK_ASSESSMENTS and (
+                fields is None or "if_yes_which_risk_assessment" in data):
             data["if_yes_which_risk_assessment"] = None
-        if "risk_assessment_needed" not in data:
+        if "risk_assessment_needed" not in data and (fields is None or "risk_assessment_needed" in fields):
             data["risk_assessment_needed"] = bool(data.get("if_yes_which_risk_assessment"))
 
         facts: Dict[str, Any] = {}
@@ -160,14 +454,17 @@ def extract_with_llm(text: str, report_time_iso: Optional[str] = None) -> Tuple[
         evidence_in = data.get("evidence", [])
         evidence: List[Dict[str, Any]] = []
         for item in evidence_in:
-            if isinstance(item, dict) and "field" in item and "quote" in item:
+            if isinstance(item, dict) and "field" in item and "quote" in item \
+                    and (fields is None or item["field"] in fields):
                 evidence.append({
                     "field": item["field"],
                     "quote": item["quote"],
                     "start_idx": None,
                     "end_idx": None
                 })
+        _record_outcome("ok" if facts else "empty", mode)
         return facts, evidence
     except Exception:
         # On any failure, let rules fallback handle it.
+        _record_outcome("parse_error", mode)
         return {}, []
@@ -5,15 +5,35 @@ This is the FastAPI entrypoint for the Incident AI backend. It exposes endpoints
 for analyzing transcripts, running LLM diagnostics, and checking health status.
 """
 
-from fastapi import FastAPI, HTTPException, Query
+import os
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from app.infra.logging import setup_logging, get_logger
-from app.services.orchestrator import analyze_transcript, analyze_transcript_llm_only, llm_diagnostic
+from app.config.tenants import bind_tenant, resolve_tenant
+from app.infra.logging import setup_logging, get_logger, bind_request_id
+from app.infra.metrics import render_prometheus, collect_stage_timings
+from app.infra import capture, cpu_pool, profiling, tracing
+from app.infra.serialization import FastJSONResponse
+from app.services.orchestrator import (
+    analyze_transcript, analyze_transcript_llm_only, llm_diagnostic, reanalyze_transcript, warm_worker,
+)
+from app.services import warmup
+from app.services.outbox import OutboxDispatcher, get_outbox, outbox_enabled
+from app.services.projection import parse_fields, project
 from typing import Optional
 
 setup_logging()
 log = get_logger("app.main")
+log.info("startup.import ms=%.1f", (time.perf_counter() - _IMPORT_STARTED) * 1000)
+
+# Pre-fork servers (gunicorn --preload) import the app once in the master; preloading
+# here lets every worker inherit compiled configs and warmed caches copy-on-write.
+if os.getenv("WARMUP_AT_IMPORT") == "1":
+    warmup.preload()
 
 app = FastAPI(title="Incident AI API")
 
@@ -26,15 +46,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_dispatcher: Optional[OutboxDispatcher] = None
+
+@app.on_event("startup")
+def start_outbox():
+    """Start background email delivery when OUTBOX_PATH is configured."""
+    global _dispatcher
+    if outbox_enabled():
+        _dispatcher = OutboxDispatcher(get_outbox())
+        _dispatcher.start()
+
+@app.on_event("startup")
+def warm_up():
+    """
+    Preload (unless already done before fork), open the LLM connection pool and spawn the
+    CPU offload pool, then flip /ready.
+    """
+    warmup.preload()
+    warmup.warm_process(pool_initializer=warm_worker)
+    warmup.mark_ready()
+
+@app.on_event("shutdown")
+def stop_outbox():
+    if _dispatcher is not None:
+        _dispatcher.stop()
+
+@app.on_event("shutdown")
+def stop_cpu_pool():
+    cpu_pool.shutdown()
+
+@app.on_event("shutdown")
+def stop_tracing():
+    tracing.flush_traces()
+
 class AnalyzeRequest(BaseModel):
     """Schema for incoming /analyze requests containing raw transcript text."""
     text: str
 
-@app.post("/analyze")
+def _tenant_or_4xx(x_tenant_id: Optional[str], x_api_key: Optional[str]) -> Optional[str]:
+    try:
+        return resolve_tenant(x_tenant_id, x_api_key)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _headers(request_id: str) -> dict:
+    """Response headers: the request id, plus the trace id when this request is traced."""
+    trace_id = tracing.current_trace_id()
+    return {"X-Request-ID": request_id, **({"X-Trace-Id": trace_id} if trace_id else {})}
+
+def _run_analysis(text: str, force_source: Optional[str], wanted):
+    if force_source == "llm":
+        return analyze_transcript_llm_only(text, fields=wanted)
+    return analyze_transcript(text, fields=wanted)
+
+@app.post("/analyze", response_class=FastJSONResponse)
 def analyze(
     req: AnalyzeRequest,
     # use 'pattern=' for Pydantic v2; if you're on v1, switch back to regex=
-    force_source: Optional[str] = Query(default=None, pattern="^(llm|rules)$")
+    force_source: Optional[str] = Query(default=None, pattern="^(llm|rules)$"),
+    fields: Optional[str] = Query(default=None, description="Comma-separated output fields, e.g. extraction_source,incident_form.type_of_incident"),
+    profile: bool = Query(default=False, description="Return a CPU/allocation profile of this request (guarded)"),
+    x_profile_token: Optional[str] = Header(default=None),
+    x_request_id: Optional[str] = Header(default=None),
+    x_tenant_id: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None),
+    traceparent: Optional[str] = Header(default=None),
 ):
     """
     Analyze a transcript and extract an incident report.
@@ -42,18 +120,86 @@ def analyze(
     Args:
         req: request body with transcript text
         force_source: optional override ("llm" or "rules") to select extraction method
+        fields: optional projection; outputs not requested are neither computed nor sent
+        profile: include a profile in the response (needs PROFILE_ENABLED and X-Profile-Token)
+        x_tenant_id / x_api_key: select the tenant whose config (patterns, locations, CCs) is used
+        traceparent: W3C trace context; the request's spans join the caller's trace (TRACE_EXPORT)
 
     Returns:
         A JSON response with incident form, evidence, draft email, and extraction source.
     """
     try:
-        log.info(f"/analyze called, force_source={force_source}")
-        if force_source == "llm":
-            return analyze_transcript_llm_only(req.text)
-        return analyze_transcript(req.text)
-    except Exception as e:
-        log.exception("analysis.failed")
-        raise HTTPException(status_code=500, detail=str(e))
+        wanted = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if profile and not profiling.on_demand_allowed(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    tenant = _tenant_or_4xx(x_tenant_id, x_api_key)
+    with bind_request_id(x_request_id) as request_id, bind_tenant(tenant), collect_stage_timings() as timings, \
+            tracing.start_trace("POST /analyze", traceparent, transcript_chars=len(req.text), tenant=tenant,
+                                request_id=request_id, force_source=force_source), \
+            capture.capture_session(req.text, force_source=force_source, fields=fields, tenant=tenant) as record:
+        try:
+            log.info("/analyze called force_source=%s", force_source)
+            if profile or profiling.should_sample():
+                meta = {"transcript_chars": len(req.text), "force_source": force_source,
+                        "sampled": not profile, "request_id": request_id, "tenant": tenant}
+                with profiling.profile_request(meta, persist=True) as prof:
+                    result = _run_analysis(req.text, force_source, wanted)
+                body = project(result, wanted)
+                if profile:
+                    body["profile"] = prof.report or {"skipped": "another request is being profiled"}
+            else:
+                result = _run_analysis(req.text, force_source, wanted)
+                body = project(result, wanted)
+        except Exception as e:
+            log.exception("analysis.failed")
+            raise HTTPException(status_code=500, detail=str(e), headers=_headers(request_id))
+        stages_ms = {k: round(v * 1000, 3) for k, v in timings.items()}
+        log.info("/analyze.done source=%s", result.get("extraction_source"), extra={"stages_ms": stages_ms})
+        if record is not None:
+            record["output"] = result
+            record["stage_ms"] = stages_ms
+        return FastJSONResponse(body, headers=_headers(request_id))
+
+@app.patch("/analyze/{analysis_id}", response_class=FastJSONResponse)
+def reanalyze(
+    analysis_id: str,
+    req: AnalyzeRequest,
+    fields: Optional[str] = Query(default=None, description="Comma-separated output fields, as for POST /analyze"),
+    x_request_id: Optional[str] = Header(default=None),
+    x_tenant_id: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None),
+    traceparent: Optional[str] = Header(default=None),
+):
+    """
+    Re-analyze an edited transcript incrementally: only fields whose evidence the edit touches
+    are re-extracted (the LLM is asked for just those); the rest of the result is carried over.
+
+    Returns:
+        The same shape as POST /analyze plus `revision` and `reanalysis` (mode, changed_chars,
+        refreshed_fields). 404 if the analysis is unknown or has expired from this process's store.
+    """
+    try:
+        wanted = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tenant = _tenant_or_4xx(x_tenant_id, x_api_key)
+    with bind_request_id(x_request_id) as request_id, bind_tenant(tenant), collect_stage_timings() as timings, \
+            tracing.start_trace("PATCH /analyze", traceparent, transcript_chars=len(req.text), tenant=tenant,
+                                request_id=request_id, analysis_id=analysis_id):
+        try:
+            log.info("/analyze.patch called analysis_id=%s", analysis_id)
+            result = reanalyze_transcript(analysis_id, req.text, fields=wanted)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Unknown or expired analysis_id",
+                                headers=_headers(request_id))
+        except Exception as e:
+            log.exception("reanalysis.failed")
+            raise HTTPException(status_code=500, detail=str(e), headers=_headers(request_id))
+        stages_ms = {k: round(v * 1000, 3) for k, v in timings.items()}
+        log.info("/analyze.patch.done mode=%s", result["reanalysis"]["mode"], extra={"stages_ms": stages_ms})
+        return FastJSONResponse(project(result, wanted), headers=_headers(request_id))
 
 @app.get("/diag/llm")
 def diag_llm():
@@ -70,6 +216,20 @@ def diag_llm():
         log.exception("diag.llm.failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/debug/profiles")
+def debug_profiles(
+    limit: int = Query(default=20, ge=1, le=200),
+    include_tree: bool = Query(default=False),
+    x_profile_token: Optional[str] = Header(default=None),
+):
+    """
+    List the slowest recently stored request profiles (sampled or on-demand), slowest first.
+    Guarded like ?profile=1.
+    """
+    if not profiling.on_demand_allowed(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    return {"profiles": profiling.list_slowest(limit, include_tree=include_tree)}
+
 @app.get("/health")
 def health():
     """
@@ -79,3 +239,20 @@ def health():
         {"ok": True} if the API is running.
     """
     return {"ok": True}
+
+@app.get("/ready", response_class=FastJSONResponse)
+def ready():
+    """
+    Readiness check: 200 once start-up warm-up has finished, 503 before that.
+    Point load balancer / Kubernetes readiness probes here and keep /health for liveness.
+    """
+    status = warmup.status()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, outcomes by extraction_source,
+    LLM call outcomes/fallbacks and token counts.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -6,20 +6,74 @@ from transcript text using regex patterns and policy-aligned heuristics.
 """
 
 import re
-from typing import Dict, Any, List, Tuple
-from app.config.incident_config import load_incident_config_strict
+from typing import Dict, Any, List, Match, Optional, Pattern, Tuple
+from app.config.incident_config import get_config
+from app.infra.tracing import annotate, traced
 from app.rules.assessments import which_risk_assessment
+from app.rules.roster import load_roster_index
 
-def _find_spans(text: str, pattern: str) -> List[Tuple[int, int]]:
+def extract_service_user_name(text: str) -> Tuple[Optional[str], Optional[Dict[str, Any]], Dict[str, Any]]:
     """
-    Find all (start, end) index spans in `text` matching the given regex pattern.
-    Returns a list of spans for evidence highlighting.
+    Detect the service user's name.
+
+    - Simple intro pattern ("it's Greg Jones")
+    - Roster lookup (if configured): canonical name from anywhere in the transcript,
+      tolerant of lowercase speech-to-text and misspellings; overrides the intro regex,
+      except that a single-name hit never overrides an explicit "it's First Last"
+
+    Returns:
+        (name, evidence dict, debug dict) — name/evidence are None if nothing was found
     """
-    spans = []
-    for m in re.finditer(pattern, text, flags=re.IGNORECASE):
-        spans.append((m.start(), m.end()))
-    return spans
+    name: Optional[str] = None
+    ev: Optional[Dict[str, Any]] = None
+    debug: Dict[str, Any] = {}
+
+    m = re.search(r"\bit['’]s\s+([A-Z][a-z]+)\.?\s+([A-Z][a-z]+)\b", text)
+    if m:
+        name = f"{m.group(1)} {m.group(2)}"
+        ev = {
+            "field": "service_user_name",
+            "quote": m.group(0),
+            "start_idx": m.start(1),
+            "end_idx": m.end(2)
+        }
+
+    roster = load_roster_index()
+    if roster:
+        hits = roster.find_in_text(text)
+        # A lone first/last name is weaker evidence than an explicit "it's First Last".
+        if m:
+            hits = [h for h in hits if not h["single"]]
+        if hits:
+            best = hits[0]
+            name = best["name"]
+            ev = {
+                "field": "service_user_name",
+                "quote": best["quote"],
+                "start_idx": best["start_idx"],
+                "end_idx": best["end_idx"]
+            }
+            debug["roster_match"] = {"method": best["method"], "score": best["score"]}
+    return name, ev, debug
+
+def match_incident_type(text: str, incident_regexes: List[Tuple[str, List[Pattern]]]) -> Tuple[Optional[str], Optional[Match]]:
+    """First (type, match) over the compiled incident patterns, in config order; (None, None) if none match."""
+    for t, regexes in incident_regexes:
+        for rx in regexes:
+            m = rx.search(text)
+            if m:
+                return t, m
+    return None, None
+
+def match_location(low: str, locations: Optional[List[str]]) -> Tuple[Optional[str], int]:
+    """First configured location found in the lowercased transcript, with its offset; (None, -1) if none."""
+    for loc in (locations or []):
+        idx = low.find(loc)
+        if idx != -1:
+            return loc, idx
+    return None, -1
 
+@traced()
 def extract_with_rules(text: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]:
     """
     Apply rule-based extraction to a transcript.
@@ -35,7 +89,8 @@ def extract_with_rules(text: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]],
         evidence: list of evidence dicts with quotes and spans
         debug: placeholder dict for any debugging info
     """
-    patterns, locations = load_incident_config_strict()
+    cfg = get_config()  # current tenant's compiled patterns/locations
+    locations = cfg.locations
     facts: Dict[str, Any] = {
         "incident_type": None,
         "service_user_name": None,
@@ -56,46 +111,36 @@ def extract_with_rules(text: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]],
 
     low = text.lower()
 
-    # Service user name (simple intro pattern: "it's Greg Jones")
-    m = re.search(r"\bit['’]s\s+([A-Z][a-z]+)\.?\s+([A-Z][a-z]+)\b", text)
-    if m:
-        facts["service_user_name"] = f"{m.group(1)} {m.group(2)}"
-        evidence.append({
-            "field": "service_user_name",
-            "quote": m.group(0),
-            "start_idx": m.start(1),
-            "end_idx": m.end(2)
-        })
+    # Service user name (intro regex, then roster lookup if configured)
+    name, name_ev, name_debug = extract_service_user_name(text)
+    if name:
+        facts["service_user_name"] = name
+        evidence.append(name_ev)
+    debug.update(name_debug)
 
     # Incident type via config patterns (first match wins)
-    for t, pats in (patterns or {}).items():
-        for pat in pats or []:
-            spans = _find_spans(text, pat)
-            if spans:
-                facts["incident_type"] = t
-                s, e = spans[0]
-                evidence.append({
-                    "field": "incident_type",
-                    "quote": text[s:e],
-                    "start_idx": s,
-                    "end_idx": e
-                })
-                break
-        if facts["incident_type"]:
-            break
+    t, m = match_incident_type(text, cfg.incident_regexes)
+    if t:
+        facts["incident_type"] = t
+        annotate(**{"rule.incident_type": t, "rule.pattern": m.re.pattern})
+        s, e = m.span()
+        evidence.append({
+            "field": "incident_type",
+            "quote": text[s:e],
+            "start_idx": s,
+            "end_idx": e
+        })
 
     # Location via keyword hit (first match wins)
-    for loc in (locations or []):
-        idx = low.find(loc)
-        if idx != -1:
-            facts["location"] = loc
-            evidence.append({
-                "field": "location",
-                "quote": text[idx:idx+len(loc)],
-                "start_idx": idx,
-                "end_idx": idx + len(loc)
-            })
-            break
+    loc, idx = match_location(low, locations)
+    if loc:
+        facts["location"] = loc
+        evidence.append({
+            "field": "location",
+            "quote": text[idx:idx+len(loc)],
+            "start_idx": idx,
+            "end_idx": idx + len(loc)
+        })
 
     # First aid / emergency toggles
     if re.search(r"\b(blood|bleeding|broken|fracture)\b", low):
@@ -0,0 +1,385 @@
+"""
+roster.py
+
+Service-user roster index. Loads known residents from a CSV/JSON roster and finds
+their names in transcript text with typo tolerance (SymSpell-style deletion index)
+and phonetic keys (Soundex), mapping every hit to a canonical roster entry.
+
+Roster location: SERVICE_USER_ROSTER (CSV with a `name` column, optional `id`/`site`,
+or a JSON list of names / {"name", "id", "site"} objects). No roster → index is None.
+`site` is a tenant id: a tenant's index holds its own rows plus rows with no site, so a
+name is never matched to another provider's resident.
+"""
+
+from __future__ import annotations
+import csv
+import json
+import os
+import os.path as p
+import re
+import unicodedata
+from functools import lru_cache
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Set
+
+from app.config.tenants import current_tenant
+from app.infra.logging import get_logger
+
+log = get_logger("app.rules.roster")
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’\-][^\W\d_]+)*")
+
+# Words that are never treated as names on their own (speech-to-text lowercases everything).
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "had", "has",
+    "have", "he", "her", "him", "his", "i", "in", "is", "it", "its", "me", "my", "no", "not",
+    "of", "on", "or", "she", "so", "that", "the", "their", "them", "then", "there", "they",
+    "this", "to", "up", "was", "we", "were", "what", "when", "with", "you", "your", "again",
+    "just", "about", "after", "before", "into", "out", "over", "flat", "room", "floor",
+}
+
+# Phrases that introduce a single-name mention ("it's greg", "resident jones").
+_CUES = {"it's", "its", "resident", "mr", "mrs", "ms", "miss", "dr", "called", "named"}
+# Two-word cues ("this is Greg"). "is" alone is too common ("she is fine" ≠ "Finn"), so after
+# these a fuzzy match also needs a capitalised word; exact roster tokens are accepted as-is.
+_CUE_PAIRS = {("this", "is"), ("it", "is")}
+
+# Hits scoring below this are dropped; a single name must be exact, or one edit away
+# on a token of at least _SINGLE_FUZZY_MIN_LEN characters.
+_MIN_SCORE = 0.5
+_SINGLE_FUZZY_MIN_LEN = 4
+
+_MEMO_SIZE = 100_000
+
+_SOUNDEX = str.maketrans("bfpvcgjkqsxzdtlmnr", "111122222222334556")
+
+
+def _fold(s: str) -> str:
+    """Lowercase and strip accents/apostrophes/hyphens so 'O’Neil-Smyth' → 'oneilsmyth'."""
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return re.sub(r"['’\-]", "", s.lower())
+
+
+def _soundex(token: str) -> str:
+    """Classic 4-character Soundex key (h/w do not separate equal codes)."""
+    if not token:
+        return ""
+    head = token[0]
+    codes = token.translate(_SOUNDEX)
+    out = [head]
+    last = codes[0] if codes[0].isdigit() else ""
+    for ch, code in zip(token[1:], codes[1:]):
+        if code.isdigit():
+            if code != last:
+                out.append(code)
+            last = code
+        elif ch not in "hw":
+            last = ""
+    return ("".join(out) + "000")[:4]
+
+
+def _max_edits(token: str) -> int:
+    """Edit budget by token length: short names must match exactly or with one typo."""
+    n = len(token)
+    if n <= 3:
+        return 0
+    if n <= 5:
+        return 1
+    return 2
+
+
+def _deletes(token: str, depth: int) -> Set[str]:
+    """All strings reachable from `token` by deleting up to `depth` characters."""
+    out = {token}
+    frontier = {token}
+    for _ in range(depth):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance, returning limit + 1 as soon as it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            row_min = min(row_min, v)
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class RosterIndex:
+    """
+    In-memory index over roster names.
+
+    - `by_token`: exact token → entry ids; `by_pair`: (first, second) token → entry ids
+    - `deletes`: deletion variant → roster tokens (SymSpell lookup, no per-entry scan)
+    - `phonetic`: Soundex key → roster tokens (catches 'Jon'/'John', 'Smyth'/'Smith')
+    Lookups are per unique transcript word and memoised for the duration of a scan.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries: List[Dict[str, Any]] = []
+        self._entry_tokens: List[Tuple[str, ...]] = []
+        self._by_token: Dict[str, Set[int]] = {}
+        self._by_pair: Dict[Tuple[str, str], List[int]] = {}
+        self._deletes: Dict[str, Set[str]] = {}
+        self._phonetic: Dict[Tuple[str, int], Set[str]] = {}
+        # Transcript vocabulary repeats heavily across calls; fuzzy lookups are cached per word.
+        self._memo: Dict[str, List[Tuple[str, int, str]]] = {}
+        for entry in entries:
+            toks = tuple(t for t in (_fold(w) for w in _WORD_RE.findall(entry["name"])) if t)
+            if not toks:
+                continue
+            eid = len(self.entries)
+            self.entries.append(entry)
+            self._entry_tokens.append(toks)
+            for tok in toks:
+                self._by_token.setdefault(tok, set()).add(eid)
+            if len(toks) > 1:
+                self._by_pair.setdefault((toks[0], toks[1]), []).append(eid)
+        for tok in self._by_token:
+            for d in _deletes(tok, _max_edits(tok)):
+                self._deletes.setdefault(d, set()).add(tok)
+            self._phonetic.setdefault((_soundex(tok), len(tok)), set()).add(tok)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # ---- token level ----
+
+    def _token_candidates(self, word: str) -> List[Tuple[str, int, str]]:
+        """Roster tokens close to `word` as (token, distance, method), best first (memoised)."""
+        if word in self._by_token:
+            return [(word, 0, "exact")]
+        cached = self._memo.get(word)
+        if cached is None:
+            cached = self._lookup(word)
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            self._memo[word] = cached
+        return cached
+
+    def _lookup(self, word: str) -> List[Tuple[str, int, str]]:
+        budget = _max_edits(word)
+        found: Dict[str, int] = {}
+        if budget:
+            for d in _deletes(word, budget):
+                for tok in self._deletes.get(d, ()):
+                    if tok in found or abs(len(tok) - len(word)) > budget:
+                        continue
+                    dist = _edit_distance(word, tok, min(budget, _max_edits(tok)))
+                    if dist <= min(budget, _max_edits(tok)):
+                        found[tok] = dist
+        out = [(tok, dist, "fuzzy") for tok, dist in found.items()]
+        if not out and len(word) >= 3:
+            key = _soundex(word)
+            for n in (len(word) - 1, len(word), len(word) + 1):
+                for tok in self._phonetic.get((key, n), ()):
+                    # Phonetic keys are coarse; still require the spelling to be in the same ballpark.
+                    if _edit_distance(word, tok, 3) <= 3:
+                        out.append((tok, 3, "phonetic"))
+        out.sort(key=lambda c: c[1])
+        return out
+
+    # ---- name level ----
+
+    def find_in_text(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Find roster names anywhere in `text` (case-insensitive, typo-tolerant).
+
+        Full names must appear as consecutive words in roster order; a single first or
+        last name only counts after a cue ("it's Greg", "resident Jones", "this is Greg"),
+        when it identifies exactly one resident, and when it is exact or one edit off a name
+        of 4+ letters. Hits scoring below _MIN_SCORE are dropped.
+
+        Returns:
+            list of {"entry", "name", "quote", "start_idx", "end_idx", "score", "method",
+            "single"}, best score first ("single": matched on one token of a multi-word name).
+        """
+        words = [(m.group(0), _fold(m.group(0)), m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+        memo: Dict[str, List[Tuple[str, int, str]]] = {}
+
+        def cands(i: int) -> List[Tuple[str, int, str]]:
+            w = words[i][1]
+            if w in _STOPWORDS or len(w) < 2:
+                return []
+            if w not in memo:
+                memo[w] = self._token_candidates(w)
+            return memo[w]
+
+        hits: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for i in range(len(words)):
+            here = cands(i)
+            if not here:
+                continue
+            nxt = cands(i + 1) if i + 1 < len(words) else []
+            # Full names: consecutive words resolved through the (first, second) pair index.
+            for t1, d1, m1 in here:
+                for t2, d2, m2 in nxt:
+                    for eid in self._by_pair.get((t1, t2), ()):
+                        etoks = self._entry_tokens[eid]
+                        rest = self._match_rest(words, i, etoks, cands)
+                        if rest is not None:
+                            j, extra, worst = rest
+                            self._add_hit(hits, eid, text, words[i][2], words[j][3],
+                                          d1 + d2 + extra, sum(map(len, etoks)),
+                                          _worse(_worse(m1, m2), worst))
+            # Single-name mention: only after a cue (or a one-word roster name), and only
+            # when the token identifies exactly one resident.
+            cued = i > 0 and words[i - 1][1] in _CUES
+            pair_cued = i > 1 and (words[i - 2][1], words[i - 1][1]) in _CUE_PAIRS
+            for tok, dist, method in here:
+                owners = self._by_token[tok]
+                if len(owners) != 1:
+                    continue
+                if method != "exact" and not (method == "fuzzy" and dist <= 1
+                                              and min(len(tok), len(words[i][1])) >= _SINGLE_FUZZY_MIN_LEN):
+                    continue
+                eid = next(iter(owners))
+                multi = len(self._entry_tokens[eid]) > 1
+                if cued or not multi or (pair_cued and (method == "exact" or words[i][0][:1].isupper())):
+                    self._add_hit(hits, eid, text, words[i][2], words[i][3],
+                                  dist, len(tok), method, single=multi)
+        return sorted(hits.values(), key=lambda h: (-h["score"], h["start_idx"]))
+
+    def _match_rest(self, words, i: int, etoks: Tuple[str, ...], cands) -> Optional[Tuple[int, int, str]]:
+        """Check that words after i+1 continue the roster name; returns (last_idx, extra_distance, worst_method)."""
+        total = 0
+        worst = "exact"
+        for k, want in enumerate(etoks[2:], start=2):
+            j = i + k
+            if j >= len(words):
+                return None
+            hit = next(((d, m) for t, d, m in cands(j) if t == want), None)
+            if hit is None:
+                return None
+            total += hit[0]
+            worst = _worse(worst, hit[1])
+        return i + len(etoks) - 1, total, worst
+
+    def _add_hit(self, hits, eid: int, text: str, start: int, end: int, dist: int,
+                 length: int, method: str, single: bool = False) -> None:
+        score = max(0.0, 1.0 - dist / max(length, 1))
+        if single:
+            score *= 0.8
+        if score < _MIN_SCORE:
+            return
+        key = (eid, start)
+        if key in hits and hits[key]["score"] >= score:
+            return
+        entry = self.entries[eid]
+        hits[key] = {
+            "entry": entry,
+            "name": entry["name"],
+            "quote": text[start:end],
+            "start_idx": start,
+            "end_idx": end,
+            "score": round(score, 3),
+            "method": method,
+            "single": single,
+        }
+
+    def snap(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Map a free-text name (e.g. from the LLM) to a canonical roster entry.
+        Returns the entry, or None when the name is not (unambiguously) on the roster.
+        """
+        if not name:
+            return None
+        hits = self.find_in_text(f"resident {name}")
+        if not hits:
+            return None
+        best = hits[0]
+        ties = [h for h in hits if h["score"] == best["score"] and h["entry"] is not best["entry"]]
+        return None if ties else best["entry"]
+
+
+_METHOD_RANK = {"exact": 0, "fuzzy": 1, "phonetic": 2}
+
+
+def _worse(a: str, b: str) -> str:
+    return a if _METHOD_RANK[a] >= _METHOD_RANK[b] else b
+
+
+def _roster_path() -> Optional[str]:
+    return os.getenv("SERVICE_USER_ROSTER") or None
+
+
+def _read_roster(path: str) -> List[Dict[str, Any]]:
+    """Read roster rows from CSV or JSON into {"id", "name", "site"} dicts."""
+    rows: List[Dict[str, Any]] = []
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data if isinstance(data, list) else []:
+            if isinstance(item, str):
+                item = {"name": item}
+            if isinstance(item, dict) and item.get("name"):
+                rows.append({"id": item.get("id"), "name": str(item["name"]).strip(), "site": item.get("site")})
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for item in csv.DictReader(f):
+                name = (item.get("name") or "").strip()
+                if name:
+                    rows.append({"id": item.get("id") or None, "name": name, "site": item.get("site") or None})
+    return rows
+
+
+@lru_cache(maxsize=1)
+def _load_rows() -> Optional[List[Dict[str, Any]]]:
+    """Read (once) the configured roster rows, or None if no roster is configured/readable."""
+    path = _roster_path()
+    if not path:
+        return None
+    if not p.exists(path):
+        log.warning("roster.missing path=%s", path)
+        return None
+    try:
+        rows = _read_roster(path)
+    except Exception as e:
+        log.error("roster.load.failed: %s", e)
+        return None
+    log.info("roster.loaded entries=%d sites=%d", len(rows), len({r["site"] for r in rows if r["site"]}))
+    return rows
+
+
+_INDEXES: Dict[Optional[str], RosterIndex] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def load_roster_index(tenant: Optional[str] = None) -> Optional[RosterIndex]:
+    """
+    Roster index for `tenant` (default: the request's current tenant), built once per tenant:
+    rows whose `site` is that tenant plus rows with no site. Without a tenant (single-provider
+    deployments) the whole roster is used. None if no roster is configured/readable.
+    """
+    rows = _load_rows()
+    if rows is None:
+        return None
+    tenant = tenant if tenant is not None else current_tenant()
+    index = _INDEXES.get(tenant)
+    if index is None:
+        with _INDEX_LOCK:
+            index = _INDEXES.get(tenant)
+            if index is None:
+                index = RosterIndex([r for r in rows if not tenant or not r["site"] or r["site"] == tenant])
+                _INDEXES[tenant] = index
+    return index
@@ -0,0 +1,157 @@
+"""
+dedupe.py
+
+Near-duplicate transcript detection (opt-in, DEDUPE_ENABLED=1). Keeps a rolling SimHash
+index of recent transcripts (scoped by service user and the rules-visible facts, evicted
+by age) so a repeat call about the same incident can be linked to the earlier analysis
+and reuse its LLM facts.
+
+Lookup is sublinear: the 64-bit fingerprint is split into (max_hamming + 1) bands,
+so any fingerprint within the Hamming threshold shares at least one exact band
+(pigeonhole) and only those bucket members are compared.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.util.env import env_int
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_BITS = 64
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """
+    64-bit SimHash over lowercase word shingles, weighted by frequency.
+    Word trigrams by default, so word order counts: swapping one word ("lounge" for
+    "bedroom", "8am" for "6pm") changes three features rather than one.
+    """
+    toks = _TOKEN_RE.findall(text.lower())
+    if shingle > 1 and len(toks) >= shingle:
+        feats = Counter(" ".join(toks[i:i + shingle]) for i in range(len(toks) - shingle + 1))
+    else:
+        feats = Counter(toks)
+    if not feats:
+        return 0
+    weights = [0] * _BITS
+    for feat, count in feats.items():
+        h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            if h >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+    out = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            out |= 1 << bit
+    return out
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateIndex:
+    """
+    Rolling SimHash-LSH index.
+
+    - `window_seconds`: entries older than this are evicted (checked on every call)
+    - `max_hamming`: a new fingerprint within this many differing bits is a near-duplicate
+    - `max_entries`: hard cap; oldest entries are evicted first
+    Thread-safe; all operations hold one short lock.
+    """
+
+    def __init__(self, window_seconds: float = 7200, max_hamming: int = 3, max_entries: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_hamming = max(0, min(max_hamming, 15))
+        self.max_entries = max_entries
+        self._bands = self.max_hamming + 1
+        self._band_bits = _BITS // self._bands
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[Tuple[str, int, int], List[str]] = {}
+        self._order: deque = deque()
+        self._lock = threading.Lock()
+
+    def _band_keys(self, scope: str, fp: int) -> List[Tuple[str, int, int]]:
+        mask = (1 << self._band_bits) - 1
+        return [(scope, b, (fp >> (b * self._band_bits)) & mask) for b in range(self._bands)]
+
+    def _evict(self, now: float) -> None:
+        while self._order and (now - self._order[0][0] > self.window_seconds
+                               or len(self._order) > self.max_entries):
+            _, eid = self._order.popleft()
+            entry = self._entries.pop(eid, None)
+            if not entry:
+                continue
+            for key in self._band_keys(entry["scope"], entry["fingerprint"]):
+                bucket = self._buckets.get(key)
+                if bucket:
+                    try:
+                        bucket.remove(eid)
+                    except ValueError:
+                        pass
+                    if not bucket:
+                        del self._buckets[key]
+
+    def find(self, scope: str, fp: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the closest live entry in `scope` within the Hamming threshold, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            best: Optional[Dict[str, Any]] = None
+            best_d = self.max_hamming + 1
+            for key in self._band_keys(scope, fp):
+                for eid in self._buckets.get(key, ()):
+                    entry = self._entries[eid]
+                    d = hamming(fp, entry["fingerprint"])
+                    if d < best_d:
+                        best, best_d = entry, d
+            if best is None:
+                return None
+            return {**best, "distance": best_d}
+
+    def add(self, scope: str, fp: int, payload: Dict[str, Any], entry_id: Optional[str] = None,
+            now: Optional[float] = None) -> str:
+        """Insert a fingerprint with its payload; returns the entry id."""
+        now = time.time() if now is None else now
+        eid = entry_id or uuid.uuid4().hex
+        with self._lock:
+            self._entries[eid] = {"id": eid, "scope": scope, "fingerprint": fp, "at": now, "payload": payload}
+            for key in self._band_keys(scope, fp):
+                self._buckets.setdefault(key, []).append(eid)
+            self._order.append((now, eid))
+            self._evict(now)
+        return eid
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_INDEX: Optional[NearDuplicateIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def dedupe_enabled() -> bool:
+    return os.getenv("DEDUPE_ENABLED", "0").lower() not in ("0", "false", "no")
+
+
+def get_dedupe_index() -> NearDuplicateIndex:
+    """Process-wide index configured from DEDUPE_WINDOW_MINUTES / DEDUPE_MAX_HAMMING / DEDUPE_MAX_ENTRIES."""
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = NearDuplicateIndex(
+                    window_seconds=env_int("DEDUPE_WINDOW_MINUTES", 120) * 60,
+                    max_hamming=env_int("DEDUPE_MAX_HAMMING", 3),
+                    max_entries=env_int("DEDUPE_MAX_ENTRIES", 10000),
+                )
+    return _INDEX
@@ -6,35 +6,47 @@ normalizes results into a standard incident form, builds a draft email, and retu
 """
 
 from __future__ import annotations
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, FrozenSet, List, Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import copy
 import os
 import re
-
-from app.infra.logging import get_logger
-from app.llm.extract import extract_with_llm
+import time
+import uuid
+
+from app.infra import capture
+from app.infra import cpu_pool
+from app.infra.logging import get_logger, setup_logging
+from app.infra.tracing import annotate, traced
+from app.infra.metrics import stage, observe_stage, collect_stage_timings, unobserved_stages, ANALYZE_TOTAL, LLM_FALLBACKS
+from app.llm.extract import LLM_FIELDS, extract_with_llm, get_client, output_mode
 from app.rules.extract import extract_with_rules
-from app.config.incident_config import (
-    load_notifications,
-    load_global_policy_triggers,
-)
+from app.rules.roster import load_roster_index
+from app.config.incident_config import get_config, load_notifications
+from app.config.tenants import bind_tenant, current_tenant
 from app.util.datetime_extract import extract_incident_datetime
+from app.util.spans import resolve_evidence_spans
+from app.services.dedupe import dedupe_enabled, get_dedupe_index, simhash
+from app.services.outbox import enqueue_report, outbox_enabled
+from app.services.projection import wants
+from app.services.revisions import REANALYZE_TOTAL, TextEdit, get_result_store
 
 log = get_logger("app.services.orchestrator")
 UK_TZ = ZoneInfo("Europe/London")
 
 
-def _default_form() -> Dict[str, Any]:
+def _default_form(anchor: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Create a new blank incident form with default values.
     Used to ensure all required keys are always present.
+    `anchor` is the report time (defaults to now).
     """
     return {
         # Let the LLM set this; if missing, we'll fallback to explicit parsing.
         "date_time_of_incident": None,
         # Always capture when this report was created (auditable, Europe/London).
-        "reported_at": datetime.now(tz=UK_TZ).isoformat(),
+        "reported_at": (anchor or datetime.now(tz=UK_TZ)).isoformat(),
         "service_user_name": None,
         "location": None,
         "type_of_incident": None,
@@ -55,27 +67,21 @@ def _maybe_append_action(form: Dict[str, Any], transcript: str) -> None:
     Add GP/999 suggestions to immediate_actions_taken if global triggers match the transcript.
     This is policy suggestion (not extraction), so it stays here in the orchestrator.
     """
-    triggers = load_global_policy_triggers()
+    triggers = get_config().policy_trigger_regexes  # compiled once per tenant config
     low = transcript.lower()
     actions: List[str] = []
 
     # Contact GP triggers
-    for pat in triggers.get("contact_gp_if", []):
-        try:
-            if re.search(pat, low, flags=re.IGNORECASE):
-                actions.append("Contact GP immediately (policy trigger)")
-                break
-        except re.error:
-            continue
+    gp = next((rx for rx in triggers["contact_gp_if"] if rx.search(low)), None)
+    if gp:
+        actions.append("Contact GP immediately (policy trigger)")
 
     # Call 999 triggers
-    for pat in triggers.get("call_999_if", []):
-        try:
-            if re.search(pat, low, flags=re.IGNORECASE):
-                actions.append("Call 999 / emergency services (life-threatening trigger)")
-                break
-        except re.error:
-            continue
+    call_999 = next((rx for rx in triggers["call_999_if"] if rx.search(low)), None)
+    if call_999:
+        actions.append("Call 999 / emergency services (life-threatening trigger)")
+    annotate(**{"trigger.contact_gp": gp.pattern if gp else None,
+                "trigger.call_999": call_999.pattern if call_999 else None})
 
     if actions:
         existing = form.get("immediate_actions_taken")
@@ -83,6 +89,19 @@ def _maybe_append_action(form: Dict[str, Any], transcript: str) -> None:
         form["immediate_actions_taken"] = f"{existing} | {joined}" if existing else joined
 
 
+def _apply_notify_default(form: Dict[str, Any], to_addr: Optional[str] = None) -> None:
+    """Fill 'who_was_notified' with notifications.always_notify if empty (also done when no email is built)."""
+    if form.get("who_was_notified"):
+        return
+    if to_addr is None:
+        to_addr = (load_notifications() or {}).get("always_notify", "Supervisor")
+    form["who_was_notified"] = to_addr
+
+
+def _email_subject(form: Dict[str, Any]) -> str:
+    return f"Incident report: {form.get('type_of_incident') or 'Unknown'} – {form.get('service_user_name') or 'Service User'}"
+
+
 def _build_email(form: Dict[str, Any]) -> str:
     """
     Construct a plain-text draft email summarizing the incident form.
@@ -101,15 +120,22 @@ def _build_email(form: Dict[str, Any]) -> str:
         cc.append(cc_map[ra_name])
 
     # Ensure 'who_was_notified' reflects the default policy if empty
-    if not form.get("who_was_notified"):
-        form["who_was_notified"] = to_addr
+    _apply_notify_default(form, to_addr)
 
-    subject = f"Incident report: {form.get('type_of_incident') or 'Unknown'} – {form.get('service_user_name') or 'Service User'}"
     lines = [
         f"To: {to_addr}",
         f"CC: {', '.join(cc)}" if cc else "",
-        f"Subject: {subject}",
+        f"Subject: {_email_subject(form)}",
         "",
+        _email_body(form),
+    ]
+    return "\n".join([l for l in lines if l is not None])
+
+
+def _email_body(form: Dict[str, Any]) -> str:
+    """The report text under the draft's To/CC/Subject lines (also the outbox message body)."""
+    ra_name = form.get("if_yes_which_risk_assessment")
+    lines = [
         f"Date/Time: {form.get('date_time_of_incident') or 'None'}",
         f"Reported At: {form.get('reported_at') or 'None'}",
         f"Service User: {form.get('service_user_name') or 'Unknown'}",
@@ -135,12 +161,33 @@ def _build_email(form: Dict[str, Any]) -> str:
     return "\n".join([l for l in lines if l is not None])
 
 
-def _facts_to_form(facts: Dict[str, Any]) -> Dict[str, Any]:
+def _enqueue_notification(form: Dict[str, Any], analysis_id: str, corrected: bool = False) -> None:
+    """
+    Hand the report to the outbox for delivery (only the enqueue happens on the request path).
+    To: notifications.always_notify_email (or always_notify if it is an address); CC addresses
+    from cc_by_assessment are delivered as digests. `corrected` marks a re-sent, edited report.
+    """
+    notifications = load_notifications() or {}
+    to_addr = notifications.get("always_notify", "Supervisor")
+    to_email = notifications.get("always_notify_email") or (to_addr if "@" in str(to_addr) else None)
+    cc_map = notifications.get("cc_by_assessment", {}) or {}
+    ra_name = form.get("if_yes_which_risk_assessment")
+    cc = [cc_map[ra_name]] if ra_name and ra_name in cc_map else []
+    try:
+        subject = ("[Corrected] " if corrected else "") + _email_subject(form)
+        n = enqueue_report(subject, _email_body(form), to_email, cc, analysis_id=analysis_id, tenant=current_tenant())
+        if not n:
+            log.warning("outbox.no_recipients always_notify=%s", to_addr)
+    except Exception as e:
+        log.error("outbox.enqueue.failed analysis_id=%s: %s", analysis_id, e)
+
+
+def _facts_to_form(facts: Dict[str, Any], anchor: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Convert a dictionary of extracted facts into a fully-formed incident form,
     ensuring key names match the expected output schema.
     """
-    form = _default_form()
+    form = _default_form(anchor)
     mapping = {
         "date_time_of_incident": "date_time_of_incident",
         "service_user_name": "service_user_name",
@@ -162,14 +209,36 @@ def _facts_to_form(facts: Dict[str, Any]) -> Dict[str, Any]:
     return form
 
 
-def _llm_datetime_fallback(form: Dict[str, Any], transcript: str, evidence: List[Dict[str, Any]]) -> None:
+def _snap_service_user(form: Dict[str, Any], transcript: str) -> None:
+    """
+    Snap an LLM-provided service_user_name to the canonical roster entry (if a roster is configured).
+    If the model's name is not on the roster but a roster name occurs in the transcript, prefer that;
+    otherwise keep the model's value (the roster may be incomplete).
     """
-    If the LLM did not provide a date_time_of_incident, attempt explicit/relative parsing.
+    roster = load_roster_index()
+    if not roster:
+        return
+    entry = roster.snap(form.get("service_user_name"))
+    if entry:
+        form["service_user_name"] = entry["name"]
+        return
+    hits = roster.find_in_text(transcript)
+    if hits:
+        log.info("roster.override llm_name_not_on_roster method=%s", hits[0]["method"])
+        form["service_user_name"] = hits[0]["name"]
+
+
+def _llm_datetime_fallback(form: Dict[str, Any], transcript: str, evidence: List[Dict[str, Any]],
+                           anchor: Optional[datetime] = None) -> None:
+    """
+    If the LLM did not provide a date_time_of_incident, attempt explicit/relative parsing
+    relative to `anchor` (defaults to now).
     On low-confidence inference, add a gentle confirmation hint to immediate_actions_taken.
     """
     if form.get("date_time_of_incident"):
         return
-    dt_info = extract_incident_datetime(transcript, now=datetime.now(tz=UK_TZ))
+    dt_info = extract_incident_datetime(transcript, now=anchor or datetime.now(tz=UK_TZ))
+    annotate(**{"datetime.method": dt_info.get("method"), "datetime.confidence": dt_info.get("confidence")})
     if not dt_info.get("value"):
         return
 
@@ -236,6 +305,7 @@ def _sanity_fix_incident_time(form: Dict[str, Any], transcript: str, anchor: dat
     if delta > seven_days:
         info = extract_incident_datetime(transcript, now=anchor)
         new_val = info.get("value")
+        annotate(**{"sanity.replaced": bool(new_val), "sanity.delta_days": round(delta / 86400, 1)})
         if new_val:
             form["date_time_of_incident"] = new_val
             if info.get("confidence") == "low":
@@ -254,90 +324,440 @@ def _sanity_fix_incident_time(form: Dict[str, Any], transcript: str, anchor: dat
             form["date_time_of_incident"] = None
 
 
-def analyze_transcript(transcript: str) -> Dict[str, Any]:
+def _dedupe_key(transcript: str, anchor: datetime):
+    """
+    (scope, fingerprint) for the near-duplicate index, or None when the call cannot be
+    safely matched (no service user identified).
+
+    The scope is the tenant, the rules-detected service user and the rules-visible facts
+    (incident type, location, incident time), so LLM facts are only ever reused for a call
+    that the deterministic extractors read identically, never across tenants or residents.
+    """
+    facts, _, _ = extract_with_rules(transcript)
+    name = facts.get("service_user_name")
+    if not name:
+        return None
+    when = extract_incident_datetime(transcript, now=anchor).get("value")
+    scope = "|".join([current_tenant() or "", name.lower(), facts.get("incident_type") or "",
+                      facts.get("location") or "", when or ""])
+    return scope, simhash(transcript)
+
+
+def _cpu_stages(transcript: str, facts: Dict[str, Any], evidence: List[Dict[str, Any]],
+                source: str, anchor: datetime):
+    """
+    The CPU-bound part of the pipeline: rules extraction (when source is "rules"), form
+    building, roster snap, datetime fallback/sanity fix and policy triggers.
+    Returns (form, evidence).
+    """
+    if source == "rules":
+        with stage("rules"):
+            facts, evidence, _ = extract_with_rules(transcript)
+
+    form = _facts_to_form(facts, anchor)
+    if source == "llm":
+        with stage("roster_snap"):
+            _snap_service_user(form, transcript)
+
+    # If LLM (or rules) omitted incident time, try explicit/relative fallback.
+    with stage("datetime_fallback"):
+        _llm_datetime_fallback(form, transcript, evidence, anchor)
+
+    # Sanity fix if LLM produced implausible time (no explicit date)
+    with stage("sanity_fix"):
+        _sanity_fix_incident_time(form, transcript, anchor, evidence)
+
+    # Add GP/999 hints from global triggers BEFORE building the email
+    with stage("policy_triggers"):
+        _maybe_append_action(form, transcript)
+    return form, evidence
+
+
+def _pool_job(fn, tenant: Optional[str], *args):
+    """Pool-side entry point: fn(*args) under the request's tenant, plus the stage timings to report in the parent."""
+    with bind_tenant(tenant), collect_stage_timings() as timings:
+        out = fn(*args)
+    return out, timings
+
+
+def warm_worker() -> None:
+    """Pool initializer: load the base compiled config and roster once per worker process."""
+    setup_logging()
+    get_config()
+    load_roster_index()
+
+
+def _offloaded(fn, transcript: str, *args):
+    """
+    fn(transcript, *args) in the CPU pool when the transcript is long enough (see cpu_pool),
+    otherwise inline. If the pool sheds or cannot run the job, it runs inline instead.
+    """
+    if cpu_pool.should_offload(len(transcript)):
+        try:
+            with stage("cpu_offload"):
+                out, timings = cpu_pool.run(_pool_job, fn, current_tenant(), transcript, *args,
+                                            initializer=warm_worker)
+                # Spans do not cross the process boundary; keep the worker's stage timings instead.
+                annotate(**{f"worker.{name}_ms": round(secs * 1000, 3) for name, secs in timings.items()})
+            for name, seconds in timings.items():
+                observe_stage(name, seconds)
+            return out
+        except cpu_pool.PoolBusy as e:
+            log.warning("cpu_offload.shed running inline: %s", e)
+        except Exception as e:
+            log.error("cpu_offload.failed running inline: %s", e)
+    return fn(transcript, *args)
+
+
+def _run_cpu_stages(transcript: str, facts: Dict[str, Any], evidence: List[Dict[str, Any]],
+                    source: str, anchor: datetime):
+    return _offloaded(_cpu_stages, transcript, facts, evidence, source, anchor)
+
+
+@traced()
+def analyze_transcript(transcript: str, fields: Optional[FrozenSet[str]] = None,
+                       anchor: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Analyze a transcript using the LLM if available, falling back to rule-based extraction otherwise.
     Returns the source used, a completed incident form, evidence, and a draft email.
+
+    fields: optional projection (see services.projection.parse_fields); outputs that are not
+    requested are not computed (evidence span resolution, draft email).
+    anchor: report time used for reported_at and relative dates (defaults to now; replay pins it).
     """
     log.info("analyze_transcript.start")
+    t0 = time.perf_counter()
     evidence: List[Dict[str, Any]] = []
     source = "rules"
     facts: Dict[str, Any] = {}
 
-    anchor = datetime.now(tz=UK_TZ)
+    anchor = anchor or datetime.now(tz=UK_TZ)
     anchor_iso = anchor.isoformat()
+    capture.note("anchor", anchor_iso)
 
     key_present = bool(os.getenv("OPENAI_API_KEY"))
-    log.info(f"env.OPENAI_API_KEY.present={key_present}")
+    log.info("env.OPENAI_API_KEY.present=%s", key_present)
+    capture.note("llm_key_present", key_present)
+
+    analysis_id = uuid.uuid4().hex
+    duplicate_of: Optional[str] = None
 
     if key_present:
-        try:
-            # IMPORTANT: pass anchor to LLM for relative time conversion
-            facts, evidence = extract_with_llm(transcript, report_time_iso=anchor_iso)
-            log.info(f"llm.result.keys={list(facts.keys()) if facts else []}")
-            if facts:
-                source = "llm"
-        except Exception as e:
-            log.error(f"llm.extract.failed: {e}")
+        # Near-duplicate of a recent call about the same service user? Reuse its LLM facts.
+        with stage("dedupe"):
+            dup_key = _offloaded(_dedupe_key, transcript, anchor) if dedupe_enabled() else None
+            dup = get_dedupe_index().find(*dup_key) if dup_key else None
+            annotate(**{"dedupe.hit": bool(dup), "dedupe.distance": dup["distance"] if dup else None})
+        if dup:
+            duplicate_of = dup["id"]
+            facts = copy.deepcopy(dup["payload"]["facts"])
+            evidence = copy.deepcopy(dup["payload"]["evidence"])
+            source = "llm"
+            log.info("dedupe.hit duplicate_of=%s distance=%s", duplicate_of, dup["distance"])
+        else:
+            try:
+                # IMPORTANT: pass anchor to LLM for relative time conversion
+                with stage("llm"):
+                    facts, evidence = extract_with_llm(transcript, report_time_iso=anchor_iso)
+                log.info("llm.result.keys=%s", list(facts) if facts else [])
+                if facts:
+                    source = "llm"
+                    if dup_key:
+                        get_dedupe_index().add(
+                            *dup_key,
+                            payload={"facts": copy.deepcopy(facts), "evidence": copy.deepcopy(evidence)},
+                            entry_id=analysis_id,
+                        )
+            except Exception as e:
+                log.error("llm.extract.failed: %s", e)
 
     if not facts:
         log.info("rules.fallback")
-        facts, evidence, _ = extract_with_rules(transcript)
+        if key_present:
+            LLM_FALLBACKS.inc(mode=output_mode())
         source = "rules"
 
-    form = _facts_to_form(facts)
+    # Keep the raw LLM output for PATCH /analyze/{id} (the stages below extend `evidence`).
+    with stage("revision_store"):
+        _remember(analysis_id, transcript, anchor_iso, source, facts, evidence, duplicate_of)
+
+    # Rules / roster / datetime / policy stages (process pool for long transcripts)
+    form, evidence = _run_cpu_stages(transcript, facts, evidence, source, anchor)
+
+    # Anchor LLM/datetime quotes to transcript offsets (one pass for all evidence)
+    if wants(fields, "evidence"):
+        with stage("evidence_spans"):
+            resolve_evidence_spans(transcript, evidence)
+
+    _apply_notify_default(form)
+    get_result_store().update(analysis_id, form=copy.deepcopy(form))
+    email = None
+    if wants(fields, "draft_email"):
+        with stage("email"):
+            email = _build_email(form)
+    if outbox_enabled():
+        if duplicate_of:
+            # The original call was already reported; a near-duplicate is not emailed again.
+            log.info("outbox.skip.duplicate analysis_id=%s duplicate_of=%s", analysis_id, duplicate_of)
+        else:
+            with stage("outbox_enqueue"):
+                _enqueue_notification(form, analysis_id)
+    log.info("analyze_transcript.done source=%s", source)
+    annotate(transcript_chars=len(transcript), extraction_source=source, analysis_id=analysis_id)
+    ANALYZE_TOTAL.inc(extraction_source=source)
+    observe_stage("total", time.perf_counter() - t0)
+    return {
+        "analysis_id": analysis_id,
+        "duplicate_of": duplicate_of,
+        "extraction_source": source,
+        "incident_form": form,
+        "evidence": evidence,
+        "draft_email": email,
+    }
 
-    # If LLM (or rules) omitted incident time, try explicit/relative fallback.
-    _llm_datetime_fallback(form, transcript, evidence)
 
-    # Sanity fix if LLM produced implausible time (no explicit date)
-    _sanity_fix_incident_time(form, transcript, anchor, evidence)
+def _remember(analysis_id: str, transcript: str, anchor_iso: str, source: str, facts: Dict[str, Any],
+              evidence: List[Dict[str, Any]], duplicate_of: Optional[str], revision: int = 0) -> None:
+    """
+    Store what incremental re-analysis needs: the LLM facts and evidence for this transcript.
+    Evidence spans are resolved on the first PATCH, not here (most analyses are never edited).
+    """
+    store = get_result_store()
+    if store.max_entries <= 0:
+        return
+    # Flat dicts: shallow copies keep later pipeline stages from changing the stored revision.
+    llm_facts = dict(facts) if source == "llm" else {}
+    llm_evidence = [dict(ev) for ev in evidence] if source == "llm" else []
+    store.put(analysis_id, {
+        "transcript": transcript,
+        "anchor": anchor_iso,
+        "tenant": current_tenant(),
+        "source": source,
+        "facts": llm_facts,
+        "evidence": llm_evidence,
+        "duplicate_of": duplicate_of,
+        "revision": revision,
+    })
+
+
+def _dirty_llm_fields(old: str, new: str, edit: TextEdit, evidence: List[Dict[str, Any]],
+                      anchor: datetime) -> List[str]:
+    """
+    LLM fields an edit may have changed: those whose evidence overlaps an edited span, plus
+    those the deterministic extractors (rules, datetime) read differently in the two
+    revisions, which catches edits that add a fact away from any quoted evidence.
+    """
+    dirty = {ev.get("field") for ev in evidence if edit.touches(ev.get("start_idx"), ev.get("end_idx"))}
+    dirty.update(_offloaded(_rules_changes, new, old, anchor))
+    if dirty & {"risk_assessment_needed", "if_yes_which_risk_assessment"}:
+        dirty.update(("risk_assessment_needed", "if_yes_which_risk_assessment"))
+    if dirty & set(LLM_FIELDS):
+        dirty.add("description")  # summarizes the whole call: refresh it along with any LLM call
+    return [k for k in LLM_FIELDS if k in dirty]
+
+
+def _rules_changes(new: str, old: str, anchor: datetime) -> List[str]:
+    """LLM fields the rules extractor or the datetime parser read differently in `old` and `new`."""
+    old_rules, _, _ = extract_with_rules(old)
+    new_rules, _, _ = extract_with_rules(new)
+    changed = [k for k in LLM_FIELDS if k != "description" and old_rules.get(k) != new_rules.get(k)]
+    if extract_incident_datetime(old, now=anchor).get("value") != extract_incident_datetime(new, now=anchor).get("value"):
+        changed.append("date_time_of_incident")
+    return changed
+
+
+def _carry_evidence(evidence: List[Dict[str, Any]], edit: TextEdit, drop: FrozenSet[str]) -> List[Dict[str, Any]]:
+    """
+    Move evidence onto the new revision: spans shift past the edits; items whose span was
+    edited lose it (re-anchored by quote later); items for `drop` fields are removed.
+    """
+    out: List[Dict[str, Any]] = []
+    for ev in evidence:
+        if ev.get("field") in drop:
+            continue
+        start, end = ev.get("start_idx"), ev.get("end_idx")
+        if start is not None and end is not None:
+            new_start, new_end = edit.map_offset(start), edit.map_offset(end)
+            if edit.touches(start, end) or new_start is None or new_end is None:
+                ev = {k: v for k, v in ev.items() if k not in ("match", "match_score")}
+                ev["start_idx"], ev["end_idx"] = None, None
+            else:
+                ev = {**ev, "start_idx": new_start, "end_idx": new_end}
+        out.append(ev)
+    return out
+
+
+@traced()
+def reanalyze_transcript(analysis_id: str, transcript: str,
+                         fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+    """
+    Incremental re-analysis of an edited transcript (PATCH /analyze/{id}).
 
-    # Add GP/999 hints from global triggers BEFORE building the email
-    _maybe_append_action(form, transcript)
+    Diffs the new text against the stored revision and keeps the original anchor. Rules-sourced
+    analyses re-run the (cheap) deterministic stages only. LLM-sourced ones call the model
+    again only if the edit touches a field's evidence (or changes what the rules/datetime
+    patterns see), and then only for those fields; everything else, including evidence
+    spans (shifted to the new offsets), is carried over. With the outbox enabled, an edit that
+    changes any form field enqueues a "[Corrected]" report; other edits are not re-notified.
 
-    email = _build_email(form)
-    log.info(f"analyze_transcript.done source={source}")
+    Raises KeyError if the analysis is unknown, expired, or belongs to another tenant.
+    """
+    t0 = time.perf_counter()
+    prev = get_result_store().get(analysis_id)
+    if prev is None or prev["tenant"] != current_tenant():
+        raise KeyError(analysis_id)
+    anchor = datetime.fromisoformat(prev["anchor"])
+    source = prev["source"]
+    facts = copy.deepcopy(prev["facts"])
+    prev_evidence = copy.deepcopy(prev["evidence"])
+    resolve_evidence_spans(prev["transcript"], prev_evidence)  # deferred from _remember
+
+    with stage("revision_diff"):
+        edit = TextEdit(prev["transcript"], transcript)
+    refreshed: List[str] = []
+    if not edit:
+        mode = "unchanged"
+        evidence = prev_evidence
+    elif source != "llm":
+        mode = "rules"
+        evidence = []
+    else:
+        with stage("revision_plan"):
+            dirty = _dirty_llm_fields(prev["transcript"], transcript, edit, prev_evidence, anchor)
+        new_facts: Dict[str, Any] = {}
+        new_evidence: List[Dict[str, Any]] = []
+        if dirty:
+            with stage("llm"):
+                new_facts, new_evidence = extract_with_llm(transcript, report_time_iso=prev["anchor"], fields=dirty)
+        if not dirty:
+            mode = "reused"
+        elif new_facts:
+            mode = "llm_partial"
+            refreshed = dirty
+            facts.update({k: new_facts[k] for k in dirty if k in new_facts})
+        else:
+            mode = "llm_partial_failed"  # keep the previous values rather than dropping to rules
+            log.warning("reanalyze.llm_partial.failed analysis_id=%s fields=%s", analysis_id, dirty)
+        drop = frozenset(refreshed)
+        evidence = _carry_evidence(prev_evidence, edit, drop) + new_evidence
+    log.info("reanalyze mode=%s analysis_id=%s changed_chars=%s refreshed=%s",
+             mode, analysis_id, edit.changed_chars, refreshed)
+
+    revision = prev["revision"] + 1
+    with stage("revision_store"):
+        _remember(analysis_id, transcript, prev["anchor"], source, facts, evidence, prev["duplicate_of"], revision)
+
+    form, evidence = _run_cpu_stages(transcript, facts, evidence, source, anchor)
+    if wants(fields, "evidence"):
+        with stage("evidence_spans"):
+            resolve_evidence_spans(transcript, evidence)
+
+    _apply_notify_default(form)
+    notify = outbox_enabled() and not prev["duplicate_of"] and form != prev.get("form")
+    get_result_store().update(analysis_id, form=copy.deepcopy(form))
+    email = None
+    if wants(fields, "draft_email"):
+        with stage("email"):
+            email = _build_email(form)
+    if notify:
+        with stage("outbox_enqueue"):
+            _enqueue_notification(form, analysis_id, corrected=True)
+    annotate(**{"reanalysis.mode": mode, "reanalysis.changed_chars": edit.changed_chars,
+                "reanalysis.refreshed": ",".join(refreshed)})
+    REANALYZE_TOTAL.inc(mode=mode)
+    observe_stage("reanalyze_total", time.perf_counter() - t0)
     return {
+        "analysis_id": analysis_id,
+        "duplicate_of": prev["duplicate_of"],
         "extraction_source": source,
         "incident_form": form,
         "evidence": evidence,
         "draft_email": email,
+        "revision": revision,
+        "reanalysis": {"mode": mode, "changed_chars": edit.changed_chars, "refreshed_fields": refreshed},
     }
 
 
-def analyze_transcript_llm_only(transcript: str) -> Dict[str, Any]:
+@traced()
+def analyze_transcript_llm_only(transcript: str, fields: Optional[FrozenSet[str]] = None,
+                                anchor: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Analyze a transcript using only the LLM (no rules fallback).
     Useful for debugging or comparing model vs. rules performance.
     """
     log.info("analyze_transcript_llm_only.start")
+    t0 = time.perf_counter()
 
-    anchor = datetime.now(tz=UK_TZ)
+    anchor = anchor or datetime.now(tz=UK_TZ)
     anchor_iso = anchor.isoformat()
+    capture.note("anchor", anchor_iso)
+    capture.note("llm_key_present", bool(os.getenv("OPENAI_API_KEY")))
 
-    facts, evidence = extract_with_llm(transcript, report_time_iso=anchor_iso)
-    form = _facts_to_form(facts)
+    with stage("llm"):
+        facts, evidence = extract_with_llm(transcript, report_time_iso=anchor_iso)
+    form = _facts_to_form(facts, anchor)
+    with stage("roster_snap"):
+        _snap_service_user(form, transcript)
 
     # Same behavior: try fallback parsing if LLM leaves datetime empty.
-    _llm_datetime_fallback(form, transcript, evidence)
+    with stage("datetime_fallback"):
+        _llm_datetime_fallback(form, transcript, evidence, anchor)
 
     # Sanity fix for implausible times
-    _sanity_fix_incident_time(form, transcript, anchor, evidence)
+    with stage("sanity_fix"):
+        _sanity_fix_incident_time(form, transcript, anchor, evidence)
 
     # Apply global policy triggers
-    _maybe_append_action(form, transcript)
-
-    email = _build_email(form)
-    log.info(f"analyze_transcript_llm_only.done facts_present={bool(facts)}")
+    with stage("policy_triggers"):
+        _maybe_append_action(form, transcript)
+
+    if wants(fields, "evidence"):
+        with stage("evidence_spans"):
+            resolve_evidence_spans(transcript, evidence)
+
+    _apply_notify_default(form)
+    email = None
+    if wants(fields, "draft_email"):
+        with stage("email"):
+            email = _build_email(form)
+    log.info("analyze_transcript_llm_only.done facts_present=%s", bool(facts))
+    source = "llm" if facts else "llm_empty"
+    annotate(transcript_chars=len(transcript), extraction_source=source)
+    ANALYZE_TOTAL.inc(extraction_source=source)
+    observe_stage("total", time.perf_counter() - t0)
     return {
-        "extraction_source": "llm" if facts else "llm_empty",
+        "analysis_id": uuid.uuid4().hex,
+        "extraction_source": source,
         "incident_form": form,
         "evidence": evidence,
         "draft_email": email,
     }
 
 
+WARMUP_TRANSCRIPT = (
+    "Hi, it's Greg Jones. He fell in the lounge about 20 minutes ago, on 25/09/2025 at 1:45 pm. "
+    "This is the second time this week. There was some bleeding so we called an ambulance."
+)
+
+
+def warm_pipeline() -> None:
+    """
+    Run a synthetic transcript through the offline stages (rules and LLM-result paths, spans,
+    email, dedupe fingerprint) so regexes, ZoneInfo and lazy imports are loaded before real traffic.
+    Makes no LLM call, touches no outbox, capture or dedupe state, and records no stage timings.
+    """
+    anchor = datetime.now(tz=UK_TZ)
+    with unobserved_stages():
+        _dedupe_key(WARMUP_TRANSCRIPT, anchor)
+        form, evidence = _cpu_stages(WARMUP_TRANSCRIPT, {}, [], "rules", anchor)
+        llm_facts = {"service_user_name": "Greg Jones", "incident_type": "fall", "date_time_of_incident": "2001-01-01T00:00:00+00:00"}
+        llm_evidence = [{"field": "location", "quote": "in the front lounge", "start_idx": None, "end_idx": None}]
+        _cpu_stages(WARMUP_TRANSCRIPT, llm_facts, llm_evidence, "llm", anchor)
+        resolve_evidence_spans(WARMUP_TRANSCRIPT, evidence + llm_evidence)
+        _apply_notify_default(form)
+        _build_email(form)
+
+
 def llm_diagnostic() -> Dict[str, Any]:
     """
     Run diagnostic checks for the LLM integration:
@@ -362,8 +782,7 @@ def llm_diagnostic() -> Dict[str, Any]:
         return info
 
     try:
-        from openai import OpenAI
-        client = OpenAI()
+        client = get_client()
         resp = client.chat.completions.create(
             model=info["model"],
             messages=[
@@ -0,0 +1,368 @@
+"""
+outbox.py
+
+Durable notification outbox: finished reports are enqueued to local SQLite on the
+request path (one short transaction) and delivered over SMTP by background
+dispatcher threads.
+
+- The `always_notify` recipient gets each report as its own message ("report" rows).
+- `cc_by_assessment` addresses get a digest ("digest" rows): everything pending for
+  that address goes out as one message once the oldest item is OUTBOX_DIGEST_SECONDS
+  old or OUTBOX_DIGEST_MAX items are waiting.
+- Each dispatcher thread keeps its SMTP connection open between batches.
+- Failures are retried with exponential backoff plus jitter. 5xx responses, or running
+  out of OUTBOX_MAX_ATTEMPTS, mark the row dead.
+- Rows are claimed atomically, so several workers/processes can share one database.
+- Rows left "sending" by a crashed process are reclaimed after OUTBOX_STALE_SECONDS.
+
+Enabled by OUTBOX_PATH (SQLite file); SMTP settings come from SMTP_* env vars
+(see README). `python -m bench.smtp_sink` is a local SMTP stand-in for testing.
+"""
+
+from __future__ import annotations
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.infra.logging import get_logger
+from app.infra.metrics import Counter, Gauge
+from app.util.env import env_num
+
+log = get_logger("app.services.outbox")
+
+OUTBOX_ENQUEUED = Counter("emma_outbox_enqueued_total", "Outbox rows enqueued by kind (report, digest).", ["kind"])
+OUTBOX_SENT = Counter("emma_outbox_sent_total", "Outbox rows delivered by kind (report, digest).", ["kind"])
+OUTBOX_MESSAGES = Counter("emma_outbox_messages_total", "SMTP messages sent by kind (a digest message covers many rows).", ["kind"])
+OUTBOX_FAILURES = Counter("emma_outbox_failures_total", "Delivery failures by outcome (retry, dead).", ["outcome"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    tenant TEXT,
+    analysis_id TEXT,
+    kind TEXT NOT NULL,                      -- report | digest
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | sending | sent | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claim TEXT,
+    claimed_at REAL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, kind, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_recipient ON outbox(status, kind, recipient);
+"""
+
+_WAKE = threading.Event()
+
+
+def outbox_enabled() -> bool:
+    return bool(os.getenv("OUTBOX_PATH"))
+
+
+class Outbox:
+    """SQLite-backed queue of outgoing messages (one connection per thread)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, items: Sequence[Dict[str, Any]]) -> None:
+        """Insert rows {kind, recipient, subject, body, tenant?, analysis_id?} in one transaction."""
+        if not items:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO outbox (created_at, tenant, analysis_id, kind, recipient, subject, body, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(now, it.get("tenant"), it.get("analysis_id"), it["kind"], it["recipient"],
+                  it["subject"], it["body"], now) for it in items],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for it in items:
+            OUTBOX_ENQUEUED.inc(kind=it["kind"])
+        _WAKE.set()
+
+    def claim(self, limit: int, now: Optional[float] = None) -> List[sqlite3.Row]:
+        """
+        Atomically claim due rows: up to `limit` reports, plus all pending digest rows
+        (up to OUTBOX_DIGEST_MAX each) for recipients whose digest is due.
+        """
+        now = now or time.time()
+        digest_window = env_num("OUTBOX_DIGEST_SECONDS", 300)
+        digest_max = int(env_num("OUTBOX_DIGEST_MAX", 50))
+        stale = env_num("OUTBOX_STALE_SECONDS", 300)
+        token = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE outbox SET status='pending', claim=NULL WHERE status='sending' AND claimed_at < ?",
+                (now - stale,),
+            )
+            ids = [r[0] for r in conn.execute(
+                "SELECT id FROM outbox WHERE status='pending' AND kind='report' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?", (now, limit))]
+            due = [r[0] for r in conn.execute(
+                "SELECT recipient FROM outbox WHERE status='pending' AND kind='digest' AND next_attempt_at <= ? "
+                "GROUP BY recipient HAVING MIN(created_at) <= ? OR COUNT(*) >= ?",
+                (now, now - digest_window, digest_max))]
+            for recipient in due:
+                ids += [r[0] for r in conn.execute(
+                    "SELECT id FROM outbox WHERE status='pending' AND kind='digest' AND recipient = ? "
+                    "AND next_attempt_at <= ? ORDER BY id LIMIT ?", (recipient, now, digest_max))]
+            if ids:
+                marks = ",".join("?" * len(ids))
+                conn.execute(
+                    f"UPDATE outbox SET status='sending', claim=?, claimed_at=? WHERE id IN ({marks})",
+                    (token, now, *ids),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not ids:
+            return []
+        return list(conn.execute("SELECT * FROM outbox WHERE claim = ? ORDER BY id", (token,)))
+
+    def mark_sent(self, rows: Sequence[sqlite3.Row]) -> None:
+        ids = [r["id"] for r in rows]
+        marks = ",".join("?" * len(ids))
+        self._conn().execute(
+            f"UPDATE outbox SET status='sent', sent_at=?, claim=NULL WHERE id IN ({marks})", (time.time(), *ids))
+
+    def mark_failed(self, rows: Sequence[sqlite3.Row], error: str, permanent: bool) -> None:
+        """Schedule a retry with exponential backoff + jitter, or mark dead."""
+        max_attempts = int(env_num("OUTBOX_MAX_ATTEMPTS", 8))
+        base = env_num("OUTBOX_BACKOFF_SECONDS", 5)
+        cap = env_num("OUTBOX_BACKOFF_MAX_SECONDS", 1800)
+        now = time.time()
+        updates = []
+        for r in rows:
+            attempts = r["attempts"] + 1
+            if permanent or attempts >= max_attempts:
+                updates.append(("dead", attempts, now, error[:500], r["id"]))
+                OUTBOX_FAILURES.inc(outcome="dead")
+            else:
+                delay = min(cap, base * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+                updates.append(("pending", attempts, now + delay, error[:500], r["id"]))
+                OUTBOX_FAILURES.inc(outcome="retry")
+        self._conn().executemany(
+            "UPDATE outbox SET status=?, attempts=?, next_attempt_at=?, last_error=?, claim=NULL WHERE id=?",
+            updates,
+        )
+
+    def purge_sent(self, older_than_seconds: float) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM outbox WHERE status='sent' AND sent_at < ?", (time.time() - older_than_seconds,))
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        return {r[0]: r[1] for r in self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")}
+
+
+@lru_cache(maxsize=1)
+def get_outbox() -> Outbox:
+    return Outbox(os.environ["OUTBOX_PATH"])
+
+
+OUTBOX_PENDING = Gauge(
+    "emma_outbox_pending",
+    "Outbox rows not yet delivered (pending or sending).",
+    fn=lambda: (sum(v for k, v in get_outbox().counts().items() if k in ("pending", "sending"))
+                if outbox_enabled() else 0),
+)
+
+
+def enqueue_report(subject: str, body: str, to_email: Optional[str], cc: Sequence[str],
+                   analysis_id: Optional[str] = None, tenant: Optional[str] = None) -> int:
+    """Enqueue one finished report: a direct message to `to_email`, digest items for `cc`. Returns rows added."""
+    items = []
+    if to_email:
+        items.append({"kind": "report", "recipient": to_email, "subject": subject, "body": body,
+                      "analysis_id": analysis_id, "tenant": tenant})
+    for addr in cc:
+        if addr and addr != to_email:
+            items.append({"kind": "digest", "recipient": addr, "subject": subject, "body": body,
+                          "analysis_id": analysis_id, "tenant": tenant})
+    get_outbox().enqueue(items)
+    return len(items)
+
+
+# ---- Delivery ----
+
+class SmtpSender:
+    """One reusable SMTP connection (SMTP_HOST/PORT/USER/PASSWORD/STARTTLS/TIMEOUT)."""
+
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "127.0.0.1")
+        self.port = int(env_num("SMTP_PORT", 25))
+        self.user = os.getenv("SMTP_USER")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.starttls = os.getenv("SMTP_STARTTLS", "0").lower() in ("1", "true", "yes")
+        self.timeout = env_num("SMTP_TIMEOUT", 30)
+        self.sender = os.getenv("OUTBOX_FROM", "incidents@localhost")
+        self._smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password or "")
+        return smtp
+
+    def send(self, to: str, subject: str, body: str) -> None:
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = to
+        msg["Subject"] = subject
+        msg.set_content(body)
+        for attempt in (0, 1):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(msg)
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Reused connection went away (server idle timeout); reconnect once.
+                self._smtp = None
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+def _is_permanent(e: Exception) -> bool:
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in e.recipients.values())
+    return isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500
+
+
+def _digest(rows: Sequence[sqlite3.Row]) -> Dict[str, str]:
+    if len(rows) == 1:
+        return {"subject": rows[0]["subject"], "body": rows[0]["body"]}
+    started = time.strftime("%Y-%m-%d %H:%M", time.localtime(rows[0]["created_at"]))
+    parts = [f"{len(rows)} incident reports since {started}:", ""]
+    parts += [f"- {r['subject']}" for r in rows]
+    for r in rows:
+        parts += ["", "-" * 60, r["subject"], "", r["body"]]
+    return {"subject": f"Incident digest: {len(rows)} reports", "body": "\n".join(parts)}
+
+
+class OutboxDispatcher:
+    """Background delivery threads (OUTBOX_WORKERS, default 1), each with its own SMTP connection."""
+
+    def __init__(self, outbox: Outbox, workers: Optional[int] = None, sender_factory=SmtpSender):
+        self.outbox = outbox
+        self.workers = workers or max(1, int(env_num("OUTBOX_WORKERS", 1)))
+        self.sender_factory = sender_factory
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def run_once(self, sender) -> int:
+        """Claim one batch and deliver it; returns the number of rows handled."""
+        rows = self.outbox.claim(int(env_num("OUTBOX_BATCH", 100)))
+        if not rows:
+            return 0
+        groups: List[List[sqlite3.Row]] = [[r] for r in rows if r["kind"] == "report"]
+        by_recipient: Dict[str, List[sqlite3.Row]] = {}
+        for r in rows:
+            if r["kind"] == "digest":
+                by_recipient.setdefault(r["recipient"], []).append(r)
+        groups += list(by_recipient.values())
+
+        for group in groups:
+            kind = group[0]["kind"]
+            msg = _digest(group) if kind == "digest" else {"subject": group[0]["subject"], "body": group[0]["body"]}
+            try:
+                sender.send(group[0]["recipient"], msg["subject"], msg["body"])
+            except Exception as e:
+                permanent = _is_permanent(e)
+                log.warning("outbox.send.failed kind=%s rows=%s permanent=%s: %s", kind, len(group), permanent, e)
+                if not permanent:
+                    sender.close()
+                self.outbox.mark_failed(group, f"{type(e).__name__}: {e}", permanent)
+                continue
+            self.outbox.mark_sent(group)
+            OUTBOX_SENT.inc(len(group), kind=kind)
+            OUTBOX_MESSAGES.inc(kind=kind)
+        return len(rows)
+
+    def _loop(self) -> None:
+        sender = self.sender_factory()
+        poll = env_num("OUTBOX_POLL_SECONDS", 1.0)
+        idle_close = env_num("SMTP_IDLE_SECONDS", 30)
+        last_purge = 0.0
+        try:
+            while not self._stop.is_set():
+                try:
+                    handled = self.run_once(sender)
+                except Exception as e:
+                    log.error("outbox.dispatch.failed: %s", e)
+                    handled = 0
+                if handled:
+                    continue
+                if sender.last_used and time.monotonic() - sender.last_used > idle_close:
+                    sender.close()
+                    sender.last_used = 0.0
+                if time.monotonic() - last_purge > 3600:
+                    last_purge = time.monotonic()
+                    try:
+                        self.outbox.purge_sent(env_num("OUTBOX_RETAIN_DAYS", 7) * 86400)
+                    except Exception as e:
+                        log.warning("outbox.purge.failed: %s", e)
+                _WAKE.wait(poll)
+                _WAKE.clear()
+        finally:
+            sender.close()
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"outbox-dispatcher-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        log.info("outbox.dispatcher.started workers=%s path=%s", self.workers, self.outbox.path)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        _WAKE.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
@@ -0,0 +1,80 @@
+"""
+projection.py
+
+`fields=` projection for analysis results: lets clients ask for a subset of the
+output, and lets the orchestrator skip computing what was not asked for.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, FrozenSet, Optional
+
+# Top-level keys of an analysis result (see orchestrator.analyze_transcript).
+RESULT_FIELDS = (
+    "analysis_id",
+    "duplicate_of",
+    "extraction_source",
+    "incident_form",
+    "evidence",
+    "draft_email",
+    "revision",      # PATCH /analyze/{id} only
+    "reanalysis",    # PATCH /analyze/{id} only
+)
+
+# Keys of `incident_form` (see orchestrator._default_form), selectable as `incident_form.<key>`.
+FORM_FIELDS = (
+    "date_time_of_incident",
+    "reported_at",
+    "service_user_name",
+    "location",
+    "type_of_incident",
+    "description_of_the_incident",
+    "immediate_actions_taken",
+    "was_first_aid_administered",
+    "were_emergency_services_contacted",
+    "who_was_notified",
+    "witnesses",
+    "agreed_next_steps",
+    "risk_assessment_needed",
+    "if_yes_which_risk_assessment",
+)
+
+
+def parse_fields(raw: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Parse `fields=` (comma separated). Top-level keys, or `incident_form.<key>` for single form fields.
+    Returns None for "everything"; raises ValueError on unknown names.
+    """
+    if raw is None or not raw.strip():
+        return None
+    out = set()
+    for item in raw.split(","):
+        name = item.strip()
+        if not name:
+            continue
+        top, _, sub = name.partition(".")
+        if top not in RESULT_FIELDS or ("." in name and (top != "incident_form" or sub not in FORM_FIELDS)):
+            raise ValueError(f"Unknown field: {name}")
+        out.add(name)
+    return frozenset(out) or None
+
+
+def wants(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    """True if `name` (a top-level key) is requested, fully or via a `name.<sub>` entry."""
+    if fields is None or name in fields:
+        return True
+    prefix = name + "."
+    return any(f.startswith(prefix) for f in fields)
+
+
+def project(result: Dict[str, Any], fields: Optional[FrozenSet[str]]) -> Dict[str, Any]:
+    """Drop keys the client did not ask for; `incident_form.<key>` keeps only those form keys."""
+    if fields is None:
+        return result
+    out: Dict[str, Any] = {}
+    for key, value in result.items():
+        if key in fields:
+            out[key] = value
+        elif key == "incident_form" and isinstance(value, dict) and wants(fields, key):
+            subs = {f.split(".", 1)[1] for f in fields if f.startswith("incident_form.")}
+            out[key] = {k: v for k, v in value.items() if k in subs}
+    return out
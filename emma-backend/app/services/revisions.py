@@ -0,0 +1,263 @@
+"""
+revisions.py
+
+Support for incremental re-analysis (`PATCH /analyze/{id}`): a bounded store of recent
+analyses and a character-level diff between two revisions of a transcript.
+
+The store keeps what is needed to redo only part of the work: the transcript, the
+anchor (report time), the tenant, the extraction source, the raw LLM facts/evidence
+(evidence spans are resolved against that transcript on the first edit), and the resulting
+form. It is bounded by count (REVISION_STORE_SIZE), total transcript characters
+(REVISION_STORE_MAX_CHARS) and age (REVISION_TTL_MINUTES).
+
+By default the store is in memory and per process, so with several workers a PATCH
+must reach the worker that ran the analysis. REVISION_STORE_PATH puts it in a SQLite
+file instead, shared by every worker process on the host (like the outbox).
+
+TextEdit trims the common prefix/suffix and runs difflib only on the middle, so a
+one-word fix costs microseconds however long the transcript is.
+"""
+
+from __future__ import annotations
+import difflib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.infra.metrics import Counter
+from app.util.env import env_int
+
+REANALYZE_TOTAL = Counter(
+    "emma_reanalyze_total",
+    "Incremental re-analyses by mode (unchanged, rules, reused, llm_partial, llm_partial_failed).",
+    ["mode"],
+)
+
+
+class TextEdit:
+    """
+    Changes between two revisions of a transcript, as old-text ranges plus an offset map.
+
+    `ops` holds (tag, i1, i2, j1, j2) opcodes for the non-equal regions only, in absolute
+    offsets (old[i1:i2] became new[j1:j2]; i1 == i2 is a pure insertion).
+    """
+
+    def __init__(self, old: str, new: str, max_diff_chars: Optional[int] = None):
+        limit = max_diff_chars if max_diff_chars is not None else env_int("REVISION_DIFF_MAX_CHARS", 20000)
+        n = min(len(old), len(new))
+        pre = 0
+        while pre < n and old[pre] == new[pre]:
+            pre += 1
+        suf = 0
+        while suf < n - pre and old[-1 - suf] == new[-1 - suf]:
+            suf += 1
+        a, b = old[pre:len(old) - suf], new[pre:len(new) - suf]
+        self.ops: List[Tuple[str, int, int, int, int]] = []
+        if not a and not b:
+            return
+        if len(a) + len(b) > limit:
+            # Large rewrite: one replace block rather than a quadratic diff.
+            self.ops.append(("replace", pre, pre + len(a), pre, pre + len(b)))
+            return
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if tag != "equal":
+                self.ops.append((tag, pre + i1, pre + i2, pre + j1, pre + j2))
+
+    def __bool__(self) -> bool:
+        return bool(self.ops)
+
+    @property
+    def changed_chars(self) -> int:
+        return sum(max(i2 - i1, j2 - j1) for _, i1, i2, j1, j2 in self.ops)
+
+    def touches(self, start: Optional[int], end: Optional[int]) -> bool:
+        """True if an edit overlaps old[start:end] (insertions at either edge count)."""
+        if start is None or end is None:
+            return False
+        for _, i1, i2, _, _ in self.ops:
+            if i1 == i2:
+                if start <= i1 <= end:
+                    return True
+            elif i1 < end and start < i2:
+                return True
+        return False
+
+    def map_offset(self, i: int) -> Optional[int]:
+        """Offset in the new text of old offset `i`; None if `i` falls inside an edited range."""
+        shift = 0
+        for _, i1, i2, j1, j2 in self.ops:
+            if i1 < i < i2:
+                return None
+            if i2 > i or i1 == i2 == i:
+                break  # ops are sorted; this one and the rest come after `i`
+            shift += (j2 - j1) - (i2 - i1)
+        return i + shift
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{"op": tag, "old": [i1, i2], "new": [j1, j2]} for tag, i1, i2, j1, j2 in self.ops]
+
+
+class ResultStore:
+    """
+    Bounded, thread-safe LRU of recent analyses keyed by analysis_id, with age-based expiry.
+    Evicts least recently used entries past `max_entries` or `max_chars` transcript characters.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400, max_chars: int = 5_000_000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(entry: Dict[str, Any]) -> int:
+        return len(entry.get("transcript") or "")
+
+    def put(self, analysis_id: str, entry: Dict[str, Any], now: Optional[float] = None) -> None:
+        if self.max_entries <= 0 or self._size(entry) > self.max_chars:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            old = self._entries.pop(analysis_id, None)
+            if old is not None:
+                self._chars -= self._size(old)
+            self._entries[analysis_id] = {**entry, "stored_at": now}
+            self._chars += self._size(entry)
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= self._size(evicted)
+
+    def update(self, analysis_id: str, **values: Any) -> None:
+        """Add fields to a stored entry (no-op if it was evicted meanwhile)."""
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is not None:
+                entry.update(values)
+
+    def get(self, analysis_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is None:
+                return None
+            if now - entry["stored_at"] > self.ttl_seconds:
+                del self._entries[analysis_id]
+                self._chars -= self._size(entry)
+                return None
+            self._entries.move_to_end(analysis_id)
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revisions (
+    analysis_id TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    chars INTEGER NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revisions_used ON revisions(used_at);
+"""
+
+
+class SqliteResultStore(ResultStore):
+    """ResultStore over a SQLite file, shared by worker processes (one connection per thread and pid)."""
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl_seconds: float = 86400, max_chars: int = 5_000_000):
+        super().__init__(max_entries, ttl_seconds, max_chars)
+        self.path = path
+        self._local = threading.local()
+        if max_entries > 0:
+            self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # never share a connection across fork
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def put(self, analysis_id: str, entry: Dict[str, Any], now: Optional[float] = None) -> None:
+        size = self._size(entry)
+        if self.max_entries <= 0 or size > self.max_chars:
+            return
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO revisions (analysis_id, stored_at, used_at, chars, entry) "
+                         "VALUES (?, ?, ?, ?, ?)", (analysis_id, now, now, size, json.dumps(entry, default=str)))
+            # Least recently used first past the count or character bound, and anything expired.
+            conn.execute(
+                "DELETE FROM revisions WHERE stored_at < ? OR analysis_id IN (SELECT analysis_id FROM ("
+                " SELECT analysis_id, SUM(chars) OVER w AS total, ROW_NUMBER() OVER w AS n FROM revisions"
+                " WINDOW w AS (ORDER BY used_at DESC, analysis_id)) WHERE total > ? OR n > ?)",
+                (now - self.ttl_seconds, self.max_chars, self.max_entries),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, analysis_id: str, **values: Any) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT entry FROM revisions WHERE analysis_id = ?", (analysis_id,)).fetchone()
+            if row is not None:
+                entry = {**json.loads(row[0]), **values}
+                conn.execute("UPDATE revisions SET entry = ? WHERE analysis_id = ?",
+                             (json.dumps(entry, default=str), analysis_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, analysis_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        conn = self._conn()
+        row = conn.execute("SELECT stored_at, entry FROM revisions WHERE analysis_id = ?", (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > self.ttl_seconds:
+            conn.execute("DELETE FROM revisions WHERE analysis_id = ?", (analysis_id,))
+            return None
+        conn.execute("UPDATE revisions SET used_at = ? WHERE analysis_id = ?", (now, analysis_id))
+        return {**json.loads(row[1]), "stored_at": row[0]}
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+
+
+_STORE: Optional[ResultStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """
+    Process-wide store configured from REVISION_STORE_SIZE (0 disables) / _MAX_CHARS /
+    REVISION_TTL_MINUTES; SQLite-backed (shared across workers) when REVISION_STORE_PATH is set.
+    """
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                limits = dict(
+                    max_entries=env_int("REVISION_STORE_SIZE", 1000),
+                    ttl_seconds=env_int("REVISION_TTL_MINUTES", 1440) * 60,
+                    max_chars=env_int("REVISION_STORE_MAX_CHARS", 5_000_000),
+                )
+                path = os.getenv("REVISION_STORE_PATH")
+                _STORE = SqliteResultStore(path, **limits) if path else ResultStore(**limits)
+    return _STORE
@@ -0,0 +1,99 @@
+"""
+warmup.py
+
+Worker start-up: preload, warm-up and readiness (`/ready`).
+
+- preload(): fork-safe work. Loads compiled configs (base + tenants), the roster index,
+  ZoneInfo data and the openai SDK import, and runs a synthetic transcript through the
+  pipeline. It then calls gc.freeze(), so the collector no longer scans these long-lived
+  objects, and under a pre-fork server they stay shared copy-on-write.
+- warm_process(): per-process work that must not cross a fork: the LLM client's
+  connection pool and the CPU offload pool.
+
+Readiness flips only after both have run. With WARMUP_AT_IMPORT=1 (e.g. gunicorn
+--preload), preload() runs when app.main is imported, i.e. in the master before fork.
+"""
+
+from __future__ import annotations
+import gc
+import os
+import os.path as p
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from zoneinfo import ZoneInfo
+
+from app.config.incident_config import get_config
+from app.config.tenants import tenant_config_dir
+from app.infra import cpu_pool
+from app.infra.logging import get_logger
+from app.llm import extract as llm_extract
+from app.rules.roster import load_roster_index
+from app.services import orchestrator
+from app.util.env import env_int
+
+log = get_logger("app.services.warmup")
+
+_LOCK = threading.Lock()
+_STATE: Dict[str, Any] = {"preloaded": False, "ready": False, "timings_ms": {}}
+
+
+def _step(name: str, fn: Callable[[], Any]) -> None:
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # A failed step only costs the first request some latency; keep starting up.
+        log.warning("startup.step.failed step=%s: %s", name, e)
+    _STATE["timings_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _preload_tenants() -> None:
+    d = tenant_config_dir()
+    if not d or not p.isdir(d):
+        return
+    limit = env_int("TENANT_CACHE_SIZE", 256)
+    names = sorted(f[:-4] for f in os.listdir(d) if f.endswith(".yml"))[:limit]
+    for name in names:
+        get_config(name)
+
+
+def _import_sdk() -> None:
+    import openai  # noqa: F401  (heavy import; keep it off the first request)
+
+
+def preload() -> None:
+    """Fork-safe preloading (idempotent): no threads, no sockets."""
+    with _LOCK:
+        if _STATE["preloaded"]:
+            return
+        start = time.perf_counter()
+        _step("config", get_config)
+        _step("tenants", _preload_tenants)
+        _step("roster", load_roster_index)
+        _step("zoneinfo", lambda: ZoneInfo("Europe/London"))
+        _step("openai_import", _import_sdk)
+        _step("pipeline", orchestrator.warm_pipeline)
+        if os.getenv("GC_FREEZE", "1").lower() not in ("0", "false", "no"):
+            _step("gc_freeze", lambda: (gc.collect(), gc.freeze()))
+        _STATE["preloaded"] = True
+        _STATE["timings_ms"]["preload_total"] = round((time.perf_counter() - start) * 1000, 1)
+    log.info("startup.preload ms=%s steps=%s", _STATE["timings_ms"]["preload_total"], _STATE["timings_ms"])
+
+
+def warm_process(pool_initializer: Optional[Callable[[], None]] = None) -> None:
+    """Per-process warm-up: LLM connection pool and CPU offload pool."""
+    start = time.perf_counter()
+    if os.getenv("WARMUP_LLM_CONNECTION", "1").lower() not in ("0", "false", "no"):
+        _step("llm_connection", llm_extract.warm_connection)
+    _step("cpu_pool", lambda: cpu_pool.start(initializer=pool_initializer))
+    _STATE["timings_ms"]["process_total"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def mark_ready() -> None:
+    _STATE["ready"] = True
+    log.info("startup.ready pid=%s timings_ms=%s", os.getpid(), _STATE["timings_ms"])
+
+
+def status() -> Dict[str, Any]:
+    return {"ready": _STATE["ready"], "pid": os.getpid(), "timings_ms": dict(_STATE["timings_ms"])}
@@ -0,0 +1,23 @@
+"""
+env.py
+
+Numeric settings from environment variables, falling back to the default when a
+variable is unset or not a number (a bad value never stops the service starting).
+"""
+
+from __future__ import annotations
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
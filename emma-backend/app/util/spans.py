@@ -0,0 +1,158 @@
+"""
+spans.py
+
+Maps evidence quotes (e.g. returned by the LLM, or the datetime fallback) back to
+character offsets in the original transcript so the frontend can highlight them.
+
+Resolution order per quote:
+  1. exact substring
+  2. normalized (case, whitespace, curly quotes/dashes) with an offset map back to the original
+  3. approximate (paraphrased quotes): token diagonal voting over a word index
+The normalized text and word index are built once per transcript; all quotes for a
+request are resolved in a single call.
+"""
+
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+_TRANSLATE = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"', "–": "-", "—": "-"})
+
+# Too frequent to anchor a fuzzy alignment on their own.
+_STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "in", "on", "at", "is", "was", "it", "he", "she",
+    "they", "i", "we", "you", "his", "her", "him", "that", "this", "with", "for", "be", "had",
+}
+
+MIN_FUZZY_SCORE = 0.5
+
+
+class TranscriptSpanIndex:
+    """Per-transcript lookup structures, built once and reused for every quote."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.norm, self._norm_map = _normalize_with_map(text)
+        self.words: List[Tuple[str, int, int]] = [
+            (m.group(0), self._norm_map[m.start()], self._norm_map[m.end() - 1] + 1)
+            for m in _WORD_RE.finditer(self.norm)
+        ]
+        self.postings: Dict[str, List[int]] = {}
+        for i, (w, _, _) in enumerate(self.words):
+            self.postings.setdefault(w, []).append(i)
+
+    def locate(self, quote: str) -> Optional[Tuple[int, int, str, float]]:
+        """Return (start, end, method, score) for `quote`, or None if it cannot be anchored."""
+        if not quote or not quote.strip():
+            return None
+        quote = quote.strip()
+        i = self.text.find(quote)
+        if i >= 0:
+            return i, i + len(quote), "exact", 1.0
+
+        nq, _ = _normalize_with_map(quote)
+        if nq:
+            j = self.norm.find(nq)
+            if j >= 0:
+                start = self._norm_map[j]
+                end = self._norm_map[j + len(nq) - 1] + 1
+                return start, end, "normalized", 1.0
+
+        return self._fuzzy(nq)
+
+    def _fuzzy(self, nq: str) -> Optional[Tuple[int, int, str, float]]:
+        qwords = _WORD_RE.findall(nq)
+        if not qwords:
+            return None
+        anchors = {w for w in qwords if w not in _STOPWORDS} or set(qwords)
+        # Vote on alignment offset (transcript word index - quote word index).
+        votes: Counter = Counter()
+        for qi, w in enumerate(qwords):
+            if w not in anchors:
+                continue
+            for ti in self.postings.get(w, ()):
+                votes[ti - qi] += 1
+        if not votes:
+            return None
+
+        need = Counter(qwords)
+        slack = max(3, len(qwords) // 2)
+        best: Optional[Tuple[float, int, int]] = None
+        for diag, _ in votes.most_common(5):
+            lo = max(0, diag - slack)
+            hi = min(len(self.words), diag + len(qwords) + slack)
+            remaining = need.copy()
+            first = last = None
+            matched = 0
+            for ti in range(lo, hi):
+                w = self.words[ti][0]
+                if remaining[w] > 0:
+                    remaining[w] -= 1
+                    matched += 1
+                    first = ti if first is None else first
+                    last = ti
+            if first is None:
+                continue
+            score = matched / len(qwords)
+            if best is None or score > best[0]:
+                best = (score, first, last)
+        if best is None or best[0] < MIN_FUZZY_SCORE:
+            return None
+        score, first, last = best
+        return self.words[first][1], self.words[last][2], "fuzzy", round(score, 3)
+
+
+def _normalize_with_map(text: str) -> Tuple[str, List[int]]:
+    """
+    Casefold, unify quotes/dashes and collapse whitespace runs to one space.
+    Returns (normalized, map) where map[i] is the original index of normalized char i.
+    """
+    out: List[str] = []
+    idx: List[int] = []
+    prev_space = True
+    for i, ch in enumerate(text.translate(_TRANSLATE)):
+        if ch.isspace():
+            if prev_space:
+                continue
+            out.append(" ")
+            idx.append(i)
+            prev_space = True
+            continue
+        for c in ch.lower():
+            out.append(c)
+            idx.append(i)
+        prev_space = False
+    if out and out[-1] == " ":
+        out.pop()
+        idx.pop()
+    return "".join(out), idx
+
+
+def resolve_evidence_spans(text: str, evidence: List[Dict[str, Any]]) -> None:
+    """
+    Fill start_idx/end_idx for evidence items that have a quote but no span (in place).
+    Resolved items also get `match` ("exact" | "normalized" | "fuzzy") and `match_score` (0..1).
+    Items already anchored (e.g. from rules) are left untouched.
+    """
+    pending = [ev for ev in evidence if ev.get("quote") and ev.get("start_idx") is None]
+    if not pending:
+        return
+    index: Optional[TranscriptSpanIndex] = None
+    for ev in pending:
+        quote = str(ev["quote"]).strip()
+        i = text.find(quote) if quote else -1
+        if i >= 0:
+            hit = (i, i + len(quote), "exact", 1.0)
+        else:
+            # Normalized/fuzzy structures only when some quote is not verbatim.
+            index = index or TranscriptSpanIndex(text)
+            hit = index.locate(quote)
+        if hit is None:
+            continue
+        start, end, method, score = hit
+        ev["start_idx"] = start
+        ev["end_idx"] = end
+        ev["match"] = method
+        ev["match_score"] = score
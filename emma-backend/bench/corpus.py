@@ -0,0 +1,227 @@
+"""
+corpus.py
+
+Synthetic transcript generator for benchmarks and load tests.
+
+Transcripts are assembled from templates over everything in incident_patterns.yml:
+every incident type (a phrase sampled from one of its regexes), every location,
+the GP/999 policy triggers, risk-assessment phrases, and the explicit/relative date
+phrasings understood by util/datetime_extract. Length is controllable from a single
+sentence up to ~100 KB by padding with neutral care-log filler (checked to match no rule).
+
+Usage:
+    python -m bench.corpus --n 200 --size 2000 --seed 7 --out corpus.jsonl
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+from typing import Any, Dict, List, Optional
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    from re._constants import (  # type: ignore
+        ANY, AT, BRANCH, CATEGORY, CATEGORY_DIGIT, CATEGORY_SPACE, IN, LITERAL, MAX_REPEAT,
+        MIN_REPEAT, NEGATE, NOT_LITERAL, RANGE, SUBPATTERN,
+    )
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore
+    from sre_constants import (  # type: ignore
+        ANY, AT, BRANCH, CATEGORY, CATEGORY_DIGIT, CATEGORY_SPACE, IN, LITERAL, MAX_REPEAT,
+        MIN_REPEAT, NEGATE, NOT_LITERAL, RANGE, SUBPATTERN,
+    )
+
+from app.config.incident_config import get_config, load_incident_config_strict, load_notifications, load_assessment_rules
+
+NAMES = ["Greg Jones", "Mary Smith", "Albert Okafor", "Doris Patel", "Siobhan Murphy", "Harry Evans"]
+
+DATE_PHRASES = [
+    "on 25/09/2025 at 1:45 pm",
+    "on 3-10-2025 around 13:45",
+    "on 12 Sept 2025 at 9 am",
+    "on 4 October 2025 at noon",
+    "at midnight",
+    "about 20 minutes ago",
+    "2 hours ago",
+    "yesterday",
+    "this morning",
+    "this evening",
+    "last night",
+    "",  # no time given
+]
+
+OPENERS = [
+    "Hi, it's {name}.",
+    "Hello, this is about {name}.",
+    "this is the carer for {name}",
+    "Hi it's {name}, calling from the home.",
+]
+
+# Padding must not trigger any rule (incident type, location, assessment or policy trigger);
+# check_filler() enforces this against the current config.
+FILLER = [
+    "I checked the care plan and updated the daily notes.",
+    "The rest of the shift was otherwise quiet and residents had lunch as normal.",
+    "We made a cup of tea and sat with them for a while.",
+    "Another carer was busy elsewhere with the evening round.",
+    "Family visited in the afternoon and everything seemed settled.",
+    "I will hand over to the night team and record this in the log.",
+]
+
+
+def check_filler() -> None:
+    """Raise ValueError if the filler text matches any configured rule pattern or location."""
+    cfg = get_config()
+    text = " ".join(FILLER)
+    low = text.lower()
+    hits = [rx.pattern for _, rxs in cfg.incident_regexes for rx in rxs if rx.search(text)]
+    hits += [rx.pattern for rxs in cfg.policy_trigger_regexes.values() for rx in rxs if rx.search(low)]
+    hits += [rx.pattern for rule in cfg.assessment_rules for rx in rule["regexes"] if rx.search(low)]
+    hits += [loc for loc in cfg.locations if loc in low]
+    if hits:
+        raise ValueError(f"bench.corpus FILLER matches rule patterns: {hits}")
+
+
+def sample_regex(pattern: str, rng: random.Random) -> str:
+    """Produce a short string that matches `pattern` (random branch choice, minimal repeats)."""
+    return _emit(sre_parse.parse(pattern), rng).strip()
+
+
+def _emit(items, rng: random.Random) -> str:
+    out: List[str] = []
+    for op, av in items:
+        if op is LITERAL:
+            out.append(chr(av))
+        elif op is NOT_LITERAL:
+            out.append("x" if chr(av) != "x" else "y")
+        elif op is ANY:
+            out.append(" ")
+        elif op is IN:
+            out.append(_emit_in(av))
+        elif op is SUBPATTERN:
+            out.append(_emit(av[-1], rng))
+        elif op is BRANCH:
+            out.append(_emit(rng.choice(av[1]), rng))
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            lo, _hi, sub = av
+            # `.*` between words becomes one space; other optional pieces are skipped.
+            if lo == 0 and len(sub) == 1 and sub[0][0] is ANY:
+                out.append(" ")
+            else:
+                out.append(_emit(sub, rng) * lo)
+        elif op is AT:
+            continue
+    return "".join(out)
+
+
+def _emit_in(av) -> str:
+    for op, val in av:
+        if op is NEGATE:
+            return "x"
+        if op is LITERAL:
+            return chr(val)
+        if op is RANGE:
+            return chr(val[0])
+        if op is CATEGORY:
+            if val is CATEGORY_DIGIT:
+                return "1"
+            if val is CATEGORY_SPACE:
+                return " "
+            return "a"
+    return "a"
+
+
+def _filler(rng: random.Random, chars: int) -> str:
+    parts: List[str] = []
+    total = 0
+    while total < chars:
+        s = rng.choice(FILLER)
+        parts.append(s)
+        total += len(s) + 1
+    return " ".join(parts)
+
+
+def generate_transcript(rng: random.Random, target_chars: Optional[int] = None,
+                        incident_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build one transcript. Returns {"text", "incident_type", "location", "date_phrase",
+    "trigger", "assessment", "service_user_name"} (labels describe what was inserted).
+    """
+    patterns, locations = load_incident_config_strict()
+    triggers = (load_notifications().get("global_policy_triggers") or {})
+    assessments = load_assessment_rules()
+
+    itype = incident_type or rng.choice(sorted(patterns))
+    incident = sample_regex(rng.choice(patterns[itype]), rng)
+    location = rng.choice(locations)
+    date_phrase = rng.choice(DATE_PHRASES)
+    name = rng.choice(NAMES)
+
+    trigger = None
+    trigger_kind = rng.choice(["none", "none", "contact_gp_if", "call_999_if"])
+    if trigger_kind != "none" and triggers.get(trigger_kind):
+        trigger = sample_regex(rng.choice(triggers[trigger_kind]), rng)
+
+    assessment = None
+    if assessments and rng.random() < 0.5:
+        rule = rng.choice(assessments)
+        assessment = sample_regex(rng.choice(rule["patterns"]), rng)
+
+    body = [
+        rng.choice(OPENERS).format(name=name),
+        f"{incident} in the {location} {date_phrase}".strip() + ".",
+    ]
+    if assessment:
+        body.append(f"Also {assessment}.")
+    if trigger:
+        body.append(f"There was {trigger}.")
+    text = " ".join(body)
+
+    if target_chars and len(text) < target_chars:
+        # Keep the incident near the start, as in real calls, with the log after it.
+        text = text + " " + _filler(rng, target_chars - len(text))
+        text = text[:target_chars]
+
+    return {
+        "text": text,
+        "incident_type": itype,
+        "location": location,
+        "date_phrase": date_phrase or None,
+        "trigger": trigger,
+        "assessment": assessment,
+        "service_user_name": name,
+    }
+
+
+def generate_corpus(n: int, seed: int = 7, target_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """`n` transcripts cycling through every incident type so each is equally represented."""
+    if target_chars:
+        check_filler()
+    rng = random.Random(seed)
+    patterns, _ = load_incident_config_strict()
+    types = sorted(patterns)
+    return [generate_transcript(rng, target_chars, types[i % len(types)]) for i in range(n)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Generate a synthetic transcript corpus (JSONL).")
+    ap.add_argument("--n", type=int, default=100)
+    ap.add_argument("--size", type=int, default=None, help="target characters per transcript (max ~100000)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default="-")
+    args = ap.parse_args(argv)
+    rows = generate_corpus(args.n, args.seed, args.size)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+"""
+evaluate.py
+
+Golden-corpus evaluation: accuracy against latency and cost for each extraction path.
+
+Runs a labelled JSONL corpus through
+  rules    – extract_with_rules plus the deterministic form stages (analyze_transcript, LLM off)
+  llm      – analyze_transcript_llm_only (no rules fallback)
+  default  – analyze_transcript as served by /analyze
+and scores every incident_form field against the gold labels (precision / recall / F1
+per field and per incident type), evidence span overlap (IoU) where gold spans are
+given, and per-item latency and token cost. Ends with a Pareto table and, per field,
+the cheapest path whose F1 is within --tolerance of the best.
+
+LLM responses are cached in SQLite keyed by (model, request options, prompt), so re-runs
+are free and deterministic. A cached call counts the latency and tokens of the original
+call, so the numbers describe live traffic. --offline serves only from the cache: a miss
+makes that call fail (the pipeline then falls back to rules), so paths with misses are
+reported as incomplete, left out of the Pareto comparison, and the run exits 1. Paths that make no
+LLM call run serially so GIL contention does not inflate their latency; LLM paths run
+--workers items in parallel.
+
+Corpus rows: {"id", "transcript" (or "text"), "anchor"?, "tenant"?, "gold": {<incident_form
+keys>}, "gold_evidence"?: [{"field", "start_idx", "end_idx"} | {"field", "quote"}]}.
+Rows from bench/corpus.py (top-level incident_type / location / service_user_name) are
+accepted too, as a smoke test; they are labelled from the rules' own patterns, so use
+a hand-labelled corpus for real decisions.
+
+Usage (from emma-backend/):
+    python -m bench.evaluate gold.jsonl --paths rules,llm,default --workers 8 --out eval.json
+    python -m bench.evaluate gold.jsonl --offline                 # cache only, no network
+"""
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Evaluation must not send email, capture traffic, reuse facts across items or keep revisions.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DEDUPE_ENABLED"] = "0"
+os.environ["REVISION_STORE_SIZE"] = "0"
+os.environ.pop("CAPTURE_PATH", None)
+os.environ.pop("OUTBOX_PATH", None)
+
+from app.config.tenants import bind_tenant  # noqa: E402
+from app.infra.logging import setup_logging  # noqa: E402
+from app.llm import extract as llm_extract  # noqa: E402
+from app.services import orchestrator  # noqa: E402
+
+PATHS = ("rules", "llm", "default")
+LLM_PATHS = ("llm", "default")
+DEFAULT_ANCHOR = "2025-10-01T12:00:00+01:00"  # fixed, so prompts (and the cache) are stable
+
+SCORED_FIELDS = (
+    "date_time_of_incident", "service_user_name", "location", "type_of_incident",
+    "description_of_the_incident", "immediate_actions_taken", "was_first_aid_administered",
+    "were_emergency_services_contacted", "who_was_notified", "witnesses", "agreed_next_steps",
+    "risk_assessment_needed", "if_yes_which_risk_assessment",
+)
+TEXT_FIELDS = ("description_of_the_incident", "immediate_actions_taken", "who_was_notified",
+               "witnesses", "agreed_next_steps")
+# Evidence `field` names are LLM keys; gold may use either spelling.
+EVIDENCE_FIELD_ALIASES = {"incident_type": "type_of_incident", "description": "description_of_the_incident"}
+
+
+# --- LLM response cache -------------------------------------------------------------------
+
+_ITEM = threading.local()  # per-item LLM accounting (calls, cache hits, tokens, ms)
+
+
+def _account() -> Dict[str, float]:
+    acc = getattr(_ITEM, "acc", None)
+    if acc is None:
+        acc = _ITEM.acc = defaultdict(float)
+    return acc
+
+
+class LLMCache:
+    """(model, request options, prompt) -> response content, token usage and the original call latency."""
+
+    def __init__(self, path: str, offline: bool = False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, content TEXT, "
+            "prompt_tokens INTEGER, completion_tokens INTEGER, latency_ms REAL, created REAL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, int, int, float]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT content, prompt_tokens, completion_tokens, latency_ms FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def put(self, key: str, content: str, prompt_tokens: int, completion_tokens: int, latency_ms: float) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, content, prompt_tokens, completion_tokens, latency_ms, time.time()))
+            self._db.commit()
+
+    def wrap(self, complete: Callable[[str, str], Tuple[str, Any]]) -> Callable[[str, str], Tuple[str, Any]]:
+        def _complete(prompt: str, model: str, **kwargs):
+            spec = json.dumps(kwargs, sort_keys=True)  # response_format / max_tokens
+            key = hashlib.sha256(f"{model}\0{spec}\0{prompt}".encode("utf-8")).hexdigest()
+            acc = _account()
+            acc["llm_calls"] += 1
+            hit = self.get(key)
+            if hit is None:
+                if self.offline:
+                    acc["cache_misses"] += 1
+                    raise LookupError("not in LLM cache (--offline)")
+                start = time.perf_counter()
+                content, usage = complete(prompt, model, **kwargs)
+                latency_ms = (time.perf_counter() - start) * 1000
+                p_tok = getattr(usage, "prompt_tokens", None) or len(prompt) // 4
+                c_tok = getattr(usage, "completion_tokens", None) or len(content) // 4
+                self.put(key, content, p_tok, c_tok, latency_ms)
+            else:
+                content, p_tok, c_tok, latency_ms = hit
+                acc["cache_hits"] += 1
+                acc["replayed_llm_ms"] += latency_ms  # added to wall time: report as if live
+            acc["prompt_tokens"] += p_tok
+            acc["completion_tokens"] += c_tok
+            return content, SimpleNamespace(prompt_tokens=p_tok, completion_tokens=c_tok,
+                                            total_tokens=p_tok + c_tok)
+        return _complete
+
+
+# --- scoring ------------------------------------------------------------------------------
+
+def _norm(v: Any) -> Any:
+    if isinstance(v, str):
+        return " ".join(v.lower().split()) or None
+    return v
+
+
+def _positive(v: Any) -> bool:
+    return v not in (None, False, "", [])
+
+
+def _token_f1(a: str, b: str) -> float:
+    ta, tb = a.split(), b.split()
+    common = sum(min(ta.count(w), tb.count(w)) for w in set(ta))
+    if not common:
+        return 0.0
+    p, r = common / len(ta), common / len(tb)
+    return 2 * p * r / (p + r)
+
+
+def _parse_dt(v: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def field_match(field: str, pred: Any, gold: Any, time_tolerance_min: float = 30) -> bool:
+    """Whether a predicted value counts as the gold value (both assumed non-empty)."""
+    if field == "date_time_of_incident":
+        p, g = _parse_dt(pred), _parse_dt(gold)
+        if p is None or g is None or (p.tzinfo is None) != (g.tzinfo is None):
+            return False
+        return abs((p - g).total_seconds()) <= time_tolerance_min * 60
+    p, g = _norm(pred), _norm(gold)
+    if field in TEXT_FIELDS and isinstance(p, str) and isinstance(g, str):
+        return _token_f1(p, g) >= 0.5
+    if field == "location" and isinstance(p, str) and isinstance(g, str):
+        return p in g or g in p  # "lounge" vs "the front lounge"
+    return p == g
+
+
+def _prf(c: Dict[str, int]) -> Dict[str, Any]:
+    p = c["tp"] / (c["tp"] + c["fp"]) if c["tp"] + c["fp"] else None
+    r = c["tp"] / (c["tp"] + c["fn"]) if c["tp"] + c["fn"] else None
+    f = 2 * p * r / (p + r) if p and r else (0.0 if p is not None and r is not None else None)
+    rnd = lambda x: round(x, 4) if x is not None else None
+    return {"precision": rnd(p), "recall": rnd(r), "f1": rnd(f), "n": c["n"]}
+
+
+def score_item(form: Dict[str, Any], gold: Dict[str, Any], time_tolerance_min: float) -> Dict[str, Dict[str, int]]:
+    """
+    Per-field confusion counts. Empty/False values are negatives; a wrong non-empty prediction
+    for a non-empty gold value counts as both a false positive and a false negative.
+    """
+    out: Dict[str, Dict[str, int]] = {}
+    for field in SCORED_FIELDS:
+        if field not in gold:
+            continue
+        pred, want = form.get(field), gold[field]
+        c = {"tp": 0, "fp": 0, "fn": 0, "n": 1}
+        if _positive(pred) and _positive(want):
+            if field_match(field, pred, want, time_tolerance_min):
+                c["tp"] = 1
+            else:
+                c["fp"] = c["fn"] = 1
+        elif _positive(pred):
+            c["fp"] = 1
+        elif _positive(want):
+            c["fn"] = 1
+        out[field] = c
+    return out
+
+
+def _ev_field(name: Any) -> Any:
+    return EVIDENCE_FIELD_ALIASES.get(name, name)
+
+
+def span_overlap(pred: List[Dict[str, Any]], gold: List[Dict[str, Any]], text: str) -> List[float]:
+    """Best character IoU of any predicted span (same field) for each gold span."""
+    out: List[float] = []
+    for g in gold:
+        gs, ge = g.get("start_idx"), g.get("end_idx")
+        if gs is None and g.get("quote"):
+            gs = text.find(g["quote"])
+            ge = gs + len(g["quote"]) if gs >= 0 else None
+            gs = gs if gs >= 0 else None
+        if gs is None or ge is None:
+            continue
+        best = 0.0
+        for ev in pred:
+            ps, pe = ev.get("start_idx"), ev.get("end_idx")
+            if ps is None or pe is None or _ev_field(ev.get("field")) != _ev_field(g.get("field")):
+                continue
+            inter = max(0, min(pe, ge) - max(ps, gs))
+            union = max(pe, ge) - min(ps, gs)
+            best = max(best, inter / union if union else 0.0)
+        out.append(best)
+    return out
+
+
+# --- running ------------------------------------------------------------------------------
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            gold = row.get("gold")
+            if gold is None:  # bench/corpus.py row
+                gold = {k_dst: row[k_src] for k_src, k_dst in (
+                    ("incident_type", "type_of_incident"), ("location", "location"),
+                    ("service_user_name", "service_user_name")) if k_src in row}
+            rows.append({
+                "id": row.get("id", i),
+                "transcript": row.get("transcript") or row.get("text") or "",
+                "anchor": row.get("anchor") or DEFAULT_ANCHOR,
+                "tenant": row.get("tenant"),
+                "gold": gold,
+                "gold_evidence": row.get("gold_evidence") or [],
+            })
+    return rows
+
+
+def _run_item(path: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    _ITEM.acc = defaultdict(float)
+    run = orchestrator.analyze_transcript_llm_only if path == "llm" else orchestrator.analyze_transcript
+    start = time.perf_counter()
+    try:
+        with bind_tenant(row["tenant"]):
+            result = run(row["transcript"], anchor=datetime.fromisoformat(row["anchor"]))
+        error = None
+    except Exception as e:
+        result, error = {}, f"{type(e).__name__}: {e}"
+    wall_ms = (time.perf_counter() - start) * 1000
+    acc = _ITEM.acc
+    return {
+        "id": row["id"],
+        "source": result.get("extraction_source"),
+        "form": result.get("incident_form") or {},
+        "evidence": result.get("evidence") or [],
+        "error": error,
+        "latency_ms": wall_ms + acc["replayed_llm_ms"],
+        "llm_calls": int(acc["llm_calls"]),
+        "cache_hits": int(acc["cache_hits"]),
+        "cache_misses": int(acc["cache_misses"]),
+        "prompt_tokens": int(acc["prompt_tokens"]),
+        "completion_tokens": int(acc["completion_tokens"]),
+    }
+
+
+def run_path(path: str, rows: List[Dict[str, Any]], workers: int, key_for_llm: Optional[str]) -> List[Dict[str, Any]]:
+    saved = os.environ.get("OPENAI_API_KEY")
+    if path == "rules" or not key_for_llm:
+        os.environ.pop("OPENAI_API_KEY", None)
+    else:
+        os.environ["OPENAI_API_KEY"] = key_for_llm
+    try:
+        if path in LLM_PATHS and workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(lambda r: _run_item(path, r), rows))
+        return [_run_item(path, r) for r in rows]
+    finally:
+        if saved is None:
+            os.environ.pop("OPENAI_API_KEY", None)
+        else:
+            os.environ["OPENAI_API_KEY"] = saved
+
+
+def _pct(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def summarize(rows: List[Dict[str, Any]], items: List[Dict[str, Any]], time_tolerance_min: float,
+              price_in: float, price_out: float) -> Dict[str, Any]:
+    fields: Dict[str, Dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0, "n": 0})
+    by_type: Dict[str, Dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0, "n": 0})
+    type_class: Dict[str, Dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0, "n": 0})
+    ious: List[float] = []
+    for row, item in zip(rows, items):
+        counts = score_item(item["form"], row["gold"], time_tolerance_min)
+        gold_type = row["gold"].get("type_of_incident") or "none"
+        for field, c in counts.items():
+            for k in c:
+                fields[field][k] += c[k]
+                by_type[gold_type][k] += c[k]
+        if "type_of_incident" in row["gold"]:
+            pred_type = item["form"].get("type_of_incident") or "none"
+            type_class[gold_type]["n"] += 1
+            if pred_type == gold_type:
+                type_class[gold_type]["tp"] += 1
+            else:
+                type_class[gold_type]["fn"] += 1
+                type_class[pred_type]["fp"] += 1
+        ious.extend(span_overlap(item["evidence"], row["gold_evidence"], row["transcript"]))
+
+    per_field = {f: _prf(c) for f, c in sorted(fields.items())}
+    f1s = [v["f1"] for v in per_field.values() if v["f1"] is not None]
+    micro = _prf({k: sum(c[k] for c in fields.values()) for k in ("tp", "fp", "fn", "n")})
+    lat = [i["latency_ms"] for i in items]
+    n = max(1, len(items))
+    p_tok = sum(i["prompt_tokens"] for i in items) / n
+    c_tok = sum(i["completion_tokens"] for i in items) / n
+    return {
+        "items": len(items),
+        "errors": sum(1 for i in items if i["error"]),
+        "sources": dict(sorted(_count(i["source"] for i in items).items())),
+        "macro_f1": round(sum(f1s) / len(f1s), 4) if f1s else None,
+        "micro": micro,
+        "fields": per_field,
+        "incident_type_classes": {t: _prf(c) for t, c in sorted(type_class.items())},
+        "by_incident_type": {t: _prf(c) for t, c in sorted(by_type.items())},
+        "spans": {"n": len(ious), "mean_iou": round(sum(ious) / len(ious), 4) if ious else None,
+                  "hit_rate_iou50": round(sum(1 for x in ious if x >= 0.5) / len(ious), 4) if ious else None},
+        "latency_ms": {"p50": round(_pct(lat, 0.5), 3), "p95": round(_pct(lat, 0.95), 3),
+                       "mean": round(sum(lat) / n, 3)},
+        "tokens_per_item": {"prompt": round(p_tok, 1), "completion": round(c_tok, 1)},
+        "cost_per_1k_items_usd": round((p_tok * price_in + c_tok * price_out) / 1e6 * 1000, 4),
+        "llm_calls": sum(i["llm_calls"] for i in items),
+        "cache_hits": sum(i["cache_hits"] for i in items),
+        "cache_misses": sum(i["cache_misses"] for i in items),
+    }
+
+
+def _count(values) -> Dict[str, int]:
+    out: Dict[str, int] = defaultdict(int)
+    for v in values:
+        out[str(v)] += 1
+    return out
+
+
+def pareto(summaries: Dict[str, Dict[str, Any]], tolerance: float) -> Dict[str, Any]:
+    """
+    Frontier over (macro F1 up, p50 latency down, cost down), and per field the cheapest
+    path (by cost, then latency) whose F1 is within `tolerance` of the best path's.
+    Paths with offline cache misses are left out (their LLM items silently became rules).
+    """
+    excluded = sorted(p for p, s in summaries.items() if s.get("cache_misses"))
+    summaries = {p: s for p, s in summaries.items() if p not in excluded}
+    if not summaries:
+        return {"frontier": [], "good_enough_overall": None, "best_overall": None,
+                "per_field": {}, "tolerance": tolerance, "excluded": excluded}
+    def better_or_equal(a, b):
+        return ((a["macro_f1"] or 0) >= (b["macro_f1"] or 0) and a["latency_ms"]["p50"] <= b["latency_ms"]["p50"]
+                and a["cost_per_1k_items_usd"] <= b["cost_per_1k_items_usd"])
+
+    frontier = [
+        p for p, s in summaries.items()
+        if not any(q != p and better_or_equal(t, s) and t != s for q, t in summaries.items())
+    ]
+    cheapest_first = sorted(summaries, key=lambda p: (summaries[p]["cost_per_1k_items_usd"],
+                                                      summaries[p]["latency_ms"]["p50"]))
+    per_field: Dict[str, Any] = {}
+    all_fields = sorted({f for s in summaries.values() for f in s["fields"]})
+    for field in all_fields:
+        f1 = {p: summaries[p]["fields"].get(field, {}).get("f1") for p in summaries}
+        known = {p: v for p, v in f1.items() if v is not None}
+        if not known:
+            continue
+        best = max(known.values())
+        choice = next(p for p in cheapest_first if p in known and known[p] >= best - tolerance)
+        per_field[field] = {"good_enough": choice, "f1": known, "best_f1": best}
+    best_overall = max(summaries, key=lambda p: summaries[p]["macro_f1"] or 0)
+    best_f1 = summaries[best_overall]["macro_f1"] or 0
+    overall = next(p for p in cheapest_first if (summaries[p]["macro_f1"] or 0) >= best_f1 - tolerance)
+    return {"frontier": frontier, "good_enough_overall": overall, "best_overall": best_overall,
+            "per_field": per_field, "tolerance": tolerance, "excluded": excluded}
+
+
+def evaluate(rows: List[Dict[str, Any]], paths: List[str], workers: int, cache: Optional[LLMCache],
+             time_tolerance_min: float = 30, price_in: float = 0.15, price_out: float = 0.60,
+             tolerance: float = 0.02, keep_items: bool = False) -> Dict[str, Any]:
+    original_complete = llm_extract._complete
+    key = os.environ.get("OPENAI_API_KEY") or ("offline" if cache is not None and cache.offline else None)
+    if cache is not None:
+        llm_extract._complete = cache.wrap(original_complete)
+    summaries: Dict[str, Dict[str, Any]] = {}
+    items_by_path: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        for path in paths:
+            items = run_path(path, rows, workers, key)
+            summaries[path] = summarize(rows, items, time_tolerance_min, price_in, price_out)
+            if keep_items:
+                items_by_path[path] = items
+    finally:
+        llm_extract._complete = original_complete
+    report = {"corpus_items": len(rows), "llm_key_present": bool(key), "paths": summaries,
+              "pareto": pareto(summaries, tolerance)}
+    if keep_items:
+        report["items"] = items_by_path
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Evaluate extraction paths against a labelled corpus")
+    ap.add_argument("corpus", help="labelled JSONL corpus")
+    ap.add_argument("--paths", default=",".join(PATHS), help="comma-separated subset of rules,llm,default")
+    ap.add_argument("--workers", type=int, default=8, help="parallel items for LLM paths")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--llm-cache", default=".eval_cache/llm.sqlite", help="SQLite LLM response cache ('' disables)")
+    ap.add_argument("--offline", action="store_true", help="serve LLM calls only from the cache")
+    ap.add_argument("--time-tolerance-min", type=float, default=30.0, help="date_time_of_incident match window")
+    ap.add_argument("--price-in", type=float, default=0.15, help="USD per 1M prompt tokens")
+    ap.add_argument("--price-out", type=float, default=0.60, help="USD per 1M completion tokens")
+    ap.add_argument("--tolerance", type=float, default=0.02, help="F1 gap still counted as good enough")
+    ap.add_argument("--out", default=None, help="write the full report JSON here")
+    ap.add_argument("--items", action="store_true", help="include per-item results in --out")
+    args = ap.parse_args(argv)
+
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    unknown = [p for p in paths if p not in PATHS]
+    if unknown:
+        ap.error(f"unknown path(s): {', '.join(unknown)}")
+    if args.offline and not args.llm_cache:
+        ap.error("--offline needs --llm-cache")
+
+    setup_logging()
+    rows = load_corpus(args.corpus)[: args.limit]
+    cache = LLMCache(args.llm_cache, offline=args.offline) if args.llm_cache else None
+    if not os.getenv("OPENAI_API_KEY") and not args.offline and any(p in LLM_PATHS for p in paths):
+        print("note: OPENAI_API_KEY not set – llm/default paths can only use rules or return empty", file=sys.stderr)
+    report = evaluate(rows, paths, args.workers, cache, args.time_tolerance_min, args.price_in,
+                      args.price_out, args.tolerance, keep_items=args.items)
+
+    print(f"{len(rows)} items")
+    print(f"{'path':<9} {'macroF1':>8} {'microP':>7} {'microR':>7} {'spanIoU':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'tok/item':>9} {'$/1k':>8} {'cache':>7} {'miss':>5} {'errors':>6}")
+    for path, s in report["paths"].items():
+        iou = s["spans"]["mean_iou"]
+        print(f"{path:<9} {s['macro_f1'] or 0:>8.3f} {s['micro']['precision'] or 0:>7.3f} "
+              f"{s['micro']['recall'] or 0:>7.3f} {'-' if iou is None else f'{iou:.3f}':>8} "
+              f"{s['latency_ms']['p50']:>9.2f} {s['latency_ms']['p95']:>9.2f} "
+              f"{s['tokens_per_item']['prompt'] + s['tokens_per_item']['completion']:>9.0f} "
+              f"{s['cost_per_1k_items_usd']:>8.3f} {s['cache_hits']:>3}/{s['llm_calls']:<3} {s['cache_misses']:>5} "
+              f"{s['errors']:>6}")
+    print()
+    print(f"{'field':<36} " + " ".join(f"{p:>16}" for p in report["paths"]) + "  good enough")
+    for field, info in report["pareto"]["per_field"].items():
+        cells = []
+        for p in report["paths"]:
+            v = report["paths"][p]["fields"].get(field, {})
+            cells.append(f"{v.get('precision') or 0:.2f}/{v.get('recall') or 0:.2f}/{v.get('f1') or 0:.2f}"
+                         if v else "-")
+        print(f"{field:<36} " + " ".join(f"{c:>16}" for c in cells) + f"  {info['good_enough']}")
+    pr = report["pareto"]
+    print()
+    print(f"(cells are P/R/F1) Pareto frontier: {', '.join(pr['frontier'])}; best: {pr['best_overall']}; "
+          f"cheapest within {pr['tolerance']} macro F1 of best: {pr['good_enough_overall']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    if pr["excluded"]:
+        misses = {p: report["paths"][p]["cache_misses"] for p in pr["excluded"]}
+        print(f"error: LLM cache misses in --offline mode {misses}; those items fell back to rules, "
+              f"so these paths are incomplete and left out of the Pareto comparison", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
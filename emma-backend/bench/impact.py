@@ -0,0 +1,518 @@
+"""
+impact.py
+
+Config-change impact analysis: which archived incidents would an edit to incident_patterns.yml
+change (type_of_incident, location, if_yes_which_risk_assessment under the rules path)?
+
+`index` reads traffic captures (CAPTURE_PATH files, see app/infra/capture.py) or JSONL corpora
+into a SQLite index. The index holds each transcript (compressed), the rule-hit results under
+the config in force at index time, and an inverted index from character trigrams to documents.
+Postings are appended in chunks, so indexing more captures later never rewrites old ones.
+
+`check` compiles the old and new configs and diffs the rules in first-match order. A rule
+counts as changed if a pattern was added or removed, a location was added or removed, a rule
+moved relative to the others, or an assessment's incident_types changed. For every changed
+pattern, the literals a match must contain are derived from the regex parse tree (sre_parse),
+as an OR of ANDs. Their trigrams select the candidate documents from the index. Only those
+are re-evaluated under both configs. A document containing none of a changed pattern's
+required literals cannot match it, so nothing outside the candidate set can change. A pattern
+with no usable literal (e.g. `\\d+`) falls back to a full scan, which the report says. The
+report lists affected incidents with before/after values, transitions per field and timings.
+
+Usage (from emma-backend/):
+    python -m bench.impact index captures/*.jsonl.gz --db .impact/index.sqlite
+    git show HEAD:emma-backend/config/incident_patterns.yml > /tmp/old.yml
+    python -m bench.impact check --old /tmp/old.yml --new config/incident_patterns.yml --show 20
+    python -m bench.impact check --new edited.yml --out impact.json --fail-on-change
+"""
+
+from __future__ import annotations
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from itertools import accumulate
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    from re import _constants as sre_constants  # type: ignore
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore
+    import sre_constants  # type: ignore
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app.config.incident_config import CompiledConfig, _config_path  # noqa: E402
+from app.config.tenants import tenant_config_path  # noqa: E402
+from app.infra.capture import read_capture  # noqa: E402
+from app.infra.logging import setup_logging  # noqa: E402
+from app.rules.assessments import which_risk_assessment  # noqa: E402
+from app.rules.extract import match_incident_type, match_location  # noqa: E402
+
+FIELDS = ("type_of_incident", "location", "if_yes_which_risk_assessment")
+DEFAULT_DB = ".impact/index.sqlite"
+MAX_ALTERNATIVES = 64   # OR-branches kept per pattern before its requirements are relaxed
+MAX_GRAMS = 8           # rarest trigrams intersected per alternative (the rest only refine)
+
+_REPEATS = tuple(getattr(sre_constants, n) for n in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                 if hasattr(sre_constants, n))
+# Characters IGNORECASE matches to an ASCII letter that str.lower() does not map to it.
+_FOLD = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+
+
+def _fold(text: str) -> str:
+    return text.translate(_FOLD).lower()
+
+
+def _trigrams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+# --- rules -------------------------------------------------------------------------------
+
+def compile_config(path: str, tenant: Optional[str] = None) -> CompiledConfig:
+    """`path` compiled as the base config, under `tenant`'s overlay when TENANT_CONFIG_DIR has one."""
+    if tenant:
+        try:
+            return CompiledConfig(tenant_config_path(tenant), path)
+        except ValueError:
+            pass
+    return CompiledConfig(path)
+
+
+def rule_fields(cfg: CompiledConfig, text: str) -> Dict[str, Optional[str]]:
+    """The config-driven fields the rules path sets, evaluated against `cfg` (not the current tenant's)."""
+    incident_type, _ = match_incident_type(text, cfg.incident_regexes)
+    location, _ = match_location(text.lower(), cfg.locations)
+    assessment, _ = which_risk_assessment(text, incident_type, cfg.assessment_rules)
+    return {"type_of_incident": incident_type, "location": location, "if_yes_which_risk_assessment": assessment}
+
+
+def fingerprint(cfg: CompiledConfig) -> str:
+    """Hash of everything rule_fields reads, so stored results can be reused for an identical config."""
+    material = {
+        "incident": [(t, [rx.pattern for rx in rxs]) for t, rxs in cfg.incident_regexes],
+        "locations": cfg.locations,
+        "assessments": [(r["name"], r["incident_types"], [rx.pattern for rx in r["regexes"]])
+                        for r in cfg.assessment_rules],
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _moved(old: List[str], new: List[str]) -> Set[str]:
+    """Keys added, removed, or whose order relative to the other keys changed (first match wins)."""
+    kept: Set[str] = set()
+    for block in difflib.SequenceMatcher(None, old, new, autojunk=False).get_matching_blocks():
+        kept.update(old[block.a:block.a + block.size])
+    return (set(old) | set(new)) - kept
+
+
+def _by_name(rules: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for rule in rules:
+        key, n = rule["name"], 1
+        while key in out:  # repeated names are separate rules
+            n += 1
+            key = f"{rule['name']}#{n}"
+        out[key] = rule
+    return out
+
+
+def diff_rules(old: CompiledConfig, new: CompiledConfig) -> List[Dict[str, Any]]:
+    """
+    Changed rules as [{field, rule, change, kind: "regex"|"literal", pattern}]. Every pattern
+    that can match differently under the two configs is listed from both sides.
+    """
+    changes: List[Dict[str, Any]] = []
+
+    def add(field: str, rule: str, change: str, kind: str, patterns) -> None:
+        for pat in sorted(set(patterns)):
+            changes.append({"field": field, "rule": rule, "change": change, "kind": kind, "pattern": pat})
+
+    # Incident types: ordered types, unordered patterns within a type.
+    old_types = {t: [rx.pattern for rx in rxs] for t, rxs in old.incident_regexes}
+    new_types = {t: [rx.pattern for rx in rxs] for t, rxs in new.incident_regexes}
+    moved = _moved(list(old_types), list(new_types))
+    for t in dict.fromkeys(list(old_types) + list(new_types)):
+        before, after = set(old_types.get(t, [])), set(new_types.get(t, []))
+        if t in moved:
+            change = "added" if t not in old_types else "removed" if t not in new_types else "moved"
+            add("type_of_incident", t, change, "regex", before | after)
+        else:
+            add("type_of_incident", t, "removed", "regex", before - after)
+            add("type_of_incident", t, "added", "regex", after - before)
+
+    # Locations: ordered literals.
+    moved = _moved(old.locations, new.locations)
+    for loc in sorted(moved):
+        change = "added" if loc not in old.locations else "removed" if loc not in new.locations else "moved"
+        add("location", loc, change, "literal", [loc])
+
+    # Assessments: ordered rules, each with an optional incident_types filter.
+    old_rules, new_rules = _by_name(old.assessment_rules), _by_name(new.assessment_rules)
+    moved = _moved(list(old_rules), list(new_rules))
+    for name in dict.fromkeys(list(old_rules) + list(new_rules)):
+        before = {rx.pattern for rx in old_rules[name]["regexes"]} if name in old_rules else set()
+        after = {rx.pattern for rx in new_rules[name]["regexes"]} if name in new_rules else set()
+        if name in moved:
+            change = "added" if name not in old_rules else "removed" if name not in new_rules else "moved"
+            add("if_yes_which_risk_assessment", name, change, "regex", before | after)
+        elif old_rules[name]["incident_types"] != new_rules[name]["incident_types"]:
+            add("if_yes_which_risk_assessment", name, "incident_types", "regex", before | after)
+        else:
+            add("if_yes_which_risk_assessment", name, "removed", "regex", before - after)
+            add("if_yes_which_risk_assessment", name, "added", "regex", after - before)
+    return changes
+
+
+# --- required literals ---------------------------------------------------------------------
+
+Alternatives = List[FrozenSet[str]]  # OR of (AND of literal substrings)
+
+
+def _and(a: Alternatives, b: Alternatives) -> Alternatives:
+    if any(not alt for alt in b):
+        return a  # b may match without any literal: it adds no requirement
+    product = list({x | y for x in a for y in b})
+    return product if len(product) <= MAX_ALTERNATIVES else a  # too many branches: keep the weaker a
+
+
+def _required(items) -> Alternatives:
+    alts: Alternatives = [frozenset()]
+    run: List[str] = []
+
+    def flush() -> None:
+        nonlocal alts
+        if run:
+            alts = [alt | {"".join(run)} for alt in alts]
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(_fold(chr(av)))
+        elif op is sre_constants.AT:
+            continue  # zero-width: the literals around it are still adjacent
+        elif op is sre_constants.SUBPATTERN:
+            flush()
+            alts = _and(alts, _required(av[-1]))
+        elif op is sre_constants.BRANCH:
+            flush()
+            branches = [alt for branch in av[1] for alt in _required(branch)]
+            alts = _and(alts, branches if len(branches) <= MAX_ALTERNATIVES else [frozenset()])
+        elif op in _REPEATS:
+            flush()
+            lo, _, sub = av
+            if lo >= 1:
+                alts = _and(alts, _required(sub))
+        else:
+            flush()  # character class, any, backreference, lookaround, ...
+    flush()
+    return alts
+
+
+def required_literals(pattern: str, kind: str = "regex") -> Alternatives:
+    """
+    Literal substrings (case-folded) a match of `pattern` must contain, as alternatives: a text
+    can only match if it contains every literal of at least one alternative. An empty
+    alternative means no requirement could be derived.
+    """
+    if kind == "literal":
+        return [frozenset([_fold(pattern)])]
+    try:
+        return _required(sre_parse.parse(pattern))
+    except Exception:
+        return [frozenset()]
+
+
+def _gram_alternatives(pattern: str, kind: str) -> Optional[List[Set[str]]]:
+    """Trigram sets per alternative; None if some alternative has no trigram (needs a full scan)."""
+    out = []
+    for alt in required_literals(pattern, kind):
+        grams = set().union(*(_trigrams(lit) for lit in alt)) if alt else set()
+        if not grams:
+            return None
+        out.append(grams)
+    return out
+
+
+# --- index -------------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    tenant TEXT,
+    at REAL,
+    source TEXT,
+    transcript BLOB NOT NULL,
+    fields TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (gram, chunk)
+) WITHOUT ROWID;
+"""
+
+
+def _encode(ids: List[int]) -> bytes:
+    deltas = array("I", (b - a for a, b in zip([0] + ids, ids)))
+    return zlib.compress(deltas.tobytes(), 1)
+
+
+def _decode(blob: bytes) -> List[int]:
+    deltas = array("I")
+    deltas.frombytes(zlib.decompress(blob))
+    return list(accumulate(deltas))
+
+
+class ImpactIndex:
+    """SQLite-backed transcript archive with a trigram inverted index."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+        self._postings: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def add_all(self, rows: Iterator[Dict[str, Any]], chunk_docs: int = 5000) -> Tuple[int, int]:
+        """Index rows {key, tenant, at, source, transcript}; returns (added, skipped as already indexed)."""
+        chunk = self.conn.execute("SELECT COALESCE(MAX(chunk), -1) FROM grams").fetchone()[0] + 1
+        pending: Dict[str, List[int]] = defaultdict(list)
+        configs: Dict[Optional[str], Tuple[CompiledConfig, str]] = {}
+        added = skipped = in_chunk = 0
+        for row in rows:
+            tenant = row.get("tenant")
+            if tenant not in configs:
+                cfg = compile_config(_config_path(), tenant)
+                configs[tenant] = (cfg, fingerprint(cfg))
+            cfg, fp = configs[tenant]
+            if self.conn.execute("SELECT 1 FROM docs WHERE key = ?", (row["key"],)).fetchone():
+                skipped += 1
+                continue
+            text = row["transcript"]
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO docs (key, tenant, at, source, transcript, fields, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row["key"], tenant, row.get("at"), row.get("source"),
+                 zlib.compress(text.encode("utf-8")), json.dumps(rule_fields(cfg, text)), fp),
+            )
+            if not cur.rowcount:  # same key twice in one archive
+                skipped += 1
+                continue
+            for gram in _trigrams(_fold(text)):
+                pending[gram].append(cur.lastrowid)
+            added += 1
+            in_chunk += 1
+            if in_chunk >= chunk_docs:
+                self._write_chunk(chunk, pending)
+                chunk, pending, in_chunk = chunk + 1, defaultdict(list), 0
+        self._write_chunk(chunk, pending)
+        return added, skipped
+
+    def _write_chunk(self, chunk: int, pending: Dict[str, List[int]]) -> None:
+        if pending:
+            self.conn.executemany(
+                "INSERT INTO grams (gram, chunk, n, postings) VALUES (?, ?, ?, ?)",
+                ((g, chunk, len(ids), _encode(ids)) for g, ids in pending.items()),
+            )
+        self.conn.commit()
+
+    def _count(self, gram: str) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(n), 0) FROM grams WHERE gram = ?", (gram,)).fetchone()[0]
+
+    def _posting(self, gram: str) -> List[int]:
+        ids = self._postings.get(gram)
+        if ids is None:
+            ids = []
+            for (blob,) in self.conn.execute("SELECT postings FROM grams WHERE gram = ? ORDER BY chunk", (gram,)):
+                ids.extend(_decode(blob))
+            self._postings[gram] = ids
+        return ids
+
+    def lookup(self, grams: Set[str]) -> Set[int]:
+        """Documents containing all of `grams` (the MAX_GRAMS rarest are intersected)."""
+        ranked = sorted((self._count(g), g) for g in grams)
+        if not ranked or ranked[0][0] == 0:
+            return set()
+        result = set(self._posting(ranked[0][1]))
+        for _, gram in ranked[1:MAX_GRAMS]:
+            if not result:
+                break
+            result.intersection_update(self._posting(gram))
+        return result
+
+    def all_ids(self) -> Set[int]:
+        return {i for (i,) in self.conn.execute("SELECT id FROM docs")}
+
+    def docs(self, ids: Set[int]) -> Iterator[Dict[str, Any]]:
+        ordered = sorted(ids)
+        for start in range(0, len(ordered), 500):
+            batch = ordered[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            for row in self.conn.execute(
+                    f"SELECT id, key, tenant, at, source, transcript, fields, fingerprint FROM docs WHERE id IN ({marks})",
+                    batch):
+                yield {"id": row[0], "key": row[1], "tenant": row[2], "at": row[3], "source": row[4],
+                       "transcript": zlib.decompress(row[5]).decode("utf-8"),
+                       "fields": json.loads(row[6]), "fingerprint": row[7]}
+
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows for the index from a capture file (gzip) or a JSONL corpus ({"transcript"|"text", ...})."""
+    if path.endswith(".gz"):
+        records: Iterator[Dict[str, Any]] = read_capture(path)
+    else:
+        def _jsonl() -> Iterator[Dict[str, Any]]:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        records = _jsonl()
+    for i, rec in enumerate(records):
+        text = rec.get("transcript") or rec.get("text")
+        if not text:
+            continue
+        output = rec.get("output") or {}
+        key = output.get("analysis_id") or rec.get("id") or hashlib.sha1(
+            f"{path}:{i}:{text}".encode("utf-8")).hexdigest()
+        yield {"key": str(key), "tenant": rec.get("tenant"), "at": rec.get("at"),
+               "source": output.get("extraction_source"), "transcript": text}
+
+
+# --- check -------------------------------------------------------------------------------
+
+def check(index: ImpactIndex, old_path: str, new_path: str, show: int = 10) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    tenants = [t for (t,) in index.conn.execute("SELECT DISTINCT tenant FROM docs")] or [None]
+    old = {t: compile_config(old_path, t) for t in tenants}
+    new = {t: compile_config(new_path, t) for t in tenants}
+    seen: Set[Tuple[str, str, str, str]] = set()
+    changes: List[Dict[str, Any]] = []
+    for t in tenants:
+        for ch in diff_rules(old[t], new[t]):
+            k = (ch["field"], ch["rule"], ch["change"], ch["pattern"])
+            if k not in seen:
+                seen.add(k)
+                changes.append(ch)
+    t_plan = time.perf_counter()
+
+    candidates: Set[int] = set()
+    full_scan: List[str] = []
+    for ch in changes:
+        alts = _gram_alternatives(ch["pattern"], ch["kind"])
+        ch["literals"] = None if alts is None else sorted(
+            sorted(alt) for alt in required_literals(ch["pattern"], ch["kind"]))
+        if alts is None:
+            full_scan.append(ch["pattern"])
+            continue
+        hits: Set[int] = set()
+        for grams in alts:
+            hits |= index.lookup(grams)
+        ch["candidates"] = len(hits)
+        candidates |= hits
+    if full_scan:
+        candidates = index.all_ids()
+    t_lookup = time.perf_counter()
+
+    affected: List[Dict[str, Any]] = []
+    transitions: Dict[str, Counter] = {f: Counter() for f in FIELDS}
+    reused = 0
+    fps = {t: fingerprint(old[t]) for t in tenants}
+    for doc in index.docs(candidates):
+        t = doc["tenant"]
+        if doc["fingerprint"] == fps.get(t):
+            before = doc["fields"]
+            reused += 1
+        else:
+            before = rule_fields(old[t], doc["transcript"])
+        after = rule_fields(new[t], doc["transcript"])
+        diff = {f: [before.get(f), after.get(f)] for f in FIELDS if before.get(f) != after.get(f)}
+        if not diff:
+            continue
+        for f, (b, a) in diff.items():
+            transitions[f][f"{b} -> {a}"] += 1
+        affected.append({"key": doc["key"], "tenant": t, "at": doc["at"], "extraction_source": doc["source"],
+                         "changes": diff, "transcript": doc["transcript"][:200]})
+    t_eval = time.perf_counter()
+
+    affected.sort(key=lambda a: a["at"] or 0, reverse=True)
+    return {
+        "old": old_path,
+        "new": new_path,
+        "indexed": len(index),
+        "rule_changes": changes,
+        "full_scan_patterns": full_scan,
+        "candidates": len(candidates),
+        "before_from_index": reused,
+        "affected": len(affected),
+        "affected_rules_sourced": sum(1 for a in affected if a["extraction_source"] == "rules"),
+        "by_field": {f: sum(c.values()) for f, c in transitions.items()},
+        "transitions": {f: dict(c.most_common()) for f, c in transitions.items() if c},
+        "examples": affected[:show],
+        "items": affected,
+        "seconds": {"plan": round(t_plan - t0, 4), "lookup": round(t_lookup - t_plan, 4),
+                    "evaluate": round(t_eval - t_lookup, 4), "total": round(t_eval - t0, 4)},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Impact of an incident_patterns.yml change on archived transcripts")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ix = sub.add_parser("index", help="add capture files / JSONL corpora to the index")
+    ix.add_argument("archives", nargs="+", help="capture files (*.gz) or JSONL corpora")
+    ix.add_argument("--db", default=DEFAULT_DB)
+    ck = sub.add_parser("check", help="report incidents whose rule results the new config changes")
+    ck.add_argument("--old", default=None, help="config before the change (default: INCIDENT_CONFIG / the repo config)")
+    ck.add_argument("--new", required=True, help="config after the change")
+    ck.add_argument("--db", default=DEFAULT_DB)
+    ck.add_argument("--show", type=int, default=10, help="affected incidents to print")
+    ck.add_argument("--out", default=None, help="write the full report JSON here")
+    ck.add_argument("--fail-on-change", action="store_true", help="exit 1 if any incident is affected")
+    args = ap.parse_args(argv)
+
+    setup_logging()
+    index = ImpactIndex(args.db)
+    if args.cmd == "index":
+        start = time.perf_counter()
+        for path in args.archives:
+            added, skipped = index.add_all(read_archive(path))
+            print(f"{path}: {added} indexed, {skipped} already present")
+        print(f"{len(index)} transcripts in {args.db} ({time.perf_counter() - start:.1f}s)")
+        return 0
+
+    report = check(index, args.old or _config_path(), args.new, show=args.show)
+    print(f"{len(report['rule_changes'])} changed rule patterns; {report['candidates']} of "
+          f"{report['indexed']} transcripts re-evaluated ({report['seconds']['total']:.3f}s)")
+    for ch in report["rule_changes"]:
+        lits = "FULL SCAN" if ch["literals"] is None else " | ".join(
+            " & ".join(json.dumps(lit) for lit in alt) for alt in ch["literals"])
+        print(f"  {ch['field']:<30} {ch['rule'][:32]:<32} {ch['change']:<14} {ch.get('candidates', '-'):>7}  {lits[:60]}")
+    print(f"{report['affected']} incidents affected ({report['affected_rules_sourced']} rules-sourced)")
+    for f, moves in report["transitions"].items():
+        for move, n in moves.items():
+            print(f"  {f:<30} {move:<56} {n}")
+    for item in report["examples"]:
+        print(f"  {item['key']} [{item['extraction_source'] or '-'}] {json.dumps(item['changes'])}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 1 if args.fail_on_change and report["affected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+loadgen.py
+
+Open-loop load generator for POST /analyze.
+
+Requests are released on a fixed schedule (or Poisson arrivals) at the target RPS
+regardless of how fast earlier ones complete, and latency is measured from the
+scheduled send time, so a slow server shows up as latency rather than as a lower
+offered load (no coordinated omission).
+
+Usage (backend + bench.mock_openai already running):
+    python -m bench.loadgen --url http://127.0.0.1:8000 --rps 50 --duration 60 --size 2000
+"""
+
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bench.corpus import generate_corpus
+
+_LOCAL = threading.local()
+
+
+def _conn(host: str, port: int, timeout: float) -> http.client.HTTPConnection:
+    c = getattr(_LOCAL, "conn", None)
+    if c is None:
+        c = http.client.HTTPConnection(host, port, timeout=timeout)
+        _LOCAL.conn = c
+    return c
+
+
+# A reused keep-alive socket the server already closed fails like this before any response byte.
+_STALE = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+def _post(host: str, port: int, path: str, body: bytes, timeout: float) -> Tuple[int, bytes]:
+    """
+    POST on a per-thread keep-alive connection. Only a stale reused socket (closed before
+    any response byte) is retried, once on a fresh connection; timeouts and other errors
+    are raised, so a slow server never gets the same request twice.
+    """
+    for attempt in (0, 1):
+        c = _conn(host, port, timeout)
+        reused = c.sock is not None
+        resp = None
+        try:
+            c.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            resp = c.getresponse()
+            return resp.status, resp.read()
+        except _STALE:
+            c.close()
+            _LOCAL.conn = None
+            if attempt or not reused or resp is not None:
+                raise
+        except Exception:
+            c.close()
+            _LOCAL.conn = None
+            raise
+    raise RuntimeError("unreachable")
+
+
+def _percentile(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def run(url: str, rps: float, duration: float, texts: List[str], query: str = "",
+        timeout: float = 60.0, poisson: bool = False, max_inflight: int = 1024) -> Dict[str, Any]:
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    path = (parts.path.rstrip("/") or "") + "/analyze" + (f"?{query}" if query else "")
+
+    results: List[Tuple[float, str]] = []  # (latency_s, outcome)
+    lock = threading.Lock()
+    rng = random.Random(1)
+
+    def fire(i: int, scheduled: float) -> None:
+        body = json.dumps({"text": texts[i % len(texts)]}).encode("utf-8")
+        try:
+            status, raw = _post(host, port, path, body, timeout)
+            if status == 200:
+                try:
+                    outcome = "ok:" + str(json.loads(raw).get("extraction_source"))
+                except ValueError:
+                    outcome = "bad_json"
+            else:
+                outcome = f"http_{status}"
+        except socket.timeout:
+            outcome = "exc:timeout"
+        except Exception as e:
+            outcome = f"exc:{type(e).__name__}"
+        latency = time.perf_counter() - scheduled
+        with lock:
+            results.append((latency, outcome))
+
+    pool = ThreadPoolExecutor(max_workers=max_inflight)
+    start = time.perf_counter()
+    next_at = start
+    sent = 0
+    skipped = 0
+    while True:
+        now = time.perf_counter()
+        if next_at - start >= duration:
+            break
+        if next_at > now:
+            time.sleep(next_at - now)
+        if pool._work_queue.qsize() > max_inflight:  # client saturated: record, don't queue forever
+            skipped += 1
+        else:
+            pool.submit(fire, sent, next_at)
+        sent += 1
+        gap = rng.expovariate(rps) if poisson else 1.0 / rps
+        next_at += gap
+    pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+
+    lat_ok = [l for l, o in results if o.startswith("ok:")]
+    outcomes = Counter(o for _, o in results)
+    return {
+        "target_rps": rps,
+        "duration_s": round(elapsed, 2),
+        "sent": sent,
+        "client_skipped": skipped,
+        "completed": len(results),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "ok_rps": round(len(lat_ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(lat_ok, 0.50) * 1000, 2),
+            "p95": round(_percentile(lat_ok, 0.95) * 1000, 2),
+            "p99": round(_percentile(lat_ok, 0.99) * 1000, 2),
+            "max": round(max(lat_ok) * 1000, 2) if lat_ok else 0.0,
+        },
+        "outcomes": dict(outcomes.most_common()),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Open-loop load generator for /analyze")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--rps", type=float, default=20.0)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--size", type=int, default=None, help="transcript size in characters (default: one-liners)")
+    ap.add_argument("--texts", type=int, default=200, help="distinct synthetic transcripts")
+    ap.add_argument("--corpus", default=None, help="JSONL with a 'text' field instead of synthetic transcripts")
+    ap.add_argument("--query", default="", help="extra query string, e.g. fields=extraction_source")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    ap.add_argument("--max-inflight", type=int, default=1024)
+    args = ap.parse_args(argv)
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            texts = [json.loads(line)["text"] for line in f if line.strip()]
+    else:
+        texts = [row["text"] for row in generate_corpus(args.texts, 11, args.size)]
+    report = run(args.url, args.rps, args.duration, texts, args.query, args.timeout, args.poisson, args.max_inflight)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
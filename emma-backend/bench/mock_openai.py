@@ -0,0 +1,223 @@
+"""
+mock_openai.py
+
+Local stand-in for the OpenAI chat-completions API, for offline load tests.
+
+Answers POST /v1/chat/completions with schema-valid extraction JSON (derived from the
+rules extractor run on the transcript embedded in the prompt), with configurable
+latency distribution, error/timeout rates and malformed or ```json-fenced output.
+Requests with a json_schema response_format get the compact short-key/enum-code shape
+(never fenced), and max_tokens truncates the answer with finish_reason "length".
+Point the backend at it with:
+
+    OPENAI_API_KEY=mock OPENAI_BASE_URL=http://127.0.0.1:8089/v1 uvicorn app.main:app
+
+Usage:
+    python -m bench.mock_openai --port 8089 --latency lognormal:800,0.4 \
+        --error-rate 0.02 --timeout-rate 0.01 --malformed-rate 0.02 --fenced-rate 0.2
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from app.llm.extract import COMPACT_KEYS, INCIDENT_TYPE_CODES, RISK_ASSESSMENT_CODES
+from app.rules.extract import extract_with_rules
+
+_RNG = random.Random()
+_RNG_LOCK = threading.Lock()
+
+
+def _rand() -> float:
+    with _RNG_LOCK:
+        return _RNG.random()
+
+
+class LatencyModel:
+    """
+    Latency spec:
+      fixed:MS | uniform:LO_MS,HI_MS | lognormal:MEDIAN_MS,SIGMA
+    """
+
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency model: {spec}")
+
+    def sample_ms(self) -> float:
+        with _RNG_LOCK:
+            if self.kind == "fixed":
+                return self.args[0] if self.args else 0.0
+            if self.kind == "uniform":
+                lo, hi = self.args[0], self.args[1]
+                return _RNG.uniform(lo, hi)
+            median, sigma = self.args[0], (self.args[1] if len(self.args) > 1 else 0.5)
+            return _RNG.lognormvariate(math.log(max(median, 1e-3)), sigma)
+
+
+def _transcript_from_prompt(prompt: str) -> str:
+    marker = "Transcript:\n"
+    i = prompt.rfind(marker)
+    return prompt[i + len(marker):] if i >= 0 else prompt
+
+
+def _answer(prompt: str, compact: bool = False) -> Dict[str, Any]:
+    """Extraction JSON in the same shape the prompt asks the model for."""
+    text = _transcript_from_prompt(prompt)
+    facts, evidence, _ = extract_with_rules(text)
+    out = dict(facts)
+    out["description"] = text.strip()[:300]
+    if compact:
+        asked = {k for k, short in COMPACT_KEYS.items() if f"\n{short}: " in prompt}
+        it_codes = {v: c for c, v in INCIDENT_TYPE_CODES.items()}
+        ra_codes = {v: c for c, v in RISK_ASSESSMENT_CODES.items()}
+        out["incident_type"] = it_codes.get(out["incident_type"])
+        out["if_yes_which_risk_assessment"] = ra_codes.get(out["if_yes_which_risk_assessment"])
+        ans = {COMPACT_KEYS[k]: v for k, v in out.items() if k in asked}
+        ans["ev"] = [{"f": COMPACT_KEYS[ev["field"]], "q": ev["quote"]} for ev in evidence if ev["field"] in asked]
+        return ans
+    # Partial prompts (incremental re-analysis) list only some keys; answer just those.
+    asked = {k for k in out if f"\n- {k} (" in prompt}
+    out = {k: v for k, v in out.items() if k in asked}
+    out["evidence"] = [{"field": ev["field"], "quote": ev["quote"]} for ev in evidence if ev["field"] in asked]
+    return out
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "mock-openai/1.0"
+    config: Dict[str, Any] = {}
+
+    def log_message(self, fmt, *args):  # keep load tests quiet
+        if self.config.get("verbose"):
+            super().log_message(fmt, *args)
+
+    def _send(self, status: int, payload: Any, raw: Optional[bytes] = None) -> None:
+        body = raw if raw is not None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": self.config["model"], "object": "model"}]})
+        else:
+            self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+
+        cfg = self.config
+        time.sleep(cfg["latency"].sample_ms() / 1000.0)
+
+        roll = _rand()
+        if roll < cfg["timeout_rate"]:
+            time.sleep(cfg["timeout_s"])
+            self._send(504, {"error": {"message": "mock timeout", "type": "timeout"}})
+            return
+        roll -= cfg["timeout_rate"]
+        if roll < cfg["error_rate"]:
+            status = 429 if _rand() < 0.5 else 500
+            self._send(status, {"error": {"message": f"mock error {status}", "type": "server_error"}})
+            return
+
+        messages = req.get("messages") or []
+        prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        compact = (req.get("response_format") or {}).get("type") == "json_schema"
+        content = json.dumps(_answer(prompt, compact), separators=(",", ":") if compact else None)
+        finish_reason = "stop"
+        if _rand() < cfg["malformed_rate"]:
+            content = content[: max(1, len(content) // 2)]  # truncated JSON
+        elif not compact and _rand() < cfg["fenced_rate"]:
+            content = f"```json\n{content}\n```"
+        max_tokens = req.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            content, finish_reason = content[: max_tokens * 4], "length"
+
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completion_tokens = len(content) // 4
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model") or cfg["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def serve(host: str, port: int, config: Dict[str, Any]) -> ThreadingHTTPServer:
+    """Create (not start) the mock server; call serve_forever() or run it in a thread."""
+    handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Mock OpenAI chat-completions server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--latency", default="lognormal:600,0.4", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 429/500")
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="fraction that stall for --timeout-s")
+    ap.add_argument("--timeout-s", type=float, default=120.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="fraction with truncated JSON")
+    ap.add_argument("--fenced-rate", type=float, default=0.0, help="fraction wrapped in ```json fences")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    if args.seed is not None:
+        _RNG.seed(args.seed)
+    config = {
+        "model": args.model,
+        "latency": LatencyModel(args.latency),
+        "error_rate": args.error_rate,
+        "timeout_rate": args.timeout_rate,
+        "timeout_s": args.timeout_s,
+        "malformed_rate": args.malformed_rate,
+        "fenced_rate": args.fenced_rate,
+        "verbose": args.verbose,
+    }
+    server = serve(args.host, args.port, config)
+    print(f"mock OpenAI listening on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+replay.py
+
+Replay a traffic capture (CAPTURE_PATH, see app/infra/capture.py) through the current
+pipeline, deterministically: LLM responses are served from the capture (nothing
+leaves the machine) and the clock is pinned to each record's anchor time.
+
+Reports output differences against what production returned (ignoring analysis_id /
+duplicate_of) and per-stage latency deltas (p50/p95, recorded vs replayed). The `llm`
+stage and `total` include network time when recorded, so `total_excl_llm` is the
+figure to compare.
+
+Usage (from emma-backend/):
+    python -m bench.replay captures/analyze.jsonl.gz
+    python -m bench.replay captures/analyze.jsonl.gz --limit 500 --show 20 --out replay.json --fail-on-diff
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Replays must not reach the network, re-capture, send email, or short-circuit via the dedupe index.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DEDUPE_ENABLED"] = "0"
+os.environ.pop("CAPTURE_PATH", None)
+os.environ.pop("OUTBOX_PATH", None)
+
+from app.config.tenants import bind_tenant  # noqa: E402
+from app.infra.capture import read_capture  # noqa: E402
+from app.infra.logging import setup_logging  # noqa: E402
+from app.infra.metrics import collect_stage_timings  # noqa: E402
+from app.llm import extract as llm_extract  # noqa: E402
+from app.services import orchestrator  # noqa: E402
+from app.services.projection import parse_fields  # noqa: E402
+
+IGNORED_KEYS = ("analysis_id", "duplicate_of")
+
+
+class RecordedLLMError(RuntimeError):
+    """The captured request's LLM call failed; replay fails it the same way."""
+
+
+def _serve_recorded(raw: Optional[str], error: Optional[str]):
+    def _complete(prompt: str, model: str, **_):
+        if error or raw is None:
+            raise RecordedLLMError(error or "no recorded response")
+        return raw, None
+    return _complete
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[Tuple[str, Any, Any]]:
+    """Leaf-level differences between two JSON values as (path, old, new)."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        out: List[Tuple[str, Any, Any]] = []
+        for k in sorted(set(old) | set(new)):
+            if not path and k in IGNORED_KEYS:
+                continue
+            out.extend(diff(old.get(k), new.get(k), f"{path}.{k}" if path else k))
+        return out
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        out = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            out.extend(diff(a, b, f"{path}[{i}]"))
+        return out
+    return [] if old == new else [(path, old, new)]
+
+
+def _pct(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def _with_excl_llm(stages: Dict[str, float]) -> Dict[str, float]:
+    out = dict(stages)
+    if "total" in out:
+        out["total_excl_llm"] = out["total"] - out.get("llm", 0.0)
+    return out
+
+
+def replay(records: List[Dict[str, Any]], show: int = 10) -> Dict[str, Any]:
+    # Dedupe hits made no LLM call; serve them the response of the call they duplicated.
+    raw_by_id = {
+        (r.get("output") or {}).get("analysis_id"): r.get("llm_raw")
+        for r in records if "llm_raw" in r
+    }
+    recorded_ms: Dict[str, List[float]] = defaultdict(list)
+    replayed_ms: Dict[str, List[float]] = defaultdict(list)
+    changed_fields: Counter = Counter()
+    examples: List[Dict[str, Any]] = []
+    identical = 0
+    failed = 0
+
+    original_complete = llm_extract._complete
+    original_key = os.environ.get("OPENAI_API_KEY")
+    try:
+        for i, rec in enumerate(records):
+            recorded = rec.get("output") or {}
+            raw = rec.get("llm_raw")
+            if raw is None and recorded.get("duplicate_of"):
+                raw = raw_by_id.get(recorded["duplicate_of"])
+            llm_extract._complete = _serve_recorded(raw, rec.get("llm_error"))
+            if rec.get("llm_key_present"):
+                os.environ["OPENAI_API_KEY"] = "replay"
+            else:
+                os.environ.pop("OPENAI_API_KEY", None)
+
+            anchor = datetime.fromisoformat(rec["anchor"]) if rec.get("anchor") else None
+            fields = parse_fields(rec.get("fields"))
+            run = (orchestrator.analyze_transcript_llm_only if rec.get("force_source") == "llm"
+                   else orchestrator.analyze_transcript)
+            try:
+                with bind_tenant(rec.get("tenant")), collect_stage_timings() as timings:
+                    result = run(rec["transcript"], fields=fields, anchor=anchor)
+            except Exception as e:
+                failed += 1
+                examples.append({"record": i, "error": f"{type(e).__name__}: {e}"})
+                continue
+
+            for k, v in _with_excl_llm(rec.get("stage_ms") or {}).items():
+                recorded_ms[k].append(v)
+            for k, v in _with_excl_llm({k: v * 1000 for k, v in timings.items()}).items():
+                replayed_ms[k].append(v)
+
+            changes = diff(recorded, result)
+            if not changes:
+                identical += 1
+                continue
+            for path, _, _ in changes:
+                changed_fields[path.split("[", 1)[0]] += 1
+            if len(examples) < show:
+                examples.append({
+                    "record": i,
+                    "changes": [{"path": p, "recorded": a, "replayed": b} for p, a, b in changes[:10]],
+                })
+    finally:
+        llm_extract._complete = original_complete
+        if original_key is None:
+            os.environ.pop("OPENAI_API_KEY", None)
+        else:
+            os.environ["OPENAI_API_KEY"] = original_key
+
+    stages = {}
+    for name in sorted(set(recorded_ms) | set(replayed_ms)):
+        rec_p50, new_p50 = _pct(recorded_ms[name], 0.5), _pct(replayed_ms[name], 0.5)
+        stages[name] = {
+            "n": len(replayed_ms[name]),
+            "recorded_p50_ms": round(rec_p50, 3),
+            "replayed_p50_ms": round(new_p50, 3),
+            "recorded_p95_ms": round(_pct(recorded_ms[name], 0.95), 3),
+            "replayed_p95_ms": round(_pct(replayed_ms[name], 0.95), 3),
+            "p50_delta_pct": round((new_p50 / rec_p50 - 1) * 100, 1) if rec_p50 else None,
+        }
+    return {
+        "records": len(records),
+        "identical": identical,
+        "changed": len(records) - identical - failed,
+        "failed": failed,
+        "changed_fields": dict(changed_fields.most_common()),
+        "stages": stages,
+        "examples": examples,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay a traffic capture through the current pipeline")
+    ap.add_argument("capture", help="capture file written with CAPTURE_PATH")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--show", type=int, default=10, help="example diffs to include")
+    ap.add_argument("--out", default=None, help="write the full report JSON here")
+    ap.add_argument("--fail-on-diff", action="store_true", help="exit 1 if any output changed")
+    args = ap.parse_args(argv)
+
+    setup_logging()
+    records = []
+    for rec in read_capture(args.capture):
+        records.append(rec)
+        if args.limit and len(records) >= args.limit:
+            break
+    report = replay(records, show=args.show)
+
+    print(f"{report['records']} records: {report['identical']} identical, "
+          f"{report['changed']} changed, {report['failed']} failed")
+    for path, n in report["changed_fields"].items():
+        print(f"  changed {path:<48} {n}")
+    print(f"{'stage':<22} {'n':>6} {'rec p50':>10} {'new p50':>10} {'delta':>8} {'rec p95':>10} {'new p95':>10}")
+    for name, s in report["stages"].items():
+        delta = f"{s['p50_delta_pct']:+.1f}%" if s["p50_delta_pct"] is not None else "-"
+        print(f"{name:<22} {s['n']:>6} {s['recorded_p50_ms']:>10.3f} {s['replayed_p50_ms']:>10.3f} "
+              f"{delta:>8} {s['recorded_p95_ms']:>10.3f} {s['replayed_p95_ms']:>10.3f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 1 if args.fail_on_diff and (report["changed"] or report["failed"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+run.py
+
+Microbenchmark suite for the analysis pipeline.
+
+Covers extract_with_rules, which_risk_assessment, extract_incident_datetime,
+_maybe_append_action, _build_email and the full analyze_transcript (LLM stubbed, no
+network) over synthetic transcripts of several sizes. Reports ops/sec, p50/p95/p99
+latency and allocations per op; can save a baseline JSON and fail (exit 1) when a
+case regresses past a threshold.
+
+Usage (from emma-backend/):
+    python -m bench.run                                  # run and print
+    python -m bench.run --save bench/baseline.json       # record a baseline
+    python -m bench.run --compare bench/baseline.json --threshold 0.25
+    python -m bench.run --filter rules --min-time 1.0
+"""
+
+from __future__ import annotations
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Benchmarks must never reach the network or spam stdout.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("DEDUPE_ENABLED", "0")
+os.environ.pop("OUTBOX_PATH", None)
+
+from bench.corpus import generate_corpus  # noqa: E402
+from app.infra.logging import setup_logging  # noqa: E402
+from app.rules.extract import extract_with_rules  # noqa: E402
+from app.rules.assessments import which_risk_assessment  # noqa: E402
+from app.util.datetime_extract import extract_incident_datetime  # noqa: E402
+from app.services import orchestrator  # noqa: E402
+
+SIZES = {"sentence": None, "2kb": 2_000, "20kb": 20_000, "100kb": 100_000}
+
+
+def stub_llm(facts_for: Callable[[str], Tuple[Dict[str, Any], List[Dict[str, Any]]]]):
+    """Route orchestrator LLM calls to `facts_for` (and pretend a key is configured)."""
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "bench-stub"
+    orchestrator.extract_with_llm = lambda text, report_time_iso=None, **_: facts_for(text)
+
+
+def _canned_llm(text: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    # Shape of a typical model answer; evidence quotes are paraphrased so span resolution runs.
+    facts = {
+        "date_time_of_incident": None,
+        "service_user_name": "Greg Jones",
+        "location": "lounge",
+        "incident_type": "fall",
+        "description": text[:200],
+        "immediate_actions_taken": "Helped up, checked for injuries",
+        "was_first_aid_administered": True,
+        "were_emergency_services_contacted": False,
+        "who_was_notified": None,
+        "witnesses": None,
+        "agreed_next_steps": "Monitor",
+        "risk_assessment_needed": True,
+        "if_yes_which_risk_assessment": "moving and handling risk assessment review",
+    }
+    evidence = [
+        {"field": "incident_type", "quote": text[:40], "start_idx": None, "end_idx": None},
+        {"field": "location", "quote": "in the lounge", "start_idx": None, "end_idx": None},
+    ]
+    return facts, evidence
+
+
+def _cases() -> List[Tuple[str, Callable[[str], Any]]]:
+    form_template = orchestrator._facts_to_form(_canned_llm("x")[0])
+
+    def build_email(_text: str):
+        return orchestrator._build_email(copy.copy(form_template))
+
+    def maybe_append(text: str):
+        orchestrator._maybe_append_action(copy.copy(form_template), text)
+
+    return [
+        ("extract_with_rules", extract_with_rules),
+        ("which_risk_assessment", lambda t: which_risk_assessment(t, "fall")),
+        ("extract_incident_datetime", extract_incident_datetime),
+        ("maybe_append_action", maybe_append),
+        ("build_email", build_email),
+        ("analyze_transcript", orchestrator.analyze_transcript),
+    ]
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def measure(fn: Callable[[str], Any], texts: List[str], min_time: float, min_iters: int) -> Dict[str, Any]:
+    """Time `fn` over `texts` (round robin) until both min_time and min_iters are reached."""
+    for t in texts[:3]:
+        fn(t)  # warm caches/regex compiles
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        i = 0
+        while i < min_iters or time.perf_counter() - start < min_time:
+            t = texts[i % len(texts)]
+            t0 = time.perf_counter()
+            fn(t)
+            samples.append(time.perf_counter() - t0)
+            i += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # Allocation pass (separate so tracing does not skew timings).
+    tracemalloc.start()
+    peak_alloc = 0
+    for t in texts[:20]:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn(t)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_alloc = max(peak_alloc, peak - before)
+    tracemalloc.stop()
+
+    samples.sort()
+    mean = statistics.fmean(samples)
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": round(1.0 / mean, 2) if mean else None,
+        "mean_ms": round(mean * 1000, 4),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 4),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 4),
+        "p99_ms": round(_percentile(samples, 0.99) * 1000, 4),
+        "peak_alloc_kb": round(peak_alloc / 1024, 2),
+    }
+
+
+def run_suite(filter_: Optional[str], sizes: List[str], min_time: float, min_iters: int,
+              n_texts: int, seed: int) -> Dict[str, Any]:
+    stub_llm(_canned_llm)
+    corpora = {size: generate_corpus(n_texts, seed, SIZES[size]) for size in sizes}
+    results: Dict[str, Any] = {}
+    for size in sizes:
+        texts = [row["text"] for row in corpora[size]]
+        for name, fn in _cases():
+            key = f"{name}[{size}]"
+            if filter_ and filter_ not in key:
+                continue
+            results[key] = measure(fn, texts, min_time, min_iters)
+            r = results[key]
+            print(f"{key:<42} {r['ops_per_sec'] or 0:>12.1f} ops/s  p50 {r['p50_ms']:>9.3f} ms  "
+                  f"p95 {r['p95_ms']:>9.3f} ms  p99 {r['p99_ms']:>9.3f} ms  alloc {r['peak_alloc_kb']:>9.1f} KB",
+                  flush=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, metric: str = "p50_ms") -> List[str]:
+    """Return human-readable regressions where `metric` grew by more than `threshold` (fraction)."""
+    out: List[str] = []
+    for key, cur in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base or not base.get(metric):
+            continue
+        ratio = cur[metric] / base[metric]
+        if ratio > 1 + threshold:
+            out.append(f"{key}: {metric} {base[metric]:.3f} -> {cur[metric]:.3f} ms (+{(ratio - 1) * 100:.0f}%)")
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Emma pipeline microbenchmarks")
+    ap.add_argument("--filter", default=None, help="only cases whose name contains this")
+    ap.add_argument("--sizes", default="sentence,2kb,100kb", help=f"comma list of {','.join(SIZES)}")
+    ap.add_argument("--min-time", type=float, default=0.5, help="seconds per case")
+    ap.add_argument("--min-iters", type=int, default=20)
+    ap.add_argument("--texts", type=int, default=24, help="distinct transcripts per size")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--save", default=None, help="write results JSON (baseline) here")
+    ap.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (0.25 = +25%%)")
+    args = ap.parse_args(argv)
+
+    setup_logging()
+    random.seed(args.seed)
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip() in SIZES]
+    current = run_suite(args.filter, sizes, args.min_time, args.min_iters, args.texts, args.seed)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"saved {len(current['results'])} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"no regressions beyond +{args.threshold * 100:.0f}% vs {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+smtp_sink.py
+
+Local SMTP stand-in for testing the notification outbox offline.
+
+Accepts mail over plain SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) and
+either discards it, appends it to an mbox-style file, or prints a one-line summary.
+Optional per-message latency and transient (451) / permanent (550) failure rates
+exercise the dispatcher's retry and dead-letter paths.
+
+Usage:
+    python -m bench.smtp_sink --port 2525 --out sent.mbox --latency-ms 20 --temp-fail-rate 0.05
+    OUTBOX_PATH=outbox.db SMTP_HOST=127.0.0.1 SMTP_PORT=2525 uvicorn app.main:app
+"""
+
+from __future__ import annotations
+import argparse
+import random
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    config: Dict[str, Any] = {}
+    stats: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode("ascii"))
+        self.wfile.flush()
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def handle(self) -> None:
+        cfg = self.config
+        self._count("connections")
+        self._reply("220 smtp-sink ready")
+        mail_from: Optional[str] = None
+        rcpts = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-smtp-sink")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 smtp-sink")
+            elif verb == "MAIL":
+                mail_from, rcpts = line[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpts.append(line[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    d = self.rfile.readline()
+                    if not d or d in (b".\r\n", b".\n"):
+                        break
+                    lines.append(d[1:] if d.startswith(b"..") else d)
+                if cfg["latency_ms"]:
+                    time.sleep(cfg["latency_ms"] / 1000.0)
+                roll = random.random()
+                if roll < cfg["perm_fail_rate"]:
+                    self._count("rejected_permanent")
+                    self._reply("550 mailbox unavailable (sink)")
+                elif roll < cfg["perm_fail_rate"] + cfg["temp_fail_rate"]:
+                    self._count("rejected_temporary")
+                    self._reply("451 try again later (sink)")
+                else:
+                    self._count("messages")
+                    self._store(mail_from, rcpts, b"".join(lines))
+                    self._reply("250 OK queued")
+            elif verb == "RSET":
+                mail_from, rcpts = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("502 command not implemented")
+
+    def _store(self, mail_from, rcpts, data: bytes) -> None:
+        out = self.config.get("out")
+        if out:
+            with self.lock, open(out, "ab") as f:
+                f.write(f"From {mail_from or '-'} {time.asctime()}\n".encode())
+                f.write(data.replace(b"\r\n", b"\n"))
+                f.write(b"\n")
+        if self.config.get("verbose"):
+            subject = next((l for l in data.decode("utf-8", "replace").splitlines() if l.startswith("Subject:")), "")
+            print(f"{','.join(rcpts)}  {subject}", flush=True)
+
+
+def serve(host: str, port: int, config: Dict[str, Any]) -> socketserver.ThreadingTCPServer:
+    """Create (not start) the sink; `.RequestHandlerClass.stats` holds counters."""
+    handler = type("ConfiguredSmtpSinkHandler", (SmtpSinkHandler,), {"config": config, "stats": {}})
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Local SMTP sink")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2525)
+    ap.add_argument("--out", default=None, help="append received messages to this mbox file")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--temp-fail-rate", type=float, default=0.0, help="fraction answered 451")
+    ap.add_argument("--perm-fail-rate", type=float, default=0.0, help="fraction answered 550")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    config = {
+        "out": args.out,
+        "latency_ms": args.latency_ms,
+        "temp_fail_rate": args.temp_fail_rate,
+        "perm_fail_rate": args.perm_fail_rate,
+        "verbose": args.verbose,
+    }
+    server = serve(args.host, args.port, config)
+    print(f"SMTP sink listening on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"stats: {server.RequestHandlerClass.stats}")
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
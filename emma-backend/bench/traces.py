@@ -0,0 +1,115 @@
+"""
+traces.py
+
+Span waterfalls from a trace file written with TRACE_EXPORT=<path> (see app/infra/tracing.py).
+
+Prints each selected trace as an indented span tree with a bar showing when each span ran
+relative to the root, its duration and its attributes. By default it shows the slowest
+traces; --errors keeps only traces with an errored span, and --trace picks one trace id.
+
+Usage (from emma-backend/):
+    python -m bench.traces traces.jsonl
+    python -m bench.traces traces.jsonl --slowest 5 --width 60
+    python -m bench.traces traces.jsonl --errors --attrs
+    python -m bench.traces traces.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def read_spans(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # partially written line (exporter still running)
+
+
+def group_traces(spans: Iterator[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        traces[s["trace_id"]].append(s)
+    return traces
+
+
+def _root(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s.get("parent_id") not in ids]
+    return min(roots or spans, key=lambda s: s["start_unix_nano"])
+
+
+def waterfall(spans: List[Dict[str, Any]], width: int = 40, attrs: bool = False) -> List[str]:
+    """Text rows (one per span, depth-first in start order) for one trace."""
+    root = _root(spans)
+    t0 = root["start_unix_nano"]
+    total = max((s.get("end_unix_nano") or t0) for s in spans) - t0 or 1
+    children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        if s is not root:
+            children[s.get("parent_id")].append(s)
+
+    rows: List[str] = []
+    visited = set()
+
+    def walk(s: Dict[str, Any], depth: int) -> None:
+        visited.add(s["span_id"])
+        start = (s["start_unix_nano"] - t0) / total
+        end = ((s.get("end_unix_nano") or s["start_unix_nano"]) - t0) / total
+        lo = min(width - 1, int(start * width))
+        bar = " " * lo + "#" * max(1, int(end * width) - lo)
+        name = "  " * depth + s["name"] + (" !" if s.get("error") else "")
+        rows.append(f"{name:<40.40} |{bar:<{width}.{width}}| {s['duration_ms']:>9.3f} ms")
+        if attrs:
+            shown = {k: v for k, v in (s.get("attributes") or {}).items() if v is not None}
+            if s.get("error"):
+                shown["error"] = s["error"]
+            if shown:
+                rows.append(" " * (2 * depth + 4) + json.dumps(shown, default=str)[:160])
+        for c in sorted(children.get(s["span_id"], []), key=lambda c: c["start_unix_nano"]):
+            walk(c, depth + 1)
+
+    walk(root, 0)
+    # Spans whose parent is missing from the file go at the end.
+    for s in sorted(spans, key=lambda s: s["start_unix_nano"]):
+        if s["span_id"] not in visited:
+            walk(s, 1)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Print span waterfalls from a TRACE_EXPORT file")
+    ap.add_argument("path", help="JSON lines file written with TRACE_EXPORT=<path>")
+    ap.add_argument("--slowest", type=int, default=3, help="how many traces to show (slowest first)")
+    ap.add_argument("--errors", action="store_true", help="only traces with an errored span")
+    ap.add_argument("--trace", default=None, help="show this trace id only")
+    ap.add_argument("--width", type=int, default=40, help="bar width in characters")
+    ap.add_argument("--attrs", action="store_true", help="print span attributes under each span")
+    args = ap.parse_args(argv)
+
+    traces = group_traces(read_spans(args.path))
+    if args.trace:
+        selected = [traces[args.trace]] if args.trace in traces else []
+    else:
+        selected = [t for t in traces.values() if not args.errors or any(s.get("error") for s in t)]
+        selected.sort(key=lambda t: _root(t)["duration_ms"], reverse=True)
+        selected = selected[:args.slowest]
+    print(f"{len(traces)} traces in {args.path}; showing {len(selected)}")
+    for spans in selected:
+        root = _root(spans)
+        reason = (root.get("attributes") or {}).get("sampling.reason", "-")
+        print(f"\ntrace {root['trace_id']}  {root['duration_ms']:.1f} ms  spans={len(spans)}  sampled={reason}")
+        for row in waterfall(spans, width=args.width, attrs=args.attrs):
+            print(row)
+    return 0 if selected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())